@@ -1,60 +1,187 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, Response, stream_with_context, g
 from flask_cors import CORS
-import markdown
 import os
-import requests
 import json
 import logging
 import time
-from css_inline import inline
-import cssutils
-import re
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from draft_publish import (
+    MAX_DRAFT_ARTICLES, batch_draft_response, batch_error, batch_render_failed, build_batch_articles,
+    build_draft_article, build_raw_draft_article, collect_renders, draft_response, draft_error, raw_draft_error,
+    render_args, render_error, token_error, validate_raw_draft, validate_send_draft, validate_send_draft_batch,
+)
+from incremental_render import create_incremental_renderer_from_env
+from job_queue import FINISHED_STATUSES, JobFailed, QueueFullError, create_job_queue_from_env
+from md_sections import extract_title
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsRegistry, create_metrics_collector_from_env, render_text
+from render_cache import create_render_cache_from_env, make_render_key
+from render_executor import RenderQueueFull, RenderTimeout, create_render_executor_from_env
+from render_pipeline import default_pipeline
+from static_assets import IMMUTABLE, REVALIDATE, choose_encoding, compress, compress_stream, create_asset_store_from_env
+from theme_watcher import ThemeEvents, create_theme_watcher_from_env
+from validate_css_theme import validate_css
+from wechat_client import WeChatAPIError, create_wechat_client_from_env
+from wechat_images import create_image_uploader_from_env
+from wechat_token import WeChatTokenError, create_token_manager_from_env
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def resolve_css_variables(css_content):
-    """
-    解析CSS中的变量并将其替换为实际值
-    """
-    # 提取所有CSS变量定义
-    variables = {}
-    
-    # 匹配CSS变量定义的正则表达式
-    var_def_pattern = r'(--[\w-]+)\s*:\s*([^;]+);'
-    
-    # 查找所有变量定义
-    for match in re.finditer(var_def_pattern, css_content):
-        var_name = match.group(1)
-        var_value = match.group(2).strip()
-        # 移除可能的尾随逗号或空格
-        var_value = var_value.rstrip(', ')
-        variables[var_name] = var_value
-    
-    # 替换CSS中的变量引用
-    resolved_css = css_content
-    
-    # 替换变量引用为实际值
-    for var_name, var_value in variables.items():
-        # 使用正则表达式替换var()函数引用
-        # 匹配 var(--variable-name) 或 var(--variable-name, fallback)
-        # 更精确地处理可能的空格和换行
-        pattern = r'var\s*\(\s*' + re.escape(var_name) + r'\s*(?:,[^)]*)?\)'
-        resolved_css = re.sub(pattern, var_value, resolved_css)
-    
-    # 移除变量定义行，但保留其他CSS规则
-    # 使用更安全的方式移除变量定义
-    resolved_css = re.sub(r'--[\w-]+\s*:\s*[^;]+;\s*', '', resolved_css)
-    
-    return resolved_css
+# 渲染流水线（包含已解析主题的进程内缓存）
+pipeline = default_pipeline('./themes')
+theme_cache = pipeline.theme_cache
+
+# 可选的渲染进程池（RENDER_EXECUTOR_WORKERS > 0 时启用），未启用时在请求线程中渲染
+render_executor = create_render_executor_from_env('./themes')
+
+# 最终<section> HTML的渲染缓存
+render_cache = create_render_cache_from_env()
+
+# 预览的增量渲染：按块缓存内联后的HTML，只渲染变化的块
+incremental_renderer = create_incremental_renderer_from_env(pipeline)
+
+# 主题文件变化后重新编译该主题，并通过 /styles/events 推送给编辑器
+theme_events = ThemeEvents()
+theme_watcher = create_theme_watcher_from_env(theme_cache, theme_events)
+
+# 静态文件和主题CSS按内容哈希缓存在内存中，并预先压缩好gzip/brotli版本
+static_assets = create_asset_store_from_env('.')
+theme_assets = create_asset_store_from_env('./themes')
+
+# 保存主题时的验证：syntax 拒绝有语法错误的CSS，strict 拒绝任何不符合规范的CSS，off 不验证
+THEME_VALIDATION = os.getenv('THEME_VALIDATION', 'syntax')
+
+# 小于该字节数的动态响应（/render等）不压缩
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', '1024'))
+
+# 超过该长度（字符数）的文档在/render中自动流式渲染，请求中 "stream": true 时总是流式渲染
+RENDER_STREAM_THRESHOLD = int(os.getenv('RENDER_STREAM_THRESHOLD', str(512 * 1024)))
+
+# 微信接口客户端（每个worker一个连接池）
+wechat_client = create_wechat_client_from_env()
+
+# access_token按appid缓存并提前刷新，多个worker通过本地目录共享
+token_manager = create_token_manager_from_env(wechat_client)
+
+# access_token无效或已过期
+INVALID_TOKEN_ERRCODES = (40001, 40014, 42001)
+
+# 发布前把文章中的图片上传到微信并替换src，已上传过的图片（按内容哈希）不再上传
+image_uploader = create_image_uploader_from_env(wechat_client, abort_errcodes=INVALID_TOKEN_ERRCODES)
+
+# 批量发布时并发渲染文章的线程池
+batch_render_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('RENDER_BATCH_WORKERS', str(MAX_DRAFT_ARTICLES))),
+    thread_name_prefix='render-batch',
+)
+
+# 发布等耗时任务在后台线程中执行，状态保存在本地SQLite中
+job_queue = create_job_queue_from_env()
+
+# 运行指标，/metrics 按Prometheus文本格式输出
+metrics_registry = MetricsRegistry()
+collect_metrics = create_metrics_collector_from_env(metrics_registry)
+
+http_requests = metrics_registry.counter(
+    'md2any_http_requests_total', 'HTTP requests handled by Flask', ['endpoint', 'method', 'status'])
+http_request_seconds = metrics_registry.histogram(
+    'md2any_http_request_seconds', 'Time until the response headers are ready', ['endpoint'])
+render_stage_seconds = metrics_registry.histogram(
+    'md2any_render_stage_seconds', 'Time spent in each render pipeline stage', ['stage'])
+wechat_request_seconds = metrics_registry.histogram(
+    'md2any_wechat_request_seconds', 'Latency of each WeChat API request attempt', ['path', 'outcome'])
+
+
+def _cache_requests():
+    values = {}
+    for name, cache in (('render', render_cache), ('block', incremental_renderer.cache)):
+        stats = cache.stats()
+        for result in ('hits', 'shared_hits', 'misses'):
+            values[(name, result)] = stats[result]
+    return values
+
+
+metrics_registry.callback(
+    'md2any_render_cache_requests_total', 'Render cache lookups', _cache_requests,
+    type='counter', labelnames=['cache', 'result'])
+metrics_registry.callback(
+    'md2any_render_cache_bytes', 'Bytes held in the in-process render caches',
+    lambda: {('render',): render_cache.stats()['bytes'], ('block',): incremental_renderer.cache.stats()['bytes']},
+    labelnames=['cache'])
+metrics_registry.callback(
+    'md2any_theme_cache_requests_total', 'Theme cache lookups',
+    lambda: {(result,): theme_cache.stats()[result] for result in ('hits', 'misses')},
+    type='counter', labelnames=['result'])
+metrics_registry.callback(
+    'md2any_theme_reloads_total', 'Themes recompiled after a file change',
+    lambda: theme_watcher.reloads if theme_watcher is not None else 0, type='counter')
+metrics_registry.callback(
+    'md2any_theme_event_subscribers', 'Editors connected to /styles/events',
+    theme_events.subscriber_count)
+metrics_registry.callback(
+    'md2any_render_blocks_rendered_total', 'Blocks rendered by the incremental preview',
+    lambda: incremental_renderer.rendered_blocks, type='counter')
+metrics_registry.callback(
+    'md2any_wechat_token_cache_hits_total', 'access_token requests served from the token cache',
+    lambda: token_manager.hits, type='counter')
+metrics_registry.callback(
+    'md2any_wechat_token_refreshes_total', 'access_token refreshes from the WeChat API',
+    lambda: token_manager.refreshes, type='counter')
+metrics_registry.callback(
+    'md2any_wechat_images_total', 'Article images uploaded, served from the upload cache, or left unchanged',
+    lambda: {(result,): count for result, count in image_uploader.stats().items()} if image_uploader is not None else {},
+    type='counter', labelnames=['result'])
+metrics_registry.callback(
+    'md2any_job_queue_pending', 'Background jobs queued or running in this process',
+    lambda: job_queue.stats()['pending'])
+if render_executor is not None:
+    metrics_registry.callback(
+        'md2any_render_executor_in_flight', 'Renders running or queued in the render process pool',
+        lambda: render_executor.stats()['in_flight'])
+    metrics_registry.callback(
+        'md2any_render_executor_rejected_total', 'Renders rejected because the render queue was full',
+        lambda: render_executor.stats()['rejected'], type='counter')
+    metrics_registry.callback(
+        'md2any_render_executor_timeouts_total', 'Renders that exceeded RENDER_EXECUTOR_TIMEOUT',
+        lambda: render_executor.stats()['timeouts'], type='counter')
+    metrics_registry.callback(
+        'md2any_render_executor_restarts_total', 'Render process pool restarts after a worker process died',
+        lambda: render_executor.stats()['restarts'], type='counter')
+    metrics_registry.callback(
+        'md2any_render_executor_crashes_total', 'Renders that failed because worker processes died twice',
+        lambda: render_executor.stats()['crashes'], type='counter')
+
+
+def observe_wechat_request(path, outcome, seconds):
+    wechat_request_seconds.observe(seconds, path=path, outcome=outcome)
+
+
+wechat_client.add_request_hook(observe_wechat_request)
 
 app = Flask(__name__)
-CORS(app)  # Enable CORS for all routes
+CORS(app, expose_headers=['ETag', 'Server-Timing'])  # Enable CORS for all routes
 app.debug = False
 app.config['JSON_AS_ASCII'] = False
 
 
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    # 流式响应在发送响应头时记录，不包括生成响应体的时间
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    http_requests.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    started = g.get('request_started')
+    if started is not None:
+        http_request_seconds.observe(time.perf_counter() - started, endpoint=endpoint)
+    return response
+
+
 
 @app.route('/styles/<path:path>', methods=['GET', 'POST'])
 @app.route('/themes/<path:path>', methods=['GET', 'POST'])
@@ -65,9 +192,17 @@ def handle_styles(path):
             # Security: Ensure path is a valid CSS filename and doesn't contain path traversal characters.
             if '..' not in path and path.endswith('.css'):
                 css_content = request.get_data(as_text=True)
+                validation = None
+                if THEME_VALIDATION != 'off':
+                    # 在写入文件之前验证，未通过的主题不会进入主题缓存和渲染缓存
+                    validation = validate_css(css_content)
+                    rejected = validation['errors'] if THEME_VALIDATION == 'syntax' else not validation['valid']
+                    if rejected:
+                        return jsonify({'status': 'error', 'message': '主题CSS未通过验证', 'validation': validation}), 400
                 with open(f'./themes/{path}', 'w', encoding='utf-8') as f:
                     f.write(css_content)
-                return jsonify({'status': 'success', 'message': 'CSS file saved successfully'}), 200
+                theme_cache.invalidate(path)
+                return jsonify({'status': 'success', 'message': 'CSS file saved successfully', 'validation': validation}), 200
             else:
                 return jsonify({'status': 'error', 'message': 'Invalid file path'}), 400
         except Exception as e:
@@ -75,41 +210,127 @@ def handle_styles(path):
             return jsonify({'status': 'error', 'message': f'Failed to save CSS file: {str(e)}'}), 500
     else:
         # GET request - serve the CSS file
-        return send_from_directory('./themes', path)
+        asset = theme_assets.get(path)
+        if asset is None and theme_cache.bundle is not None and '..' not in path:
+            # 只存在于主题包中的主题，返回编译后（CSS变量已替换）的CSS
+            bundled = theme_cache.bundle.find(path)
+            if bundled is not None and not os.path.exists(os.path.join('./themes', path)):
+                asset = theme_assets.put(path, theme_cache.bundle.read_css(bundled).encode('utf-8'),
+                                         bundled.hash, 'text/css')
+        if asset is None:
+            return send_from_directory('./themes', path)
+        # v 参数可以是文件指纹，也可以是 /styles/events 推送的主题版本；主题变化后两者都随之变化
+        version = request.args.get('v')
+        theme = pipeline.resolve_theme(path) if version and version != asset.hash else None
+        return asset_response(asset, immutable=bool(version) and (version == asset.hash or
+                                                                  (theme is not None and version == theme.version)))
+
+def asset_response(asset, immutable=False):
+    """
+    发送静态资源：按Accept-Encoding选择预压缩的版本，If-None-Match匹配时返回304；
+    URL带有当前指纹时长期缓存，否则每次使用前用ETag确认
+    """
+    encoding = choose_encoding(request.accept_encodings, asset.variants)
+    headers = {
+        'ETag': f'"{asset.etag(encoding)}"',
+        'Cache-Control': IMMUTABLE if immutable else REVALIDATE,
+        'Vary': 'Accept-Encoding',
+    }
+    if any(request.if_none_match.contains_weak(etag) for etag in asset.etags()):
+        return Response(status=304, headers=headers)
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    content_type = asset.mimetype
+    if content_type.startswith('text/') or content_type == 'application/javascript':
+        content_type += '; charset=utf-8'
+    return Response(asset.variants[encoding], 200, headers, content_type=content_type)
+
+def compress_response(response):
+    """
+    按Accept-Encoding压缩动态响应（流式响应逐块压缩）；
+    压缩后的字节与原内容不同，强ETag改为弱ETag，If-None-Match按弱比较仍然匹配
+    """
+    if response.status_code != 200 or 'Content-Encoding' in response.headers:
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return response
+        response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+def index_asset():
+    """首页：页面中的frontend.js带上内容指纹，脚本可以长期缓存，页面本身每次确认"""
+    page = static_assets.get('frontend.html')
+    script = static_assets.get('frontend.js')
+    if page is None or script is None:
+        return page
+    html = page.data.replace(b'src="frontend.js"', f'src="frontend.js?v={script.hash}"'.encode('utf-8'))
+    return static_assets.put('/', html, (page.hash, script.hash), page.mimetype)
+
+# 在后台预先读取和压缩首页资源，不阻塞worker启动
+threading.Thread(target=index_asset, name='static-assets-warmup', daemon=True).start()
 
 @app.route('/')
 def index():
-    return send_from_directory('.', 'frontend.html')
+    asset = index_asset()
+    if asset is None:
+        return send_from_directory('.', 'frontend.html')
+    return asset_response(asset)
 
 @app.route('/<path:path>')
 def send_static(path):
-    response = send_from_directory('.', path)
-    # Add cache control headers for CSS files
-    if path.endswith('.css'):
-        response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-        response.headers['Pragma'] = 'no-cache'
-        response.headers['Expires'] = '0'
-    return response
+    asset = static_assets.get(path)
+    if asset is None:
+        # 不存在或过大的文件
+        return send_from_directory('.', path)
+    return asset_response(asset, immutable=request.args.get('v') == asset.hash)
 
 @app.route('/health', methods=['GET'])
 def health_check():
     return jsonify({'status': 'ok'}), 200
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus格式的运行指标"""
+    return Response(render_text(collect_metrics()), 200, {'Content-Type': METRICS_CONTENT_TYPE})
+
 @app.route('/styles')
 def get_styles():
-    try:
-        styles = [f for f in os.listdir('./themes') if f.endswith('.css')]
-        return jsonify(styles)
-    except FileNotFoundError:
+    styles = theme_cache.names()
+    if not styles and not os.path.isdir('./themes'):
         # Fallback to current directory if themes folder doesn't exist
         styles = [f for f in os.listdir('.') if f.endswith('.css')]
-        return jsonify(styles)
+    return jsonify(styles)
+
+@app.route('/styles/catalog', methods=['GET'])
+def get_styles_catalog():
+    """全部主题的元数据（file、id、name、enName）"""
+    return jsonify(theme_cache.catalog())
 
 @app.route('/styles/refresh', methods=['POST'])
 def refresh_styles():
-    """Force refresh of CSS styles cache"""
+    """
+    Force refresh of CSS styles cache
+    清空本进程的主题缓存、渲染缓存（包括共享目录）和增量渲染的块缓存，并通知已连接的编辑器重新加载
+    """
     try:
-        styles = [f for f in os.listdir('./themes') if f.endswith('.css')]
+        theme_cache.invalidate()
+        render_cache.clear()
+        incremental_renderer.clear()
+        theme_events.publish('refresh', {})
+        styles = theme_cache.names()
         return jsonify({
             'status': 'success',
             'message': 'Styles cache refreshed',
@@ -123,95 +344,152 @@ def refresh_styles():
         }), 500
 
 
+@app.route('/styles/events', methods=['GET'])
+def get_style_events():
+    """
+    以Server-Sent Events推送主题变化，连接保持 THEME_EVENTS_TIMEOUT 秒后关闭，由浏览器自动重连
+    - theme：{"theme", "version", "deleted"}，主题文件变化后已重新编译，deleted为true时主题已删除
+    - refresh：/styles/refresh 清空了全部缓存
+    """
+    timeout = float(os.getenv('THEME_EVENTS_TIMEOUT', '300'))
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID', ''))
+    except ValueError:
+        last_event_id = None
+
+    def generate():
+        deadline = time.time() + timeout
+        subscription = theme_events.subscribe(last_event_id)
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    event = subscription.get(timeout=min(remaining, 15))
+                except queue.Empty:
+                    # 注释行保持连接，代理不会因空闲而断开
+                    yield ': keepalive\n\n'
+                    continue
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'], ensure_ascii=False)}\n\n"
+        finally:
+            theme_events.unsubscribe(subscription)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def record_render_timings(timings):
+    for stage, seconds in timings.items():
+        render_stage_seconds.observe(seconds, stage=stage)
+
+def render_document(markdown_content, style_name, dash_separator=False, timings=None):
+    """
+    渲染Markdown，返回 (html, title)；启用渲染进程池时在进程池中执行
+    timings不为None时写入各阶段的耗时
+    """
+    if render_executor is not None:
+        html, title, stage_timings = render_executor.render(markdown_content, style_name, dash_separator)
+    else:
+        result = pipeline.render(markdown_content, style_name, dash_separator)
+        html, title, stage_timings = result.html, result.title, result.timings
+    record_render_timings(stage_timings)
+    if timings is not None:
+        timings.update(stage_timings)
+    return html, title
+
+def server_timing_header(timings):
+    """Server-Timing响应头，耗时单位为毫秒"""
+    return ', '.join(
+        f'{name};dur={seconds * 1000:.2f}' if isinstance(seconds, float) else f'{name};desc={seconds}'
+        for name, seconds in timings.items()
+    )
+
+def render_busy_response(e):
+    """渲染进程池繁忙（队列已满或超时）时返回503和Retry-After"""
+    retry_after = e.retry_after if isinstance(e, RenderQueueFull) else render_executor.retry_after
+    logger.warning(f"Render executor busy: {str(e)}")
+    return jsonify({'errcode': 503, 'errmsg': '渲染服务繁忙，请稍后重试'}), 503, {'Retry-After': str(retry_after)}
+
+def render_cache_key(markdown_content, style_name, dash_separator=False):
+    """相同内容、主题、主题版本和渲染选项的渲染结果可以直接复用"""
+    # Load the selected stylesheet (resolved CSS is cached per theme)
+    theme = pipeline.resolve_theme(style_name)
+    return make_render_key(markdown_content, style_name, theme.version if theme else '',
+                           {'dashseparator': dash_separator})
+
+def render_cached(cache_key, markdown_content, style_name, dash_separator=False, timings=None):
+    """返回渲染结果（bytes），未命中缓存时渲染并写入缓存；timings中记录是否命中缓存和各阶段耗时"""
+    wrapped_content = render_cache.get(cache_key)
+    if wrapped_content is None:
+        if timings is not None:
+            timings['cache'] = 'miss'
+        wrapped_content = render_document(markdown_content, style_name, dash_separator, timings)[0].encode('utf-8')
+        render_cache.put(cache_key, wrapped_content)
+    elif timings is not None:
+        timings['cache'] = 'hit'
+    return wrapped_content
+
 @app.route('/render', methods=['POST'])
 def render_markdown():
     data = request.get_json()
     md_content = data.get('md', '')
     style_name = data.get('style', 'default')
+    # 卡片模式与/wechat/send_draft的dashseparator一致，预览即发布效果
+    dash_separator = bool(data.get('dashseparator', False))
 
-    # Convert Markdown to HTML
-    html_content = markdown.markdown(
-        md_content,
-        extensions=[
-            'fenced_code',
-            'tables',
-            'nl2br',
-            'pymdownx.superfences',
-            'pymdownx.magiclink'
-        ],
-        extension_configs={
-            'pymdownx.superfences': {
-                'custom_fences': [
-                    {
-                        'name': 'mermaid',
-                        'class': 'mermaid',
-                        'format': lambda source, language, css_class, options, md, **kwargs: f'<div class="{css_class}">{source}</div>'
-                    }
-                ]
-            }
-        }
-    )
+    started = time.perf_counter()
+    cache_key = render_cache_key(md_content, style_name, dash_separator)
+    headers = {'Content-Type': 'text/html', 'ETag': f'"{cache_key}"', 'Vary': 'Accept-Encoding'}
+    if request.if_none_match.contains_weak(cache_key):
+        return '', 304, headers
 
-    # Load the selected stylesheet
-    custom_css = ''
+    # 流式渲染：逐块内联并发送，不在内存中拼出整篇HTML，也不写入渲染缓存
+    if data.get('stream') or len(md_content) >= RENDER_STREAM_THRESHOLD:
+        wrapped_content = render_cache.get(cache_key)
+        if wrapped_content is not None:
+            headers['Server-Timing'] = server_timing_header({'cache': 'hit', 'total': time.perf_counter() - started})
+            return compress_response(app.make_response((wrapped_content, 200, headers)))
+        chunks = incremental_renderer.stream(md_content, style_name, dash_separator)
+        if chunks is not None:
+            # 响应头发送时渲染尚未开始，只能报告准备阶段的耗时
+            headers['Server-Timing'] = server_timing_header({'cache': 'stream', 'total': time.perf_counter() - started})
+            return compress_response(Response(stream_with_context(chunks), 200, headers))
+
+    timings = {}
     try:
-        # Security: Ensure style_name is a valid filename and doesn't contain path traversal characters.
-        if '..' not in style_name and style_name.endswith('.css'):
-            with open(f'./themes/{style_name}', 'r', encoding='utf-8') as f:
-                custom_css = f.read()
-                # 解析CSS变量
-                custom_css = resolve_css_variables(custom_css)
-    except FileNotFoundError:
-        # Handle case where style file doesn't exist
-        pass
-    
-    # 创建完整的HTML文档用于CSS内联
-    if custom_css:
-        full_html = f'''
-<!DOCTYPE html>
-<html>
-<head>
-<style>
-{custom_css}
-</style>
-</head>
-<body>
-<div class="markdown-body">
-{html_content}
-</div>
-</body>
-</html>'''
-        
-        # 执行CSS内联
-        inlined_html = inline(full_html)
-        
-        # 提取body中的内容，保持markdown-body容器，并用<section>标签包裹
-        from bs4 import BeautifulSoup
-        soup = BeautifulSoup(inlined_html, 'html.parser')
-        
-        # 获取markdown-body容器的背景色样式
-        markdown_body = soup.find(class_='markdown-body')
-        container_bg_style = ""
-        if markdown_body and markdown_body.get('style'):
-            # 提取背景相关的样式
-            style_attr = markdown_body.get('style')
-            bg_styles = []
-            for style_part in style_attr.split(';'):
-                style_part = style_part.strip()
-                if style_part.startswith(('background', 'padding', 'border-radius', 'box-shadow')):
-                    bg_styles.append(style_part)
-            if bg_styles:
-                container_bg_style = f' style="{"; ".join(bg_styles)}"'
-        
-        # 获取body标签的内部内容（不包括body标签本身）
-        body_content = ''.join([str(child) for child in soup.body.children])
-        wrapped_content = f'<section{container_bg_style}>{body_content}</section>'
-        
-        return wrapped_content, 200, {'Content-Type': 'text/html'}
-    else:
-        # 如果没有CSS，直接用<section>标签包裹内容
-        wrapped_content = f'<section><div class="markdown-body">{html_content}</div></section>'
-        return wrapped_content, 200, {'Content-Type': 'text/html'}
+        wrapped_content = render_cached(cache_key, md_content, style_name, dash_separator, timings)
+    except (RenderQueueFull, RenderTimeout) as e:
+        return render_busy_response(e)
+    timings['total'] = time.perf_counter() - started
+    headers['Server-Timing'] = server_timing_header(timings)
+    return compress_response(app.make_response((wrapped_content, 200, headers)))
+
+@app.route('/render/blocks', methods=['POST'])
+def render_markdown_blocks():
+    """
+    增量预览渲染
+    请求：{md, style, dashseparator, known: [客户端已持有的块ID]}
+    响应：mode为blocks时按 prefix + order中各块的HTML（以separator连接） + suffix 拼接，
+    blocks中只包含客户端没有的块；不能按块渲染时mode为full，html为整篇渲染结果
+    """
+    data = request.get_json()
+    md_content = data.get('md', '')
+    style_name = data.get('style', 'default')
+    dash_separator = bool(data.get('dashseparator', False))
+    known = data.get('known') or []
+
+    result = incremental_renderer.render(md_content, style_name, dash_separator, known)
+    if result is not None:
+        result['mode'] = 'blocks'
+        return compress_response(jsonify(result))
+
+    try:
+        html = render_cached(render_cache_key(md_content, style_name, dash_separator),
+                             md_content, style_name, dash_separator)
+    except (RenderQueueFull, RenderTimeout) as e:
+        return render_busy_response(e)
+    return compress_response(jsonify({'mode': 'full', 'html': html.decode('utf-8'), 'title': extract_title(md_content)}))
 
 @app.route('/wechat/access_token', methods=['POST'])
 def get_wechat_access_token():
@@ -233,29 +511,107 @@ def get_wechat_access_token():
         print("Missing secret")
         return jsonify({'errcode': 400, 'errmsg': '缺少secret'}), 400
 
-    # 构造微信API请求
-    url = f'https://api.weixin.qq.com/cgi-bin/token?grant_type=client_credential&appid={appid}&secret={secret}'
-    print(f"Requesting WeChat API: {url}")
-    
+    # 缓存中没有可用的token时才请求微信API
     try:
-        response = requests.get(url, timeout=10)
-        print(f"WeChat API response status: {response.status_code}")
-        result = response.json()
-        print(f"WeChat API response data: {result}")
-        
-        # 检查微信API是否返回错误
-        if 'errcode' in result and result['errcode'] != 0:
-            print(f"WeChat API returned error: {result}")
-            return jsonify(result), 400
-        
+        result = token_manager.get_token(appid, secret)
         print("Successfully obtained access_token")
         return jsonify(result), 200
+    except WeChatTokenError as e:
+        # 检查微信API是否返回错误
+        print(f"WeChat API returned error: {e.result}")
+        return jsonify(e.result), 400
     except Exception as e:
         print(f"Exception occurred: {str(e)}")
         return jsonify({'errcode': 500, 'errmsg': f'请求微信API失败: {str(e)}'}), 500
     except Exception as e:
         return jsonify({'errcode': 500, 'errmsg': f'请求微信API失败: {str(e)}'}), 500
 
+def add_draft_with_cached_token(appid, secret, access_token, articles):
+    """提交草稿，缓存的token被微信拒绝时强制刷新后重试一次"""
+    result = wechat_client.add_draft(access_token, articles)
+    logger.info(f"WeChat API response data: {result}")
+    
+    if result.get('errcode') in INVALID_TOKEN_ERRCODES:
+        # 缓存的token已在别处被刷新或提前失效，强制刷新后重试一次
+        logger.warning(f"Cached access_token rejected ({result.get('errcode')}), refreshing")
+        access_token = token_manager.get_token(appid, secret, force_refresh=True,
+                                           rejected_token=access_token)['access_token']
+        result = wechat_client.add_draft(access_token, articles)
+        logger.info(f"WeChat API response data: {result}")
+    return result
+
+def upload_images_with_cached_token(appid, secret, access_token, contents):
+    """
+    上传文章HTML中的图片并替换src，缓存的token被微信拒绝时强制刷新后重试一次（已上传的图片不会重复上传）
+    返回 (替换后的HTML列表, 图片处理结果, access_token)；未启用图片上传时结果为None
+    """
+    if image_uploader is None:
+        return contents, None, access_token
+    try:
+        contents, report = image_uploader.upload_images(contents, access_token, appid)
+    except WeChatAPIError as e:
+        logger.warning(f"Cached access_token rejected while uploading images ({e.result.get('errcode')}), refreshing")
+        access_token = token_manager.get_token(appid, secret, force_refresh=True,
+                                           rejected_token=access_token)['access_token']
+        contents, report = image_uploader.upload_images(contents, access_token, appid)
+    logger.info(f"Article images: {report['uploaded']} uploaded, {report['cached']} cached, "
+                f"{len(report['failed'])} failed")
+    return contents, report, access_token
+
+def upload_article_images(data, appid, secret, access_token, contents):
+    """
+    发布流程中的图片阶段，请求中 "upload_images": false 时跳过；
+    返回 (HTML列表, 图片处理结果, access_token, 错误)，错误为 (响应数据, HTTP状态码) 或None
+    """
+    if not data.get('upload_images', True):
+        return contents, None, access_token, None
+    try:
+        contents, report, access_token = upload_images_with_cached_token(appid, secret, access_token, contents)
+        return contents, report, access_token, None
+    except WeChatAPIError as e:
+        logger.error(f"WeChat API returned error while uploading images: {e.result}")
+        return contents, None, access_token, (e.result, 400)
+    except Exception as e:
+        logger.error(f"Exception occurred while uploading images: {str(e)}")
+        return contents, None, access_token, ({'errcode': 500, 'errmsg': f'上传图片失败: {str(e)}'}, 500)
+
+def publish_draft(data):
+    """渲染单篇Markdown并发送到微信草稿箱，返回 (响应数据, HTTP状态码)"""
+    appid = data.get('appid')
+    secret = data.get('secret')
+    
+    # 1. 获取access_token
+    logger.info("Getting access_token")
+    try:
+        access_token = token_manager.get_token(appid, secret)['access_token']
+    except Exception as e:
+        return token_error(e)
+    
+    # 2. 渲染Markdown为HTML（与/render共用同一渲染流水线），标题在切分卡片的同一次扫描中提取
+    logger.info("Rendering Markdown to HTML")
+    try:
+        wrapped_content, title = render_document(*render_args(data))
+    except Exception as e:
+        return render_error(e)
+    logger.info(f"Extracted title: {title}")
+    
+    # 3. 上传图片并替换src
+    (wrapped_content,), images, access_token, error = upload_article_images(
+        data, appid, secret, access_token, [wrapped_content])
+    if error is not None:
+        return error
+    
+    # 4. 发送到微信草稿箱
+    articles = {
+        'articles': [build_draft_article(title, wrapped_content, data.get('thumb_media_id', ''))]
+    }
+    try:
+        logger.info("Sending request to WeChat API: /cgi-bin/draft/add")
+        result = add_draft_with_cached_token(appid, secret, access_token, articles)
+    except Exception as e:
+        return draft_error(e)
+    return draft_response(result, images)
+
 @app.route('/wechat/send_draft', methods=['POST'])
 def send_markdown_to_wechat_draft():
     """
@@ -265,237 +621,141 @@ def send_markdown_to_wechat_draft():
     data = request.get_json()
     logger.info(f"Received send draft request data: {data}")
     
-    # 获取参数
-    appid = data.get('appid')
-    secret = data.get('secret')
-    markdown_content = data.get('markdown')
-    style = data.get('style', 'sample.css')
-    thumb_media_id = data.get('thumb_media_id', '')
-    dash_separator = data.get('dashseparator', False)
-    
     # 验证必需参数
-    if not appid:
-        return jsonify({'errcode': 400, 'errmsg': '缺少appid'}), 400
+    errmsg = validate_send_draft(data)
+    if errmsg:
+        return jsonify({'errcode': 400, 'errmsg': errmsg}), 400
     
-    if not secret:
-        return jsonify({'errcode': 400, 'errmsg': '缺少secret'}), 400
+    if data.get('async'):
+        # 后台执行，立即返回任务ID
+        return submit_publish_job('send_draft', data, {'appid': data['appid'], 'style': data.get('style', 'sample.css')})
     
-    if not markdown_content:
-        return jsonify({'errcode': 400, 'errmsg': '缺少Markdown内容'}), 400
+    response, status_code = publish_draft(data)
+    return jsonify(response), status_code
+
+def publish_draft_batch(data):
+    """并发渲染多篇Markdown并作为一条多图文草稿发送，返回 (响应数据, HTTP状态码)"""
+    appid = data.get('appid')
+    secret = data.get('secret')
+    items = data.get('articles')
     
-    # 1. 获取access_token
-    logger.info("Getting access_token from WeChat API")
-    token_url = f'https://api.weixin.qq.com/cgi-bin/token?grant_type=client_credential&appid={appid}&secret={secret}'
+    # 1. 并发渲染，同时获取access_token
+    logger.info(f"Rendering {len(items)} articles")
+    futures = [batch_render_executor.submit(render_document, *render_args(item)) for item in items]
     
+    token_failure = None
     try:
-        token_response = requests.get(token_url, timeout=10)
-        token_result = token_response.json()
-        
-        if 'errcode' in token_result and token_result['errcode'] != 0:
-            logger.error(f"Failed to get access_token: {token_result}")
-            return jsonify(token_result), 400
-        
-        access_token = token_result['access_token']
-        logger.info("Successfully obtained access_token")
+        access_token = token_manager.get_token(appid, secret)['access_token']
     except Exception as e:
-        logger.error(f"Exception occurred while getting access_token: {str(e)}")
-        return jsonify({'errcode': 500, 'errmsg': f'获取access_token失败: {str(e)}'}), 500
-    
-    # 2. 提取标题
-    title = '默认标题'
-    lines = markdown_content.split('\n')
-    for line in lines:
-        if line.startswith('#') and not line.startswith('##'):
-            title = line.replace('#', '', 1).strip()
-            break
-    
-    logger.info(f"Extracted title: {title}")
+        token_failure = token_error(e)
     
-    # 3. 渲染Markdown为HTML（使用现有的/render接口逻辑）
-    logger.info("Rendering Markdown to HTML")
-    try:
-        # 处理dash separator逻辑
-        if dash_separator:
-            logger.info("Processing dash separator mode")
-            # 按 --- 分割内容
-            sections = markdown_content.split('---')
-            logger.info(f"Found {len(sections)} sections after splitting by ---")
-            
-            html_sections = []
-            for i, section in enumerate(sections):
-                section = section.strip()
-                if not section:
-                    continue
-                    
-                logger.info(f"Processing section {i+1}: {section[:50]}...")
-                
-                # 渲染每个section的Markdown
-                section_html = markdown.markdown(
-                    section,
-                    extensions=[
-                        'fenced_code',
-                        'tables',
-                        'nl2br',
-                        'pymdownx.superfences',
-                        'pymdownx.magiclink'
-                    ],
-                    extension_configs={
-                        'pymdownx.superfences': {
-                            'custom_fences': [
-                                {
-                                    'name': 'mermaid',
-                                    'class': 'mermaid',
-                                    'format': lambda source, language, css_class, options, md, **kwargs: f'<div class="{css_class}">{source}</div>'
-                                }
-                            ]
-                        }
-                    }
-                )
-                
-                # 第一个section用普通div，其余用section-card
-                if i == 0:
-                    html_sections.append(f'<div class="content-card">{section_html}</div>')
-                else:
-                    html_sections.append(f'<div class="section-card">{section_html}</div>')
-            
-            # 合并所有section的HTML内容
-            html_content = ''.join(html_sections)
-            logger.info(f"Generated HTML with {len(html_sections)} sections")
-        else:
-            # 正常模式：直接渲染整个内容
-            html_content = markdown.markdown(
-                markdown_content,
-                extensions=[
-                    'fenced_code',
-                    'tables',
-                    'nl2br',
-                    'pymdownx.superfences',
-                    'pymdownx.magiclink'
-                ],
-                extension_configs={
-                    'pymdownx.superfences': {
-                        'custom_fences': [
-                            {
-                                'name': 'mermaid',
-                                'class': 'mermaid',
-                                'format': lambda source, language, css_class, options, md, **kwargs: f'<div class="{css_class}">{source}</div>'
-                            }
-                        ]
-                    }
-                }
-            )
-        
-        # 加载CSS并内联
-        custom_css = ''
+    results = []
+    for future in futures:
         try:
-            if '..' not in style and style.endswith('.css'):
-                with open(f'./themes/{style}', 'r', encoding='utf-8') as f:
-                    custom_css = f.read()
-                    # 解析CSS变量
-                    custom_css = resolve_css_variables(custom_css)
-        except FileNotFoundError:
-            pass
-        
-        # 创建完整的HTML文档用于CSS内联
-        if custom_css:
-            # 如果使用dash separator，我们需要为所有section应用样式
-            if dash_separator:
-                # 为每个section添加正确的类名，然后整体包裹在markdown-body中
-                wrapped_html_content = f'<div class="markdown-body">{html_content}</div>'
-            else:
-                # 正常模式直接使用
-                wrapped_html_content = f'<div class="markdown-body">{html_content}</div>'
-                
-            full_html = f'''
-<!DOCTYPE html>
-<html>
-<head>
-<style>
-{custom_css}
-</style>
-</head>
-<body>
-{wrapped_html_content}
-</body>
-</html>'''
-            
-            # 执行CSS内联
-            inlined_html = inline(full_html)
-            
-            # 提取body中的内容并用<section>标签包裹，同时保持markdown-body容器
-            from bs4 import BeautifulSoup
-            soup = BeautifulSoup(inlined_html, 'html.parser')
-            
-            # 获取markdown-body容器的背景色样式
-            markdown_body = soup.find(class_='markdown-body')
-            container_bg_style = ""
-            if markdown_body and markdown_body.get('style'):
-                # 提取背景相关的样式
-                style_attr = markdown_body.get('style')
-                bg_styles = []
-                for style_part in style_attr.split(';'):
-                    style_part = style_part.strip()
-                    if style_part.startswith(('background', 'padding', 'border-radius', 'box-shadow')):
-                        bg_styles.append(style_part)
-                if bg_styles:
-                    container_bg_style = f' style="{"; ".join(bg_styles)}"'
-            
-            # 获取body标签的内部内容（不包括body标签本身）
-            body_content = ''.join([str(child) for child in soup.body.children])
-            wrapped_content = f'<section{container_bg_style}>{body_content}</section>'
-        else:
-            # 如果没有CSS，直接用<section>标签包裹内容
-            wrapped_content = f'<section><div class="markdown-body">{html_content}</div></section>'
-        
-        logger.info("Successfully rendered and inlined HTML")
-    except Exception as e:
-        logger.error(f"Exception occurred while rendering Markdown: {str(e)}")
-        return jsonify({'errcode': 500, 'errmsg': f'渲染Markdown失败: {str(e)}'}), 500
+            results.append(future.result())
+        except Exception as e:
+            results.append(e)
+    statuses, rendered = collect_renders(items, results)
     
-    # 4. 发送到微信草稿箱
-    logger.info("Sending to WeChat draft")
-    draft_url = f'https://api.weixin.qq.com/cgi-bin/draft/add?access_token={access_token}'
+    if token_failure is not None:
+        return token_failure
+    if len(rendered) < len(items):
+        return batch_render_failed(statuses)
     
-    # 处理Unicode编码问题
-    encoded_title = title.encode('utf-8').decode('latin-1') if isinstance(title, str) else title
-    encoded_content = wrapped_content.encode('utf-8').decode('latin-1') if isinstance(wrapped_content, str) else wrapped_content
+    # 2. 所有文章的图片一起上传，相同的图片只上传一次
+    contents, images, access_token, error = upload_article_images(
+        data, appid, secret, access_token, [html for _, html, _ in rendered])
+    if error is not None:
+        return batch_error(error, statuses)
     
-    article = {
-        'title': encoded_title,
-        'author': '',
-        'digest': '',
-        'content': encoded_content,
-        'content_source_url': '',
-        'need_open_comment': 1,
-        'only_fans_can_comment': 1
-    }
+    # 3. 一次提交所有文章
+    try:
+        logger.info(f"Sending {len(rendered)} articles to WeChat draft")
+        result = add_draft_with_cached_token(
+            appid, secret, access_token, {'articles': build_batch_articles(rendered, contents)})
+    except Exception as e:
+        return draft_error(e, statuses)
+    return batch_draft_response(result, images, statuses)
+
+@app.route('/wechat/send_draft_batch', methods=['POST'])
+def send_markdown_batch_to_wechat_draft():
+    """
+    将多篇Markdown渲染后作为一条多图文草稿发送到微信草稿箱
+    各篇文章并发渲染，access_token只获取一次，所有文章在同一个draft/add请求中提交；
+    返回每篇文章的处理状态，任何一篇渲染失败时不会创建草稿
+    """
+    logger.info("Received request to /wechat/send_draft_batch")
+    data = request.get_json()
     
-    # 只有当thumb_media_id不为空时才添加
-    if thumb_media_id and thumb_media_id.strip() != '':
-        article['thumb_media_id'] = thumb_media_id
-        logger.info(f"Adding thumb_media_id: {thumb_media_id}")
+    errmsg = validate_send_draft_batch(data)
+    if errmsg:
+        return jsonify({'errcode': 400, 'errmsg': errmsg}), 400
     
-    articles = {
-        'articles': [article]
-    }
+    if data.get('async'):
+        return submit_publish_job('send_draft_batch', data, {'appid': data['appid'], 'articles': len(data['articles'])})
     
+    response, status_code = publish_draft_batch(data)
+    return jsonify(response), status_code
+
+def _publish_job_handler(publish):
+    """把返回 (响应数据, HTTP状态码) 的发布函数包装为任务handler"""
+    def handler(payload):
+        response, status_code = publish(payload)
+        result = {'status_code': status_code, 'response': response}
+        if status_code >= 400:
+            raise JobFailed(str(response.get('errmsg', status_code)), result)
+        return result
+    return handler
+
+job_queue.register('send_draft', _publish_job_handler(publish_draft))
+job_queue.register('send_draft_batch', _publish_job_handler(publish_draft_batch))
+
+def submit_publish_job(kind, data, summary):
+    """提交后台发布任务，返回202和任务ID"""
     try:
-        logger.info(f"Sending request to WeChat API: {draft_url}")
-        logger.info(f"Request data: {articles}")
-        draft_response = requests.post(draft_url, json=articles, timeout=10)
-        logger.info(f"WeChat API response status: {draft_response.status_code}")
-        result = draft_response.json()
-        logger.info(f"WeChat API response data: {result}")
-        
-        if 'errcode' in result and result['errcode'] != 0:
-            logger.error(f"WeChat API returned error: {result}")
-            return jsonify(result), 400
-        
-        logger.info("Successfully sent to WeChat draft")
-        return jsonify(result), 200
-    except Exception as e:
-        logger.error(f"Exception occurred while sending to WeChat draft: {str(e)}")
-        return jsonify({'errcode': 500, 'errmsg': f'发送到微信草稿箱失败: {str(e)}'}), 500
+        job_id = job_queue.submit(kind, data, summary)
+    except QueueFullError:
+        logger.warning("Job queue is full, rejecting publish request")
+        return jsonify({'errcode': 503, 'errmsg': '任务队列已满，请稍后重试'}), 503
+    logger.info(f"Submitted {kind} job {job_id}")
+    return jsonify({
+        'errcode': 0,
+        'job_id': job_id,
+        'status': 'queued',
+        'status_url': f'/jobs/{job_id}',
+        'events_url': f'/jobs/{job_id}/events',
+    }), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """查询后台任务状态"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'errcode': 404, 'errmsg': '任务不存在'}), 404
+    return jsonify(job), 200
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def get_job_events(job_id):
+    """以Server-Sent Events推送任务状态变化，任务结束或超时后关闭连接"""
+    if job_queue.get(job_id) is None:
+        return jsonify({'errcode': 404, 'errmsg': '任务不存在'}), 404
+
+    timeout = float(os.getenv('JOB_EVENTS_TIMEOUT', '60'))
+
+    def generate():
+        deadline = time.time() + timeout
+        last_status = None
+        while True:
+            job = job_queue.get(job_id)
+            if job['status'] != last_status:
+                last_status = job['status']
+                yield f'event: status\ndata: {json.dumps(job, ensure_ascii=False)}\n\n'
+            if job['status'] in FINISHED_STATUSES or time.time() >= deadline:
+                break
+            time.sleep(0.5)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/wechat/draft', methods=['POST'])
 def send_to_wechat_draft():
@@ -507,68 +767,21 @@ def send_to_wechat_draft():
     data = request.get_json()
     logger.info(f"Received draft request data: {data}")
     
-    access_token = data.get('access_token')
-    title = data.get('title', '默认标题')
-    content = data.get('content')
-    author = data.get('author', '')
-    digest = data.get('digest', '')
-    content_source_url = data.get('content_source_url', '')
-    thumb_media_id = data.get('thumb_media_id', '')
-    need_open_comment = data.get('need_open_comment', 1)
-    only_fans_can_comment = data.get('only_fans_can_comment', 1)
-
-    if not access_token:
-        return jsonify({'errcode': 400, 'errmsg': '缺少access_token'}), 400
-    
-    if not content:
-        return jsonify({'errcode': 400, 'errmsg': '缺少内容'}), 400
-
-    # 构造微信API请求
-    url = f'https://api.weixin.qq.com/cgi-bin/draft/add?access_token={access_token}'
-    
-    # 构造文章内容
-    article = {
-        'title': title,
-        'author': author,
-        'digest': digest,
-        'content': content,
-        'content_source_url': content_source_url,
-        'need_open_comment': need_open_comment,
-        'only_fans_can_comment': only_fans_can_comment
-    }
-    
-    # 只有当thumb_media_id不为空时才添加
-    if thumb_media_id and thumb_media_id.strip() != '':
-        article['thumb_media_id'] = thumb_media_id
-        logger.info(f"Adding thumb_media_id: {thumb_media_id}")
-    else:
-        logger.info("No thumb_media_id provided")
-    
-    articles = {
-        'articles': [article]
-    }
-    
-    logger.info(f"Sending article to WeChat: {articles}")
+    errmsg = validate_raw_draft(data)
+    if errmsg:
+        return jsonify({'errcode': 400, 'errmsg': errmsg}), 400
     
+    articles = {'articles': [build_raw_draft_article(data)]}
     try:
-        logger.info(f"Sending request to WeChat API: {url}")
+        logger.info("Sending request to WeChat API: /cgi-bin/draft/add")
         logger.info(f"Request data: {articles}")
-        response = requests.post(url, json=articles, timeout=10)
-        logger.info(f"WeChat API response status: {response.status_code}")
-        result = response.json()
-        logger.info(f"WeChat API response data: {result}")
-        
-        if 'errcode' in result and result['errcode'] != 0:
-            logger.info(f"WeChat API returned error: {result}")
-            return jsonify(result), 400
-        
-        logger.info("Successfully sent to WeChat draft")
-        return jsonify(result), 200
+        result = wechat_client.add_draft(data['access_token'], articles)
     except Exception as e:
-        logger.error(f"Exception occurred: {str(e)}")
-        return jsonify({'errcode': 500, 'errmsg': f'请求微信API失败: {str(e)}'}), 500
-    except Exception as e:
-        return jsonify({'errcode': 500, 'errmsg': f'请求微信API失败: {str(e)}'}), 500
+        response, status_code = raw_draft_error(e)
+        return jsonify(response), status_code
+    logger.info(f"WeChat API response data: {result}")
+    response, status_code = draft_response(result)
+    return jsonify(response), status_code
 
 if __name__ == '__main__':
     import os
@@ -0,0 +1,271 @@
+"""
+ASGI服务入口
+    uvicorn asgi_server:app --host 0.0.0.0 --port 5002
+
+与 api_server.py 提供相同的路由：
+- 发布到微信的接口（/wechat/send_draft、/wechat/send_draft_batch、/wechat/draft）在事件循环中处理，
+  用httpx异步调用微信接口，等待微信响应时不占用线程；Markdown渲染提交到进程池，不阻塞事件循环
+- 渲染进程池（render_executor.py）默认启用，进程数为CPU核数，可用 RENDER_EXECUTOR_WORKERS 调整
+- 其他路由（/render、主题、静态文件、任务查询等）通过a2wsgi交给Flask应用，在线程池中执行
+
+依赖：pip install "md2any[asgi]"（a2wsgi、httpx、uvicorn）
+"""
+
+import asyncio
+import functools
+import json
+import logging
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+from a2wsgi import WSGIMiddleware
+
+# ASGI模式下默认启用渲染进程池（/render 和发布接口共用），必须在导入api_server之前设置
+os.environ.setdefault('RENDER_EXECUTOR_WORKERS', str(os.cpu_count() or 1))
+
+import api_server
+from draft_publish import (
+    batch_draft_response, batch_error, batch_render_failed, build_batch_articles, build_draft_article,
+    build_raw_draft_article, collect_renders, draft_error, draft_response, raw_draft_error, render_args,
+    render_error, token_error, validate_raw_draft, validate_send_draft, validate_send_draft_batch,
+)
+from wechat_client import create_async_wechat_client_from_env
+
+logger = logging.getLogger(__name__)
+
+flask_app = WSGIMiddleware(api_server.app, workers=int(os.getenv('ASGI_WSGI_THREADS', '10')))
+
+
+class _State:
+    """事件循环中共享的异步客户端，首次使用时创建"""
+
+    client = None
+
+
+def _get_client():
+    if _State.client is None:
+        _State.client = create_async_wechat_client_from_env()
+        _State.client.add_request_hook(api_server.observe_wechat_request)
+    return _State.client
+
+
+async def _run_in_thread(func, *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+
+async def _render(markdown_content, style, dash_separator):
+    """在渲染进程池中渲染，返回 (html, title)；队列已满时抛出 RenderQueueFull"""
+    executor = api_server.render_executor
+    if executor is None:
+        return await _run_in_thread(api_server.render_document, markdown_content, style, dash_separator)
+    for _ in range(2):
+        future = executor.submit(markdown_content, style, dash_separator)
+        try:
+            html, title, timings = await asyncio.wait_for(asyncio.wrap_future(future), executor.timeout)
+            break
+        except BrokenProcessPool:
+            # 工作进程异常退出：再提交一次（提交时重建进程池），不在服务进程中渲染
+            logger.warning("Render worker process died while rendering, retrying in a new process pool")
+    else:
+        raise executor.crashed()
+    api_server.record_render_timings(timings)
+    return html, title
+
+
+async def _get_access_token(appid, secret, force_refresh=False, rejected_token=None):
+    # token在进程间共享缓存，通常直接命中；刷新时在线程中执行，保持跨worker的单次刷新
+    result = await _run_in_thread(api_server.token_manager.get_token, appid, secret,
+                                  force_refresh=force_refresh, rejected_token=rejected_token)
+    return result['access_token']
+
+
+async def _add_draft_with_cached_token(appid, secret, access_token, articles):
+    """提交草稿，缓存的token被微信拒绝时强制刷新后重试一次"""
+    client = _get_client()
+    result = await client.add_draft(access_token, articles)
+    logger.info(f"WeChat API response data: {result}")
+
+    if result.get('errcode') in api_server.INVALID_TOKEN_ERRCODES:
+        logger.warning(f"Cached access_token rejected ({result.get('errcode')}), refreshing")
+        access_token = await _get_access_token(appid, secret, force_refresh=True, rejected_token=access_token)
+        result = await client.add_draft(access_token, articles)
+        logger.info(f"WeChat API response data: {result}")
+    return result
+
+
+async def publish_draft(data):
+    """api_server.publish_draft 的异步版本，返回 (响应数据, HTTP状态码)"""
+    appid = data.get('appid')
+    secret = data.get('secret')
+
+    try:
+        access_token = await _get_access_token(appid, secret)
+    except Exception as e:
+        return token_error(e)
+
+    try:
+        html, title = await _render(*render_args(data))
+    except Exception as e:
+        return render_error(e)
+
+    # 图片下载/上传和SQLite缓存都是阻塞的，在线程中执行
+    (html,), images, access_token, error = await _run_in_thread(
+        api_server.upload_article_images, data, appid, secret, access_token, [html])
+    if error is not None:
+        return error
+
+    articles = {'articles': [build_draft_article(title, html, data.get('thumb_media_id', ''))]}
+    try:
+        result = await _add_draft_with_cached_token(appid, secret, access_token, articles)
+    except Exception as e:
+        return draft_error(e)
+    return draft_response(result, images)
+
+
+async def publish_draft_batch(data):
+    """api_server.publish_draft_batch 的异步版本，返回 (响应数据, HTTP状态码)"""
+    appid = data.get('appid')
+    secret = data.get('secret')
+    items = data['articles']
+
+    renders = [asyncio.ensure_future(_render(*render_args(item))) for item in items]
+
+    token_failure = None
+    try:
+        access_token = await _get_access_token(appid, secret)
+    except Exception as e:
+        token_failure = token_error(e)
+
+    statuses, rendered = collect_renders(items, await asyncio.gather(*renders, return_exceptions=True))
+    if token_failure is not None:
+        return token_failure
+    if len(rendered) < len(items):
+        return batch_render_failed(statuses)
+
+    contents, images, access_token, error = await _run_in_thread(
+        api_server.upload_article_images, data, appid, secret, access_token, [html for _, html, _ in rendered])
+    if error is not None:
+        return batch_error(error, statuses)
+
+    try:
+        result = await _add_draft_with_cached_token(
+            appid, secret, access_token, {'articles': build_batch_articles(rendered, contents)})
+    except Exception as e:
+        return draft_error(e, statuses)
+    return batch_draft_response(result, images, statuses)
+
+
+async def send_draft(data):
+    errmsg = validate_send_draft(data)
+    if errmsg:
+        return {'errcode': 400, 'errmsg': errmsg}, 400
+    return await publish_draft(data)
+
+
+async def send_draft_batch(data):
+    errmsg = validate_send_draft_batch(data)
+    if errmsg:
+        return {'errcode': 400, 'errmsg': errmsg}, 400
+    return await publish_draft_batch(data)
+
+
+async def send_raw_draft(data):
+    """/wechat/draft：直接提交已渲染好的内容"""
+    errmsg = validate_raw_draft(data)
+    if errmsg:
+        return {'errcode': 400, 'errmsg': errmsg}, 400
+    try:
+        result = await _get_client().add_draft(data['access_token'], {'articles': [build_raw_draft_article(data)]})
+    except Exception as e:
+        return raw_draft_error(e)
+    return draft_response(result)
+
+
+# 在事件循环中处理的路由；"async": true 的请求仍交给Flask提交后台任务
+ASYNC_ROUTES = {
+    '/wechat/send_draft': send_draft,
+    '/wechat/send_draft_batch': send_draft_batch,
+    '/wechat/draft': send_raw_draft,
+}
+
+
+async def _read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+async def _send_json(send, payload, status_code):
+    body = api_server.app.json.dumps(payload).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status_code,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode('latin-1')),
+            (b'access-control-allow-origin', b'*'),
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            _get_client()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            if _State.client is not None:
+                await _State.client.close()
+            if api_server.render_executor is not None:
+                api_server.render_executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+
+    handler = ASYNC_ROUTES.get(scope.get('path')) if scope['type'] == 'http' and scope['method'] == 'POST' else None
+    if handler is None:
+        await flask_app(scope, receive, send)
+        return
+
+    body = await _read_body(receive)
+    if body is None:
+        return
+    try:
+        data = json.loads(body or b'{}')
+    except ValueError:
+        await _send_json(send, {'errcode': 400, 'errmsg': '请求体不是有效的JSON'}, 400)
+        return
+
+    if isinstance(data, dict) and data.get('async'):
+        # 已经读取的请求体重新交给Flask
+        replayed = False
+
+        async def replay_receive():
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            return await receive()
+
+        await flask_app(scope, replay_receive, send)
+        return
+
+    if not isinstance(data, dict):
+        await _send_json(send, {'errcode': 400, 'errmsg': '请求体不是有效的JSON'}, 400)
+        return
+
+    logger.info(f"Received request to {scope['path']} (async)")
+    payload, status_code = await handler(data)
+    await _send_json(send, payload, status_code)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+CSS变量解析微基准
+对 themes/ 下的每个主题分别运行新旧两种解析实现并比较耗时
+
+用法: python benchmarks/bench_css_variables.py [--repeat N]
+"""
+
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from css_variables import resolve_css_variables  # noqa: E402
+
+
+def legacy_resolve_css_variables(css_content):
+    """旧实现：每个变量单独构造正则并扫描整个样式表，作为对照"""
+    variables = {}
+    for match in re.finditer(r'(--[\w-]+)\s*:\s*([^;]+);', css_content):
+        variables[match.group(1)] = match.group(2).strip().rstrip(', ')
+    resolved_css = css_content
+    for var_name, var_value in variables.items():
+        pattern = r'var\s*\(\s*' + re.escape(var_name) + r'\s*(?:,[^)]*)?\)'
+        resolved_css = re.sub(pattern, var_value, resolved_css)
+    return re.sub(r'--[\w-]+\s*:\s*[^;]+;\s*', '', resolved_css)
+
+
+def synthetic_theme(variables, rules):
+    """生成一个变量较多的大样式表，用于观察解析耗时随变量数量的增长"""
+    root = ''.join(f'  --v{i}: #{i:06x};\n' for i in range(variables))
+    body = ''.join(
+        f'.c{i} p {{ color: var(--v{i % variables}); border: 1px solid var(--v{(i * 7) % variables}); }}\n'
+        for i in range(rules)
+    )
+    return f':root {{\n{root}}}\n{body}'
+
+
+def best_of(func, css, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(css)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='CSS变量解析微基准')
+    parser.add_argument('--repeat', type=int, default=50, help='每个主题重复次数（取最好成绩）')
+    parser.add_argument('--themes-dir', default=str(ROOT / 'themes'))
+    parser.add_argument('--synthetic-vars', type=int, default=200, help='合成样式表的变量数量，0表示不生成')
+    args = parser.parse_args()
+
+    files = sorted(Path(args.themes_dir).glob('*.css'))
+    if not files:
+        print(f"❌ 未找到CSS文件: {args.themes_dir}")
+        return 1
+
+    themes = [(path.name, path.read_text(encoding='utf-8')) for path in files]
+    if args.synthetic_vars:
+        themes.append((f'<synthetic {args.synthetic_vars} vars>', synthetic_theme(args.synthetic_vars, 2000)))
+
+    print(f"{'主题':<32}{'大小':>8}{'变量':>6}{'旧实现(ms)':>12}{'新实现(ms)':>12}{'加速':>8}")
+    total_old = total_new = 0.0
+    for name, css in themes:
+        variables = len(set(re.findall(r'(--[\w-]+)\s*:', css)))
+        old = best_of(legacy_resolve_css_variables, css, args.repeat)
+        new = best_of(resolve_css_variables, css, args.repeat)
+        total_old += old
+        total_new += new
+        print(f"{name:<32}{len(css):>8}{variables:>6}{old * 1000:>12.3f}{new * 1000:>12.3f}"
+              f"{old / new if new else 0:>7.1f}x")
+
+    print("-" * 78)
+    print(f"{'合计':<46}{total_old * 1000:>12.3f}{total_new * 1000:>12.3f}"
+          f"{total_old / total_new if total_new else 0:>7.1f}x")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+渲染流水线基准
+不经过HTTP，直接调用 RenderPipeline 渲染合成文档（表格、代码块、mermaid、--- 分隔线），
+覆盖 themes/ 下的每个CSS文件和 all_themes_data.json 中的每个主题、每种文档大小、普通和卡片两种模式。
+
+每个用例先预热运行一次，再在 --budget 秒内计时运行若干次（单次超过预算的大文档只计时一次），
+最后单独运行一次用tracemalloc统计各阶段的峰值内存；报告吞吐量、总耗时和各阶段的p50/p99以及峰值内存。tracemalloc只统计Python分配的内存，
+css_inline内部的分配不计入，但内联结果（Python字符串）计入。
+
+用法:
+    python benchmarks/bench_render.py --quick                       # 1KB-100KB，适合日常对比
+    python benchmarks/bench_render.py --save-baseline               # 保存基线
+    python benchmarks/bench_render.py --baseline                    # 与基线对比，退步超过阈值时返回1
+    python benchmarks/bench_render.py --themes sample.css --sizes 1MB
+
+基线与机器相关，应在同一台机器上保存和对比。完整矩阵（到1MB）需要运行较长时间。
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from css_variables import resolve_css_variables  # noqa: E402
+from render_pipeline import STAGES, RenderPipeline  # noqa: E402
+from theme_bundle import load_theme_data  # noqa: E402
+from theme_cache import ThemeCache  # noqa: E402
+
+DEFAULT_BASELINE = ROOT / 'benchmarks' / 'render_baseline.json'
+DEFAULT_SIZES = '1KB,10KB,100KB,1MB'
+QUICK_SIZES = '1KB,10KB,100KB'
+MODES = (('plain', False), ('cards', True))
+
+# 与基线对比时忽略p50低于该值（毫秒）的阶段，避免计时噪声
+MIN_COMPARED_MS = 1.0
+
+SECTION_TEMPLATE = '''## 第{n}节 Section {n}
+
+这是第{n}节的正文，包含**粗体**、*斜体*、`行内代码`和链接 https://example.com/{n} 。
+Second line with a [named link](https://example.com/a/{n}) & some <em>inline HTML</em>.
+
+- 列表项 {n}.1
+- 列表项 {n}.2
+    - 嵌套项
+
+1. 有序项
+2. 有序项
+
+> 引用 {n}
+> 第二行
+
+| 列A | 列B | 列C |
+|-----|-----|-----|
+| {n} | b | c |
+| 1 | 2 | 3 |
+
+```python
+def f{n}(x):
+    return x * {n} < 100
+```
+
+```mermaid
+graph TD; A{n}-->B{n};
+```
+
+![图片 {n}](https://example.com/{n}.png)
+'''
+
+
+def parse_size(text):
+    text = text.strip().upper()
+    for suffix, factor in (('MB', 1024 * 1024), ('KB', 1024), ('B', 1)):
+        if text.endswith(suffix):
+            return int(float(text[:-len(suffix)]) * factor)
+    return int(text)
+
+
+def format_size(size):
+    if size >= 1024 * 1024:
+        return f'{size / (1024 * 1024):g}MB'
+    if size >= 1024:
+        return f'{size / 1024:g}KB'
+    return f'{size}B'
+
+
+def synthetic_document(size):
+    """生成约size字节（UTF-8）的文档，各节之间用 --- 分隔"""
+    parts = ['# 渲染基准文档\n']
+    total = len(parts[0].encode('utf-8'))
+    n = 0
+    while total < size:
+        n += 1
+        section = ('\n---\n\n' if n > 1 else '\n') + SECTION_TEMPLATE.format(n=n)
+        parts.append(section)
+        total += len(section.encode('utf-8'))
+    return ''.join(parts)
+
+
+def prepare_themes(themes_dir, data_file, names=None):
+    """
+    把两个来源的主题复制到临时目录，返回 (临时目录, [(显示名, 文件名)])
+    all_themes_data.json 中的CSS按JS字符串转义保存，写入前用 theme_bundle.load_theme_data 还原
+    """
+    workdir = tempfile.mkdtemp(prefix='md2any-bench-')
+    themes = []
+    for path in sorted(Path(themes_dir).glob('*.css')):
+        if names and path.name not in names:
+            continue
+        shutil.copyfile(path, os.path.join(workdir, path.name))
+        themes.append((f'themes/{path.name}', path.name))
+
+    if data_file and Path(data_file).exists():
+        for entry in load_theme_data(data_file):
+            label = f"{Path(data_file).name}#{entry['id']}"
+            if names and entry['id'] not in names and label not in names:
+                continue
+            filename = f"all_themes_data--{entry['id']}.css"
+            with open(os.path.join(workdir, filename), 'w', encoding='utf-8') as f:
+                f.write(entry['css'])
+            themes.append((label, filename))
+    return workdir, themes
+
+
+def percentile(values, pct):
+    """最近秩百分位数"""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class StageMemory:
+    """在每个阶段结束时读取tracemalloc峰值并重置，得到各阶段的峰值内存（相对阶段开始时）"""
+
+    def __init__(self):
+        self.peaks = {}
+        self._base = 0
+
+    def start(self):
+        tracemalloc.reset_peak()
+        self._base = tracemalloc.get_traced_memory()[0]
+
+    def __call__(self, stage, seconds):
+        current, peak = tracemalloc.get_traced_memory()
+        self.peaks[stage] = max(self.peaks.get(stage, 0), peak - self._base)
+        tracemalloc.reset_peak()
+        self._base = current
+
+
+def run_case(pipeline, memory, style, document, dash_separator, repeat, budget):
+    """运行一个用例，返回统计结果"""
+    # 预热：加载主题和转换器
+    started = time.perf_counter()
+    result = pipeline.render(document, style, dash_separator)
+    warmup = time.perf_counter() - started
+
+    totals = []
+    stages = {}
+
+    def record(seconds, timings):
+        totals.append(seconds)
+        for stage, stage_seconds in timings.items():
+            stages.setdefault(stage, []).append(stage_seconds)
+
+    if warmup >= budget:
+        # 单次渲染已经超过预算（大文档），预热结果即为唯一的样本
+        record(warmup, result.timings)
+    else:
+        for _ in range(max(1, min(repeat, int(budget / warmup)))):
+            started = time.perf_counter()
+            result = pipeline.render(document, style, dash_separator)
+            record(time.perf_counter() - started, result.timings)
+
+    # 单独运行一次统计峰值内存，tracemalloc会拖慢渲染，不计入耗时
+    tracemalloc.start()
+    memory.peaks = {}
+    memory.start()
+    pipeline.render(document, style, dash_separator)
+    tracemalloc.stop()
+    peaks = dict(memory.peaks)
+    runs = len(totals)
+
+    p50 = percentile(totals, 50)
+    return {
+        'runs': runs,
+        'bytes': len(document.encode('utf-8')),
+        'throughput_mb_s': len(document.encode('utf-8')) / (1024 * 1024) / p50 if p50 else 0.0,
+        'total': {'p50_ms': p50 * 1000, 'p99_ms': percentile(totals, 99) * 1000},
+        'stages': {
+            stage: {
+                'p50_ms': percentile(values, 50) * 1000,
+                'p99_ms': percentile(values, 99) * 1000,
+                'peak_kb': peaks.get(stage, 0) / 1024,
+            }
+            for stage, values in stages.items()
+        },
+        'peak_kb': max(peaks.values(), default=0) / 1024,
+    }
+
+
+def compare(results, baseline, threshold, memory_threshold):
+    """返回退步列表 [(用例, 指标, 基线值, 当前值)]"""
+    regressions = []
+    for key, current in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        checks = []
+        if base['total']['p50_ms'] >= MIN_COMPARED_MS:
+            checks.append(('total p50', base['total']['p50_ms'], current['total']['p50_ms'], threshold))
+        for stage, stats in current['stages'].items():
+            base_stage = base['stages'].get(stage)
+            if base_stage and base_stage['p50_ms'] >= MIN_COMPARED_MS:
+                checks.append((f'{stage} p50', base_stage['p50_ms'], stats['p50_ms'], threshold))
+        if base['peak_kb'] >= 64:
+            checks.append(('peak memory', base['peak_kb'], current['peak_kb'], memory_threshold))
+        for metric, old, new, limit in checks:
+            if old and (new - old) / old > limit:
+                regressions.append((key, metric, old, new))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='渲染流水线基准')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help=f'文档大小，逗号分隔（默认 {DEFAULT_SIZES}）')
+    parser.add_argument('--quick', action='store_true', help=f'只运行 {QUICK_SIZES}')
+    parser.add_argument('--themes', help='只运行指定主题，逗号分隔（文件名或all_themes_data.json中的id）')
+    parser.add_argument('--modes', default='plain,cards', help='plain（整篇）和/或 cards（按 --- 切分）')
+    parser.add_argument('--repeat', type=int, default=20, help='每个用例最多计时运行的次数')
+    parser.add_argument('--budget', type=float, default=2.0, help='每个用例计时运行的总时长上限（秒）')
+    parser.add_argument('--themes-dir', default=str(ROOT / 'themes'))
+    parser.add_argument('--themes-data', default=str(ROOT / 'all_themes_data.json'))
+    parser.add_argument('--output', help='把结果写入JSON文件')
+    parser.add_argument('--save-baseline', nargs='?', const=str(DEFAULT_BASELINE), help='把结果保存为基线')
+    parser.add_argument('--baseline', nargs='?', const=str(DEFAULT_BASELINE), help='与基线对比')
+    parser.add_argument('--threshold', type=float, default=0.25, help='耗时退步阈值（默认0.25，即慢25%%）')
+    parser.add_argument('--memory-threshold', type=float, default=0.25, help='峰值内存退步阈值')
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    sizes = [parse_size(size) for size in (QUICK_SIZES if args.quick else args.sizes).split(',')]
+    modes = [(name, dash) for name, dash in MODES if name in args.modes.split(',')]
+    names = set(args.themes.split(',')) if args.themes else None
+
+    workdir, themes = prepare_themes(args.themes_dir, args.themes_data, names)
+    if not themes:
+        print("❌ 没有找到主题")
+        return 1
+
+    # 串行渲染卡片，各阶段耗时只反映流水线本身
+    pipeline = RenderPipeline(ThemeCache(workdir, resolve_css_variables, maxsize=len(themes) + 1))
+    memory = StageMemory()
+    pipeline.add_stage_hook(memory)
+
+    documents = {size: synthetic_document(size) for size in sizes}
+    results = {}
+    print(f"{'用例':<58}{'次数':>5}{'MB/s':>8}{'p50(ms)':>10}{'p99(ms)':>10}{'峰值(KB)':>10}  最慢阶段")
+    try:
+        for size in sizes:
+            for mode, dash in modes:
+                for label, filename in themes:
+                    key = f'{label}|{format_size(size)}|{mode}'
+                    stats = run_case(pipeline, memory, filename, documents[size], dash, args.repeat, args.budget)
+                    results[key] = stats
+                    slowest = max(stats['stages'].items(), key=lambda item: item[1]['p50_ms'])
+                    print(f"{key:<58}{stats['runs']:>5}{stats['throughput_mb_s']:>8.2f}"
+                          f"{stats['total']['p50_ms']:>10.2f}{stats['total']['p99_ms']:>10.2f}"
+                          f"{stats['peak_kb']:>10.0f}  {slowest[0]} {slowest[1]['p50_ms']:.2f}ms")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print("-" * 110)
+    for size in sizes:
+        for mode, _ in modes:
+            cases = [stats for key, stats in results.items() if key.endswith(f'|{format_size(size)}|{mode}')]
+            stage_text = '  '.join(
+                f"{stage} {percentile([c['stages'][stage]['p50_ms'] for c in cases if stage in c['stages']], 50):.2f}"
+                for stage in STAGES if any(stage in c['stages'] for c in cases)
+            )
+            print(f"{format_size(size) + ' ' + mode:<14}{len(cases):>4} 个主题  各阶段p50中位数(ms): {stage_text}")
+
+    report = {
+        'generated_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cases': results,
+    }
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            print(f"💾 结果已保存到 {path}")
+
+    if args.baseline:
+        try:
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)['cases']
+        except FileNotFoundError:
+            print(f"❌ 基线不存在: {args.baseline}（先用 --save-baseline 保存）")
+            return 1
+        regressions = compare(results, baseline, args.threshold, args.memory_threshold)
+        if regressions:
+            print(f"❌ {len(regressions)} 项退步超过阈值:")
+            for key, metric, old, new in regressions:
+                print(f"   {key} {metric}: {old:.2f} -> {new:.2f} ({(new - old) / old:+.0%})")
+            return 1
+        print(f"✅ 与基线相比没有超过阈值的退步（{len(results)} 个用例）")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,254 @@
+"""
+CSS变量解析
+一次扫描样式表建立变量表（区分 :root 与 .dark-mode 作用域），
+再用一次替换把所有 var() 引用（包括嵌套引用和fallback）替换为实际值，
+整体耗时与样式表大小成线性关系
+"""
+
+import re
+
+# 变量作用域
+ROOT_SCOPE = 'root'
+DARK_SCOPE = 'dark'
+
+# 选择器中包含该类名的规则属于暗黑模式作用域
+DARK_MODE_SELECTOR = '.dark-mode'
+
+# 第一遍扫描只停在注释、字符串和变量定义处，其余文本交给正则引擎跳过
+# （以字符集开头，便于正则引擎快速定位候选位置）
+_STRUCTURE_RE = re.compile(r"""
+    [/"'-]
+    (?:
+        (?<=/)\*.*?(?:\*/|\Z)
+      | (?<=")(?:\\.|[^"\\])*"?
+      | (?<=')(?:\\.|[^'\\])*'?
+      | (?<=-)(?<![\w-]{2})(?P<name>-[\w-]+)\s*:
+    )
+""", re.S | re.X)
+
+# 变量值：直到声明结束（分号或块结束）为止，字符串中的分隔符不算
+_VALUE_RE = re.compile(r"""(?:[^;{}"']|"(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')*""", re.S)
+
+# 只匹配完整的类名，.dark-mode-toggle 等不算
+_DARK_MODE_RE = re.compile(re.escape(DARK_MODE_SELECTOR) + r'(?![\w-])')
+_BRACE_RE = re.compile(r'[{}]')
+_VAR_REF_RE = re.compile(r'var\s*\(')
+_VAR_NAME_RE = re.compile(r'\s*(--[\w-]+)\s*')
+_TRAILING_WHITESPACE_RE = re.compile(r'[ \t\r\n\f]*')
+
+
+def _find_dark_mode_blocks(css_content):
+    """返回选择器中包含 .dark-mode 的规则块内容区间 [(起点, 终点)]"""
+    blocks = []
+    pos = 0
+    while True:
+        match = _DARK_MODE_RE.search(css_content, pos)
+        if match is None:
+            return blocks
+        found = match.start()
+        open_brace = css_content.find('{', found)
+        if open_brace < 0:
+            return blocks
+        prelude = css_content[found:open_brace]
+        pos = open_brace
+        if ';' in prelude or '}' in prelude or '*/' in prelude:
+            # 出现在注释或声明中，不是选择器
+            pos = found + len(DARK_MODE_SELECTOR)
+            continue
+        depth = 0
+        for brace in _BRACE_RE.finditer(css_content, open_brace):
+            depth += 1 if brace.group() == '{' else -1
+            if depth == 0:
+                blocks.append((open_brace + 1, brace.start()))
+                pos = brace.end()
+                break
+        else:
+            blocks.append((open_brace + 1, len(css_content)))
+            return blocks
+
+
+def _scan(css_content):
+    """
+    对样式表做一次扫描
+    返回 (变量表, 片段列表)，变量表形如 {作用域: {变量名: 原始值}}，
+    片段为需要保留的 (起点, 终点, 作用域)，变量定义不在其中
+    """
+    variables = {ROOT_SCOPE: {}, DARK_SCOPE: {}}
+    dark_blocks = _find_dark_mode_blocks(css_content)
+
+    # 删除区间（变量定义）和作用域切换点，按位置排序后切出保留片段
+    events = []
+    for start, end in dark_blocks:
+        events.append((start, start, DARK_SCOPE))
+        events.append((end, end, ROOT_SCOPE))
+
+    block_index = 0
+    skip_to = 0
+    for match in _STRUCTURE_RE.finditer(css_content):
+        name = match.group('name')
+        start = match.start()
+        if not name or start < skip_to:
+            continue
+        name = '-' + name
+        value_match = _VALUE_RE.match(css_content, match.end())
+        value_end = value_match.end()
+
+        while block_index < len(dark_blocks) and dark_blocks[block_index][1] <= start:
+            block_index += 1
+        in_dark_block = block_index < len(dark_blocks) and dark_blocks[block_index][0] <= start
+        scope = DARK_SCOPE if in_dark_block else ROOT_SCOPE
+        variables[scope][name] = value_match.group().strip().rstrip(', ')
+
+        # 删除变量定义；以分号结尾时连同后续空白一起删除
+        drop_end = value_end
+        if css_content.startswith(';', value_end):
+            drop_end = _TRAILING_WHITESPACE_RE.match(css_content, value_end + 1).end()
+        events.append((start, drop_end, None))
+        skip_to = drop_end
+
+    segments = []
+    pos = 0
+    scope = ROOT_SCOPE
+    for start, end, new_scope in sorted(events, key=lambda event: event[0]):
+        segments.append((pos, start, scope))
+        if new_scope is None:
+            pos = end
+        else:
+            pos = max(pos, start)
+            scope = new_scope
+    segments.append((pos, len(css_content), scope))
+    return variables, segments
+
+
+def _parse_var(text, pos):
+    """
+    解析从pos开始（紧跟在 'var(' 之后）的变量引用
+    返回 (变量名, fallback或None, 引用结束位置)，格式不合法时返回None
+    """
+    name_match = _VAR_NAME_RE.match(text, pos)
+    if not name_match:
+        return None
+    pos = name_match.end()
+    if pos >= len(text):
+        return None
+    if text[pos] == ')':
+        return name_match.group(1), None, pos + 1
+    if text[pos] != ',':
+        return None
+
+    depth = 0
+    quote = None
+    i = pos + 1
+    while i < len(text):
+        char = text[i]
+        if quote:
+            if char == '\\':
+                i += 1
+            elif char == quote:
+                quote = None
+        elif char in ('"', "'"):
+            quote = char
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            if depth == 0:
+                return name_match.group(1), text[pos + 1:i], i + 1
+            depth -= 1
+        i += 1
+    return None
+
+
+class _Resolver:
+    """按作用域解析变量值，处理链式引用和fallback，并记忆已解析的结果"""
+
+    def __init__(self, variables):
+        self.variables = variables
+        self._resolved = {}
+        self._resolving = set()
+        self._cycles = 0
+
+    def lookup(self, name, scope):
+        # 暗黑模式规则优先使用 .dark-mode 中的定义，其余情况使用 :root 中的定义
+        if scope == DARK_SCOPE and name in self.variables[DARK_SCOPE]:
+            value = self.variables[DARK_SCOPE][name]
+        elif name in self.variables[ROOT_SCOPE]:
+            value = self.variables[ROOT_SCOPE][name]
+        elif name in self.variables[DARK_SCOPE]:
+            value = self.variables[DARK_SCOPE][name]
+        else:
+            return None
+
+        key = (name, scope)
+        if key in self._resolved:
+            return self._resolved[key]
+        if key in self._resolving:
+            # 循环引用，按CSS规范视为无效值
+            self._cycles += 1
+            return None
+        cycles = self._cycles
+        self._resolving.add(key)
+        resolved = self.substitute(value, scope)
+        self._resolving.discard(key)
+        if self._cycles != cycles:
+            # 依赖链上存在循环引用，整条链都无效
+            return None
+        self._resolved[key] = resolved
+        return resolved
+
+    def substitute(self, text, scope):
+        if 'var' not in text:
+            return text
+        parts = []
+        pos = 0
+        search = 0
+        while True:
+            # 用str.find定位候选位置比逐字符尝试正则快得多
+            found = text.find('var', search)
+            if found < 0:
+                break
+            search = found + 3
+            if found and (text[found - 1].isalnum() or text[found - 1] in '-_'):
+                continue
+            match = _VAR_REF_RE.match(text, found)
+            if not match:
+                continue
+            parsed = _parse_var(text, match.end())
+            if parsed is None:
+                continue
+            name, fallback, end = parsed
+            value = self.lookup(name, scope)
+            if value is None and fallback is not None:
+                value = self.substitute(fallback.strip(), scope)
+            if value is None:
+                # 未定义且没有fallback的变量保持原样
+                continue
+            parts.append(text[pos:found])
+            parts.append(value)
+            pos = search = end
+        if not parts:
+            return text
+        parts.append(text[pos:])
+        return ''.join(parts)
+
+
+def extract_css_variables(css_content):
+    """返回样式表中的变量定义 {作用域: {变量名: 原始值}}"""
+    return _scan(css_content)[0]
+
+
+def resolve_css_variables(css_content):
+    """
+    解析CSS中的变量并将其替换为实际值
+    """
+    if '--' not in css_content:
+        # 没有变量定义，也就没有可以替换的引用（fallback除外）
+        if 'var' not in css_content:
+            return css_content
+    variables, segments = _scan(css_content)
+    resolver = _Resolver(variables)
+
+    return ''.join(
+        resolver.substitute(css_content[start:end], scope)
+        for start, end, scope in segments
+        if start < end
+    )
@@ -0,0 +1,200 @@
+"""
+发布到微信草稿箱的公共逻辑
+api_server.py（同步）和 asgi_server.py（异步）的发布接口共用这里的参数校验、文章构造、
+批量发布时逐篇状态的汇总以及异常到 (响应数据, HTTP状态码) 的映射；
+两边只负责获取access_token、渲染、上传图片和调用draft/add这些I/O操作，保证两种部署方式的响应一致。
+"""
+
+import asyncio
+import logging
+
+from render_executor import RenderQueueFull, RenderTimeout
+from wechat_token import WeChatTokenError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STYLE = 'sample.css'
+
+# 一条多图文草稿最多包含的文章数
+MAX_DRAFT_ARTICLES = 8
+
+# 渲染进程池繁忙：队列已满、同步等待超时或异步等待超时
+RENDER_BUSY_ERRORS = (RenderQueueFull, RenderTimeout, asyncio.TimeoutError)
+
+
+def validate_send_draft(data):
+    """校验/wechat/send_draft的参数，返回错误信息，参数完整时返回None"""
+    if not data.get('appid'):
+        return '缺少appid'
+    if not data.get('secret'):
+        return '缺少secret'
+    if not data.get('markdown'):
+        return '缺少Markdown内容'
+    return None
+
+
+def validate_send_draft_batch(data):
+    """校验/wechat/send_draft_batch的参数，返回错误信息，参数完整时返回None"""
+    if not data.get('appid'):
+        return '缺少appid'
+    if not data.get('secret'):
+        return '缺少secret'
+    items = data.get('articles')
+    if not isinstance(items, list) or not items:
+        return '缺少文章列表'
+    if len(items) > MAX_DRAFT_ARTICLES:
+        return f'一条草稿最多包含{MAX_DRAFT_ARTICLES}篇文章'
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not item.get('markdown'):
+            return f'第{index + 1}篇文章缺少Markdown内容'
+    return None
+
+
+def validate_raw_draft(data):
+    """校验/wechat/draft的参数，返回错误信息，参数完整时返回None"""
+    if not data.get('access_token'):
+        return '缺少access_token'
+    if not data.get('content'):
+        return '缺少内容'
+    return None
+
+
+def render_args(item):
+    """请求（或批量请求中的一篇文章）的渲染参数：(Markdown, 主题, 是否按分隔线切分卡片)"""
+    return item['markdown'], item.get('style', DEFAULT_STYLE), item.get('dashseparator', False)
+
+
+def build_draft_article(title, content, thumb_media_id='', author='', digest=''):
+    """构造draft/add中的单篇文章"""
+    # 处理Unicode编码问题
+    encoded_title = title.encode('utf-8').decode('latin-1') if isinstance(title, str) else title
+    encoded_content = content.encode('utf-8').decode('latin-1') if isinstance(content, str) else content
+
+    article = {
+        'title': encoded_title,
+        'author': author,
+        'digest': digest,
+        'content': encoded_content,
+        'content_source_url': '',
+        'need_open_comment': 1,
+        'only_fans_can_comment': 1
+    }
+
+    # 只有当thumb_media_id不为空时才添加
+    if thumb_media_id and thumb_media_id.strip() != '':
+        article['thumb_media_id'] = thumb_media_id
+        logger.info(f"Adding thumb_media_id: {thumb_media_id}")
+    return article
+
+
+def build_raw_draft_article(data):
+    """/wechat/draft：用请求中已经渲染好的内容构造单篇文章"""
+    article = {
+        'title': data.get('title', '默认标题'),
+        'author': data.get('author', ''),
+        'digest': data.get('digest', ''),
+        'content': data.get('content'),
+        'content_source_url': data.get('content_source_url', ''),
+        'need_open_comment': data.get('need_open_comment', 1),
+        'only_fans_can_comment': data.get('only_fans_can_comment', 1),
+    }
+    thumb_media_id = data.get('thumb_media_id', '')
+    if thumb_media_id and thumb_media_id.strip() != '':
+        article['thumb_media_id'] = thumb_media_id
+    return article
+
+
+def build_batch_articles(rendered, contents):
+    """rendered 为 collect_renders 返回的 [(文章参数, HTML, 标题)]，contents 为替换图片后的HTML"""
+    return [
+        build_draft_article(
+            title, html, item.get('thumb_media_id', ''),
+            author=item.get('author', ''), digest=item.get('digest', ''),
+        )
+        for (item, _, title), html in zip(rendered, contents)
+    ]
+
+
+def with_images(result, images):
+    """在响应中附加图片处理结果"""
+    return dict(result, images=images) if images is not None else result
+
+
+def token_error(e):
+    """获取access_token失败时的响应"""
+    if isinstance(e, WeChatTokenError):
+        logger.error(f"Failed to get access_token: {e.result}")
+        return e.result, 400
+    logger.error(f"Exception occurred while getting access_token: {str(e)}")
+    return {'errcode': 500, 'errmsg': f'获取access_token失败: {str(e)}'}, 500
+
+
+def render_error(e):
+    """渲染失败时的响应，渲染进程池繁忙时返回503"""
+    if isinstance(e, RENDER_BUSY_ERRORS):
+        logger.warning(f"Render executor busy: {str(e)}")
+        return {'errcode': 503, 'errmsg': '渲染服务繁忙，请稍后重试'}, 503
+    logger.error(f"Exception occurred while rendering Markdown: {str(e)}")
+    return {'errcode': 500, 'errmsg': f'渲染Markdown失败: {str(e)}'}, 500
+
+
+def draft_error(e, statuses=None):
+    """调用draft/add出现异常（网络错误等）时的响应"""
+    logger.error(f"Exception occurred while sending to WeChat draft: {str(e)}")
+    response = {'errcode': 500, 'errmsg': f'发送到微信草稿箱失败: {str(e)}'}
+    if statuses is not None:
+        response['articles'] = statuses
+    return response, 500
+
+
+def raw_draft_error(e):
+    """/wechat/draft 调用draft/add出现异常时的响应"""
+    logger.error(f"Exception occurred: {str(e)}")
+    return {'errcode': 500, 'errmsg': f'请求微信API失败: {str(e)}'}, 500
+
+
+def draft_response(result, images=None):
+    """draft/add的结果：微信返回错误码时为400"""
+    if 'errcode' in result and result['errcode'] != 0:
+        logger.error(f"WeChat API returned error: {result}")
+        return with_images(result, images), 400
+    logger.info("Successfully sent to WeChat draft")
+    return with_images(result, images), 200
+
+
+def collect_renders(items, results):
+    """
+    汇总批量渲染的结果，results 与 items 一一对应，为 (HTML, 标题) 或渲染时抛出的异常；
+    返回 (逐篇状态, [(文章参数, HTML, 标题)])，请求中指定的标题优先
+    """
+    statuses = []
+    rendered = []
+    for index, (item, result) in enumerate(zip(items, results)):
+        if isinstance(result, Exception):
+            logger.error(f"Exception occurred while rendering article {index}: {str(result)}")
+            statuses.append({'index': index, 'status': 'error', 'errmsg': f'渲染Markdown失败: {str(result)}'})
+            continue
+        html, title = result
+        title = item.get('title') or title
+        statuses.append({'index': index, 'status': 'ok', 'title': title})
+        rendered.append((item, html, title))
+    return statuses, rendered
+
+
+def batch_render_failed(statuses):
+    """任何一篇渲染失败时不创建草稿"""
+    return {'errcode': 400, 'errmsg': '部分文章渲染失败，未创建草稿', 'articles': statuses}, 400
+
+
+def batch_error(error, statuses):
+    """在批量发布的错误响应中附加逐篇状态"""
+    response, status_code = error
+    return dict(response, articles=statuses), status_code
+
+
+def batch_draft_response(result, images, statuses):
+    """批量发布的draft/add结果：微信返回错误码时所有文章都标记为失败"""
+    if 'errcode' in result and result['errcode'] != 0:
+        for status in statuses:
+            status['status'] = 'error'
+    return draft_response(dict(result, articles=statuses), images)
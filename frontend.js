@@ -57,21 +57,140 @@
             charCount.textContent = `${count} 字符`;
         }
 
-        // 分割Markdown文本为卡片
-        function splitMarkdownIntoCards(markdown) {
-            // 如果复选框未选中，则不进行分割
-            const splitCheckbox = document.getElementById('split-checkbox');
-            if (!splitCheckbox || !splitCheckbox.checked) {
-                return [markdown];
+        // 渲染结果缓存：相同内容和主题的请求携带If-None-Match，服务端返回304时直接复用
+        const RENDER_CACHE_LIMIT = 100;
+        const renderCache = new Map();
+
+        async function fetchRenderedHtml(markdown, theme, dashSeparator = false) {
+            const cacheKey = `${theme}\n${dashSeparator ? 1 : 0}\n${markdown}`;
+            const cached = renderCache.get(cacheKey);
+            const headers = {
+                'Content-Type': 'application/json',
+            };
+            if (cached) {
+                headers['If-None-Match'] = cached.etag;
             }
 
-            // 使用正则表达式分割文本，保留分隔符
-            const sections = markdown.split(/^---$/gm);
-            
-            // 过滤掉空的部分，并去除每部分的前后空白
-            return sections
-                .map(section => section.trim())
-                .filter(section => section.length > 0);
+            const response = await fetch(`${API_BASE_URL}/render`, {
+                method: 'POST',
+                headers: headers,
+                body: JSON.stringify({
+                    md: markdown,
+                    style: theme,
+                    dashseparator: dashSeparator
+                })
+            });
+
+            if (response.status === 304 && cached) {
+                // 刷新LRU顺序
+                renderCache.delete(cacheKey);
+                renderCache.set(cacheKey, cached);
+                return cached.html;
+            }
+
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+            }
+
+            const html = await response.text();
+            const etag = response.headers.get('ETag');
+            if (etag) {
+                renderCache.delete(cacheKey);
+                renderCache.set(cacheKey, { etag, html });
+                if (renderCache.size > RENDER_CACHE_LIMIT) {
+                    renderCache.delete(renderCache.keys().next().value);
+                }
+            }
+            return html;
+        }
+
+        // 增量预览：本地保存已渲染的块，只向服务端请求变化的块；切换主题或卡片模式时清空
+        let previewBlocks = new Map();
+        let previewBlocksScope = '';
+
+        async function fetchPreviewHtml(markdown, theme, dashSeparator = false) {
+            const scope = `${theme}\n${dashSeparator ? 1 : 0}`;
+            if (scope !== previewBlocksScope) {
+                previewBlocks = new Map();
+                previewBlocksScope = scope;
+            }
+
+            const response = await fetch(`${API_BASE_URL}/render/blocks`, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({
+                    md: markdown,
+                    style: theme,
+                    dashseparator: dashSeparator,
+                    known: Array.from(previewBlocks.keys())
+                })
+            });
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+            }
+
+            const result = await response.json();
+            if (result.mode !== 'blocks') {
+                return result.html;
+            }
+
+            result.blocks.forEach(block => previewBlocks.set(block.id, block.html));
+            if (!result.order.every(id => previewBlocks.has(id))) {
+                // 并发的预览请求已经清理了本地块，退回整篇渲染
+                previewBlocks = new Map();
+                return fetchRenderedHtml(markdown, theme, dashSeparator);
+            }
+            const html = result.prefix + result.order.map(id => previewBlocks.get(id)).join(result.separator) + result.suffix;
+            // 只保留当前文档中的块
+            const current = new Map();
+            result.order.forEach(id => current.set(id, previewBlocks.get(id)));
+            previewBlocks = current;
+            return html;
+        }
+
+        // 主题热更新：服务端在主题文件变化后推送新版本，预览随之刷新
+        const themeVersions = new Map();
+
+        function themeCssUrl(theme) {
+            const version = themeVersions.get(theme);
+            return `${API_BASE_URL}/themes/${theme}` + (version ? `?v=${version}` : '');
+        }
+
+        function subscribeThemeEvents() {
+            if (!window.EventSource) {
+                return;
+            }
+            const events = new EventSource(`${API_BASE_URL}/styles/events`);
+            events.addEventListener('theme', event => {
+                const data = JSON.parse(event.data);
+                if (data.deleted) {
+                    themeVersions.delete(data.theme);
+                } else {
+                    themeVersions.set(data.theme, data.version);
+                    if (!Array.from(themeSelector.options).some(option => option.value === data.theme)) {
+                        const option = document.createElement('option');
+                        option.value = data.theme;
+                        option.textContent = data.theme.replace('.css', '');
+                        themeSelector.appendChild(option);
+                    }
+                }
+                if (data.theme === themeSelector.value) {
+                    renderMarkdown();
+                }
+            });
+            events.addEventListener('refresh', () => {
+                themeVersions.clear();
+                renderCache.clear();
+                renderMarkdown();
+            });
+        }
+
+        // 是否启用卡片模式：卡片由服务端按 --- 切分渲染，与发送到草稿箱的结果一致
+        function isCardModeEnabled() {
+            const splitCheckbox = document.getElementById('split-checkbox');
+            return !!(splitCheckbox && splitCheckbox.checked);
         }
 
         // 渲染Markdown
@@ -93,8 +212,7 @@
             updateStatus('渲染中...');
 
             try {
-                // 分割Markdown文本为卡片
-                const sections = splitMarkdownIntoCards(markdown);
+                const cardMode = isCardModeEnabled();
                 
                 // 清空预览区域
                 preview.innerHTML = '';
@@ -118,15 +236,14 @@
                 // 获取CSS内容
                 let cssContent = '';
                 try {
-                    // Add cache-busting parameter to force fresh CSS load
-                    const cacheBuster = Date.now();
-                    const cssResponse = await fetch(`${API_BASE_URL}/themes/${theme}?v=${cacheBuster}`);
+                    // 带版本号的URL由浏览器长期缓存；版本未知时按ETag向服务端确认
+                    const cssResponse = await fetch(themeCssUrl(theme));
                     if (cssResponse.ok) {
                         cssContent = await cssResponse.text();
                     } else {
                         console.warn(`Failed to load CSS: ${cssResponse.status} ${cssResponse.statusText}`);
                         // Try alternative path
-                        const altCssResponse = await fetch(`${API_BASE_URL}/${theme}?v=${cacheBuster}`);
+                        const altCssResponse = await fetch(`${API_BASE_URL}/${theme}`);
                         if (altCssResponse.ok) {
                             cssContent = await altCssResponse.text();
                         }
@@ -148,35 +265,9 @@
                     `;
                 }
                 
-                for (let i = 0; i < sections.length; i++) {
-                    const sectionMarkdown = sections[i];
-                    
-                    // 发送请求渲染该部分
-                    const response = await fetch(`${API_BASE_URL}/render`, {
-                        method: 'POST',
-                        headers: {
-                            'Content-Type': 'application/json',
-                        },
-                        body: JSON.stringify({
-                            md: sectionMarkdown,
-                            style: theme
-                        })
-                    });
-
-                    if (!response.ok) {
-                        throw new Error(`HTTP ${response.status}: ${response.statusText}`);
-                    }
-
-                    const html = await response.text();
-                    
-                    // 为每个部分添加分隔线和section-card样式
-                    combinedHtml += `<div class="section-card">${html}</div>`;
-                    
-                    // 如果不是最后一部分，添加分隔线
-                    if (i < sections.length - 1) {
-                        combinedHtml += '<hr style="margin: 20px 0; border: 1px solid #eee;">';
-                    }
-                }
+                // 卡片模式下服务端一次渲染全部卡片，结果中已包含content-card/section-card
+                const html = await fetchPreviewHtml(markdown, theme, cardMode);
+                combinedHtml = cardMode ? html : `<div class="section-card">${html}</div>`;
                 
                 const fullHtml = `
                     <!DOCTYPE html>
@@ -397,17 +488,7 @@ $x = {-b \\pm \\sqrt{b^2-4ac} \\over 2a}$
                 return;
             }
 
-            fetch(`${API_BASE_URL}/render`, {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({
-                    md: markdown,
-                    style: theme
-                })
-            })
-            .then(response => response.text())
+            fetchRenderedHtml(markdown, theme, isCardModeEnabled())
             .then(html => {
                 const blob = new Blob([html], { type: 'text/html' });
                 const url = URL.createObjectURL(blob);
@@ -803,17 +884,7 @@ $x = {-b \\pm \\sqrt{b^2-4ac} \\over 2a}$
                         throw new Error('没有内容可复制');
                     }
                     
-                    fetch(`${API_BASE_URL}/render`, {
-                        method: 'POST',
-                        headers: {
-                            'Content-Type': 'application/json',
-                        },
-                        body: JSON.stringify({
-                            md: markdown,
-                            style: theme
-                        })
-                    })
-                    .then(response => response.text())
+                    fetchRenderedHtml(markdown, theme, isCardModeEnabled())
                     .then(html => {
                         copyHTMLToClipboard(html);
                     })
@@ -1105,6 +1176,9 @@ $x = {-b \\pm \\sqrt{b^2-4ac} \\over 2a}$
             
             // 检查微信配置
             checkWeChatConfig();
+
+            // 主题文件变化时自动刷新预览
+            subscribeThemeEvents();
             
             // Populate theme selector with options from the server
             const cacheBuster = Date.now();
@@ -1224,7 +1298,9 @@ $x = {-b \\pm \\sqrt{b^2-4ac} \\over 2a}$
                 markdown: markdown,
                 style: theme,
                 thumb_media_id: thumbMediaId,
-                dashseparator: dashSeparator
+                dashseparator: dashSeparator,
+                // 后台发布：接口立即返回任务ID，再轮询任务状态
+                async: true
             };
             
             console.log('Request data:', JSON.stringify(requestData));
@@ -1245,6 +1321,7 @@ $x = {-b \\pm \\sqrt{b^2-4ac} \\over 2a}$
                 }
                 return response.json();
             })
+            .then(data => data.job_id ? waitForJob(data.job_id) : data)
             .then(data => {
                 hideLoading();
                 // 成功的条件：没有errcode字段，或者errcode为0，或者有media_id字段
@@ -1273,6 +1350,28 @@ $x = {-b \\pm \\sqrt{b^2-4ac} \\over 2a}$
             });
         }
 
+        // 轮询后台任务直到结束，返回与同步接口相同格式的响应数据；超过timeout毫秒仍未结束时抛出错误
+        async function waitForJob(jobId, interval = 1000, timeout = 10 * 60 * 1000) {
+            const deadline = Date.now() + timeout;
+            while (true) {
+                if (Date.now() > deadline) {
+                    throw new Error(`等待任务超时（${Math.round(timeout / 1000)}秒），任务ID: ${jobId}，请稍后在草稿箱中确认是否已发布`);
+                }
+                const response = await fetch(`${API_BASE_URL}/jobs/${jobId}`);
+                if (!response.ok) {
+                    throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+                }
+                const job = await response.json();
+                if (job.status === 'succeeded' || job.status === 'failed') {
+                    if (job.result && job.result.response) {
+                        return job.result.response;
+                    }
+                    return { errcode: 500, errmsg: job.error || '任务失败' };
+                }
+                await new Promise(resolve => setTimeout(resolve, interval));
+            }
+        }
+
         // 检查微信配置
         function checkWeChatConfig() {
             const appId = localStorage.getItem('wechat_app_id');
@@ -1389,10 +1488,10 @@ $x = {-b \\pm \\sqrt{b^2-4ac} \\over 2a}$
                 body: cssContent
             })
             .then(response => {
-                if (!response.ok) {
+                // 验证未通过时服务器返回400和验证结果，同样按JSON解析
+                return response.json().catch(() => {
                     throw new Error(`HTTP ${response.status}: ${response.statusText}`);
-                }
-                return response.json();
+                });
             })
             .then(data => {
                 if (data.status === 'success') {
@@ -1411,7 +1510,10 @@ $x = {-b \\pm \\sqrt{b^2-4ac} \\over 2a}$
                         renderMarkdown();
                     }, 100);
                 } else {
-                    throw new Error(data.message || '保存失败');
+                    const validation = data.validation || {};
+                    const problems = (validation.errors || []).map(error => `第${error.line}行: ${error.message}`)
+                        .concat((validation.issues || []).map(issue => issue.message));
+                    throw new Error([data.message || '保存失败'].concat(problems).join('\n'));
                 }
             })
             .catch(error => {
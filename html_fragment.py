@@ -0,0 +1,201 @@
+"""
+从css_inline的输出中提取<body>内容
+css_inline输出的是序列化好的完整文档，这里用一次正则扫描取出body片段和
+.markdown-body容器的内联样式，不再用BeautifulSoup重新构建整棵DOM。
+
+输出与此前 BeautifulSoup(html, 'html.parser') 逐个序列化body子节点的结果逐字节一致：
+- 空元素输出为 <br/> 形式
+- &nbsp; 输出为 U+00A0 字符
+- 只含ASCII空白的文本节点（pre/textarea之外）折叠为一个换行或空格
+- 属性按名称排序，属性值按BeautifulSoup的规则转义和加引号，class等多值属性的空白被规范化
+"""
+
+import re
+
+# BeautifulSoup(html.parser) 视为空元素的标签
+EMPTY_ELEMENT_TAGS = frozenset({
+    'area', 'base', 'basefont', 'bgsound', 'br', 'col', 'command', 'embed',
+    'frame', 'hr', 'image', 'img', 'input', 'isindex', 'keygen', 'link',
+    'menuitem', 'meta', 'nextid', 'param', 'source', 'spacer', 'track', 'wbr',
+})
+
+# 保留空白的标签
+PRESERVE_WHITESPACE_TAGS = frozenset({'pre', 'textarea'})
+
+# 内容按原样输出的标签
+RAW_TEXT_TAGS = frozenset({'script', 'style'})
+
+_SPECIAL_TAGS = PRESERVE_WHITESPACE_TAGS | RAW_TEXT_TAGS
+
+# 以空白分隔的多值属性
+_MULTI_VALUED_ATTRIBUTES = {
+    '*': {'class', 'accesskey', 'dropzone'},
+    'a': {'rel', 'rev'},
+    'link': {'rel', 'rev'},
+    'td': {'headers'},
+    'th': {'headers'},
+    'form': {'accept-charset'},
+    'object': {'archive'},
+    'area': {'rel'},
+    'icon': {'sizes'},
+    'iframe': {'sandbox'},
+    'output': {'for'},
+}
+
+# 背景相关的容器样式会被复制到外层<section>上
+CONTAINER_STYLE_PREFIXES = ('background', 'padding', 'border-radius', 'box-shadow')
+
+_ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
+
+_BODY_START_RE = re.compile(r'<body(?:\s+[^\s"\'>/=]+(?:="[^"]*")?)*\s*>', re.I)
+
+_TOKEN_RE = re.compile(r'''
+    <!--(?P<comment>.*?)-->
+  | </(?P<end>[a-zA-Z][^\s/>]*)\s*>
+  | <(?P<start>[a-zA-Z][^\s/>]*)(?P<attrs>(?:\s+[^\s"'>/=]+(?:="[^"]*")?)*)\s*/?>
+  | (?P<text>[^<]+|<)
+''', re.S | re.X)
+
+# 只有一个不含特殊字符的style属性的开始标签（内联后最常见的情况）可以原样输出
+_SIMPLE_ATTRS_RE = re.compile(r' style="[^"&<>]*"')
+
+_RAW_TEXT_END_RE = {name: re.compile(f'</{name}', re.I) for name in RAW_TEXT_TAGS}
+
+_ATTR_RE = re.compile(r'([^\s"\'>/=]+)(?:="([^"]*)")?')
+_ATTR_ENTITY_RE = re.compile(r'&(amp|quot|nbsp);')
+_ATTR_ENTITIES = {'amp': '&', 'quot': '"', 'nbsp': '\xa0'}
+_ESCAPE_RE = re.compile(r'[&<>]')
+_ESCAPES = {'&': '&amp;', '<': '&lt;', '>': '&gt;'}
+_NON_WHITESPACE_RE = re.compile(r'\S+')
+
+
+def _collapse_whitespace(data):
+    """只含ASCII空白的字符串折叠为一个换行（含换行时）或空格"""
+    if data.strip(_ASCII_SPACES):
+        return data
+    return '\n' if '\n' in data else ' '
+
+
+def _format_attribute(value):
+    value = _ESCAPE_RE.sub(lambda m: _ESCAPES[m.group()], value)
+    if '"' in value:
+        if "'" in value:
+            return '"' + value.replace('"', '&quot;') + '"'
+        return "'" + value + "'"
+    return '"' + value + '"'
+
+
+def _parse_attributes(tag_name, raw_attrs):
+    """解析css_inline输出的属性串，返回 [(属性名, 解码后的值)]"""
+    attributes = []
+    multi_valued = _MULTI_VALUED_ATTRIBUTES['*'] | _MULTI_VALUED_ATTRIBUTES.get(tag_name, set())
+    for match in _ATTR_RE.finditer(raw_attrs):
+        name = match.group(1).lower()
+        value = match.group(2) or ''
+        if '&' in value:
+            value = _ATTR_ENTITY_RE.sub(lambda m: _ATTR_ENTITIES[m.group(1)], value)
+        if name in multi_valued:
+            value = ' '.join(_NON_WHITESPACE_RE.findall(value))
+        attributes.append((name, value))
+    return attributes
+
+
+def extract_body_fragment(inlined_html, container_class='markdown-body'):
+    """
+    提取<body>的内部HTML以及第一个带 container_class 的元素的style属性
+
+    :return: (body_content, container_style)，没有找到容器或容器没有样式时 container_style 为None
+    """
+    body_start = _BODY_START_RE.search(inlined_html)
+    start = body_start.end() if body_start else 0
+    end = inlined_html.rfind('</body>')
+    if end < start:
+        end = len(inlined_html)
+
+    parts = []
+    container_style = None
+    container_found = False
+    preserve_stack = []
+
+    pos = start
+    while pos < end:
+        match = _TOKEN_RE.match(inlined_html, pos, end)
+        pos = match.end()
+        kind = match.lastgroup
+
+        if kind == 'text':
+            text = match.group('text')
+            if not preserve_stack:
+                text = _collapse_whitespace(text)
+            if '&' in text:
+                text = text.replace('&nbsp;', '\xa0')
+            parts.append(text)
+
+        elif kind == 'attrs':
+            name, raw_attrs = match.group('start', 'attrs')
+            if (raw_attrs and _SIMPLE_ATTRS_RE.fullmatch(raw_attrs) and name.islower()
+                    and name not in EMPTY_ELEMENT_TAGS and name not in _SPECIAL_TAGS):
+                parts.append(f'<{name}{raw_attrs}>')
+                continue
+
+            name = name.lower()
+            attributes = _parse_attributes(name, raw_attrs) if raw_attrs else []
+
+            if not container_found:
+                for attr_name, value in attributes:
+                    if attr_name == 'class' and container_class in value.split():
+                        container_found = True
+                        container_style = dict(attributes).get('style')
+                        break
+
+            tag = '<' + name
+            if attributes:
+                tag += ' ' + ' '.join(
+                    f'{attr_name}={_format_attribute(value)}' for attr_name, value in sorted(attributes)
+                )
+            if name in EMPTY_ELEMENT_TAGS:
+                parts.append(tag + '/>')
+                continue
+            parts.append(tag + '>')
+
+            if name in PRESERVE_WHITESPACE_TAGS:
+                preserve_stack.append(name)
+            elif name in RAW_TEXT_TAGS:
+                # 脚本和样式内容原样输出，直到对应的结束标签
+                raw_close = _RAW_TEXT_END_RE[name].search(inlined_html, pos, end)
+                raw_end = raw_close.start() if raw_close else end
+                raw = inlined_html[pos:raw_end]
+                if raw:
+                    parts.append(raw if preserve_stack else _collapse_whitespace(raw))
+                pos = raw_end
+
+        elif kind == 'end':
+            name = match.group('end').lower()
+            if name in EMPTY_ELEMENT_TAGS:
+                # 空元素已经以 <tag/> 的形式输出（css_inline不会为空元素输出结束标签）
+                continue
+            if preserve_stack and preserve_stack[-1] == name:
+                preserve_stack.pop()
+            parts.append(f'</{name}>')
+
+        else:
+            comment = match.group('comment')
+            if not preserve_stack:
+                comment = _collapse_whitespace(comment)
+            parts.append(f'<!--{comment}-->')
+
+    return ''.join(parts), container_style
+
+
+def wrap_section(body_content, container_style):
+    """用<section>包裹body内容，并把容器的背景相关样式复制到<section>上"""
+    container_bg_style = ''
+    if container_style:
+        bg_styles = []
+        for style_part in container_style.split(';'):
+            style_part = style_part.strip()
+            if style_part.startswith(CONTAINER_STYLE_PREFIXES):
+                bg_styles.append(style_part)
+        if bg_styles:
+            container_bg_style = f' style="{"; ".join(bg_styles)}"'
+    return f'<section{container_bg_style}>{body_content}</section>'
@@ -0,0 +1,245 @@
+"""
+增量预览渲染
+编辑器每次输入都会提交整篇文档，但通常只有一两个块发生变化。
+这里把文档切分为顶层块（卡片模式下为卡片），按 主题 + 主题版本 + 块内容 缓存每个块内联样式后的HTML，
+只渲染缓存中没有的块；客户端提交已持有的块ID，响应中只返回客户端没有的块及其位置，
+由客户端按块ID顺序拼接出与 /render 完全相同的HTML。
+
+不能按块渲染时（主题使用 :first-child、兄弟选择器等依赖相邻元素的选择器，文档包含链接引用定义或HTML块，
+主题不存在，空文档）返回 None，由调用方退回整篇渲染。
+"""
+
+import logging
+import os
+import re
+import threading
+
+from html_fragment import extract_body_fragment, wrap_section
+from md_sections import extract_title, split_blocks, split_sections
+from render_cache import RenderCache, make_render_key
+
+logger = logging.getLogger(__name__)
+
+# 块ID只用于在一篇文档内区分块，取缓存键的前16位
+BLOCK_ID_LENGTH = 16
+
+_DECLARATIONS_RE = re.compile(r'\{[^{}]*\}')
+_COMMENT_RE = re.compile(r'/\*.*?\*/', re.S)
+# 单独渲染一个块时结果会变化的选择器：结构伪类、:has() 和兄弟选择器
+_CONTEXT_SELECTOR_RE = re.compile(r':(?:first|last|nth|only)-|:empty|:has\(|[+~]')
+
+_CONTAINER_OPEN_RE = re.compile(r'\s*<div class="markdown-body"[^>]*>')
+
+
+def theme_supports_blocks(css):
+    """主题的选择器是否与相邻元素无关，无关时每个块可以单独内联"""
+    selectors = _COMMENT_RE.sub('', css)
+    # 逐层去掉声明块（@media等嵌套规则需要多次）
+    while True:
+        stripped = _DECLARATIONS_RE.sub(' ', selectors)
+        if stripped == selectors:
+            break
+        selectors = stripped
+    return not _CONTEXT_SELECTOR_RE.search(selectors)
+
+
+class _ThemeFrame:
+    """主题对应的外层容器：内联后的 .markdown-body 开始标签（head）和结束部分（tail），以及拼接用的前后缀"""
+
+    __slots__ = ('version', 'supported', 'head', 'tail', 'prefix', 'suffix')
+
+    def __init__(self, version, supported, head='', tail='', prefix='', suffix=''):
+        self.version = version
+        self.supported = supported
+        self.head = head
+        self.tail = tail
+        self.prefix = prefix
+        self.suffix = suffix
+
+
+class IncrementalRenderer:
+    """
+    按块缓存的增量渲染
+
+    :param pipeline: 渲染流水线（RenderPipeline）
+    :param cache: 块HTML缓存（RenderCache）
+    :param stream_chunk_size: 流式渲染时每次内联的Markdown字符数
+    """
+
+    def __init__(self, pipeline, cache, stream_chunk_size=64 * 1024):
+        self.pipeline = pipeline
+        self.cache = cache
+        self.stream_chunk_size = stream_chunk_size
+        self._frames = {}
+        self._lock = threading.Lock()
+        self.rendered_blocks = 0
+
+    def _frame(self, theme):
+        with self._lock:
+            frame = self._frames.get(theme.name)
+        if frame is not None and frame.version == theme.version:
+            return frame
+
+        frame = _ThemeFrame(theme.version, False)
+        if theme_supports_blocks(theme.css):
+            # 内联一个空容器：容器内的空白折叠为一个换行，其前面是开始标签，其后是结束部分
+            body, container_style = extract_body_fragment(self.pipeline.inline(theme, ''))
+            match = _CONTAINER_OPEN_RE.match(body)
+            if match and body[match.end():].startswith('\n'):
+                head = match.group() + '\n'
+                tail = body[match.end():]
+                section = wrap_section('', container_style)
+                frame = _ThemeFrame(theme.version, True, head, tail,
+                                    section[:-len('</section>')] + head, tail + '</section>')
+        with self._lock:
+            self._frames[theme.name] = frame
+        return frame
+
+    def _render_unit(self, theme, frame, html):
+        """内联单个块，返回去掉外层容器后的HTML，结果与整篇内联时不一致返回None"""
+        body, _ = extract_body_fragment(self.pipeline.inline(theme, html))
+        if not (body.startswith(frame.head) and body.endswith(frame.tail)):
+            return None
+        return body[len(frame.head):len(body) - len(frame.tail)]
+
+    def _prepare(self, markdown_content, style_name, dash_separator):
+        """返回 (theme, frame, units, separator)，不能按块渲染时返回None"""
+        theme = self.pipeline.resolve_theme(style_name)
+        if not theme or not theme.inliner:
+            return None
+        frame = self._frame(theme)
+        if not frame.supported:
+            return None
+
+        if dash_separator:
+            # 卡片本来就分别转换，以卡片为单位缓存；第一张卡片的样式类不同
+            units = [('content-card' if i == 0 else 'section-card', section)
+                     for i, section in enumerate(split_sections(markdown_content))]
+            separator = ''
+        else:
+            blocks = split_blocks(markdown_content)
+            if blocks is None:
+                return None
+            units = [(None, block) for block in blocks]
+            separator = '\n'
+        if not units:
+            return None
+        return theme, frame, units, separator
+
+    def _block_key(self, theme, style_name, card_class, text):
+        return make_render_key(text, style_name, theme.version, {'card': card_class})
+
+    def _render_block(self, theme, frame, key, card_class, text):
+        """返回块内联后的HTML（bytes），优先使用缓存；结果与整篇内联时不一致返回None"""
+        html = self.cache.get(key)
+        if html is None:
+            converted = self.pipeline.parse(text)
+            if card_class:
+                converted = f'<div class="{card_class}">{converted}</div>'
+            html = self._render_unit(theme, frame, converted)
+            if html is None:
+                logger.warning(f"Block output differs from full render for theme {theme.name}")
+                return None
+            html = html.encode('utf-8')
+            self.cache.put(key, html)
+            self.rendered_blocks += 1
+        return html
+
+    def render(self, markdown_content, style_name, dash_separator=False, known=()):
+        """
+        增量渲染，不能按块渲染时返回None
+
+        :param known: 客户端已经持有的块ID
+        :return: {'title', 'prefix', 'suffix', 'separator', 'order': [块ID], 'blocks': [{'index', 'id', 'html'}]}，
+                 blocks中只包含known之外的块，每个块ID只出现一次
+        """
+        prepared = self._prepare(markdown_content, style_name, dash_separator)
+        if prepared is None:
+            return None
+        theme, frame, units, separator = prepared
+
+        known = set(known)
+        order = []
+        changed = []
+        seen = set()
+        for index, (card_class, text) in enumerate(units):
+            key = self._block_key(theme, style_name, card_class, text)
+            block_id = key[:BLOCK_ID_LENGTH]
+            order.append(block_id)
+            if block_id in known or block_id in seen:
+                continue
+            seen.add(block_id)
+
+            html = self._render_block(theme, frame, key, card_class, text)
+            if html is None:
+                return None
+            changed.append({'index': index, 'id': block_id, 'html': html.decode('utf-8')})
+
+        return {
+            'title': extract_title(markdown_content),
+            'prefix': frame.prefix,
+            'suffix': frame.suffix,
+            'separator': separator,
+            'order': order,
+            'blocks': changed,
+        }
+
+    def stream(self, markdown_content, style_name, dash_separator=False):
+        """
+        流式渲染：返回依次产生 <section>开始部分、各批块的HTML、结束部分 的生成器；不能按块渲染时返回None
+
+        连续的块累积到 stream_chunk_size 个字符后一起内联（减少内联器的调用次数），
+        内存中同时只保留一批块的渲染结果；流式渲染的通常是一次性的大文档，不写入块缓存
+        """
+        prepared = self._prepare(markdown_content, style_name, dash_separator)
+        if prepared is None:
+            return None
+        theme, frame, units, separator = prepared
+
+        def flush(batch, first):
+            html = self._render_unit(theme, frame, separator.join(batch))
+            if html is None:
+                # 响应已经开始发送，无法再退回整篇渲染
+                raise RuntimeError(f'blocks cannot be rendered separately with theme {style_name}')
+            return html if first else separator + html
+
+        def generate():
+            yield frame.prefix
+            batch = []
+            size = 0
+            first = True
+            for card_class, text in units:
+                converted = self.pipeline.parse(text)
+                if card_class:
+                    converted = f'<div class="{card_class}">{converted}</div>'
+                batch.append(converted)
+                size += len(text)
+                if size >= self.stream_chunk_size:
+                    yield flush(batch, first)
+                    batch = []
+                    size = 0
+                    first = False
+            if batch:
+                yield flush(batch, first)
+            yield frame.suffix
+
+        return generate()
+
+    def clear(self):
+        """清空块缓存和主题容器"""
+        self.cache.clear()
+        with self._lock:
+            self._frames.clear()
+
+    def stats(self):
+        return dict(self.cache.stats(), rendered_blocks=self.rendered_blocks)
+
+
+def create_incremental_renderer_from_env(pipeline):
+    """根据环境变量创建增量渲染器，块缓存只保存在进程内"""
+    cache = RenderCache(
+        max_entries=int(os.getenv('RENDER_BLOCK_CACHE_SIZE', '8192')),
+        max_bytes=int(os.getenv('RENDER_BLOCK_CACHE_BYTES', str(32 * 1024 * 1024))),
+    )
+    return IncrementalRenderer(pipeline, cache,
+                               stream_chunk_size=int(os.getenv('RENDER_STREAM_CHUNK', str(64 * 1024))))
@@ -0,0 +1,238 @@
+"""
+后台任务队列
+发布到微信等耗时操作放到本进程的工作线程中执行，请求立即返回任务ID；
+任务状态和结果保存在本地SQLite文件中，同一台机器上的任意gunicorn worker都可以查询。
+
+任务参数（包括secret）只保存在提交任务的进程内存中，SQLite中只记录状态、摘要和结果；
+进程退出后未完成的任务在超过 stale_after 秒后被标记为失败，不会被其他进程重新执行，避免重复发布；
+工作线程通过条件更新领取任务，已经被标记为失败的排队任务不会再开始执行。
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+FINISHED_STATUSES = (SUCCEEDED, FAILED)
+
+LOST_ERROR = 'job lost: worker exited before it finished'
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    summary TEXT,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+)
+'''
+
+
+class QueueFullError(Exception):
+    """等待执行的任务数达到上限"""
+
+
+class JobFailed(Exception):
+    """handler抛出该异常时任务失败，同时保存result（例如微信返回的错误结果）"""
+
+    def __init__(self, message, result=None):
+        super().__init__(message)
+        self.result = result
+
+
+class JobQueue:
+    """
+    本地任务队列
+
+    :param db_path: SQLite文件路径
+    :param max_workers: 本进程同时执行的任务数
+    :param max_pending: 本进程中排队和执行中的任务总数上限，超过时 submit() 抛出 QueueFullError
+    :param stale_after: 排队超过该秒数，或执行中超过该秒数没有心跳的任务视为已丢失
+    :param retention: 已完成任务的保留时间（秒）
+    """
+
+    def __init__(self, db_path, max_workers=2, max_pending=100, stale_after=600, retention=86400):
+        self.db_path = db_path
+        self.max_pending = max_pending
+        self.stale_after = stale_after
+        self.retention = retention
+        self._handlers = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        # 每次操作使用独立连接，sqlite3连接不能在线程之间共享
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def register(self, kind, handler):
+        """
+        注册任务类型，handler(payload) 返回可JSON序列化的结果；
+        handler抛出异常时任务失败，异常信息作为错误；抛出 JobFailed 时同时保存其result
+        """
+        self._handlers[kind] = handler
+
+    def submit(self, kind, payload, summary=None):
+        """
+        提交任务并立即返回任务ID
+
+        :param payload: 传给handler的参数，只保存在内存中
+        :param summary: 写入SQLite、随状态一起返回的任务摘要（不要包含secret等敏感信息）
+        """
+        if kind not in self._handlers:
+            raise ValueError(f'Unknown job kind: {kind}')
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise QueueFullError(f'{self._pending} jobs pending')
+            self._pending += 1
+
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    'INSERT INTO jobs (id, kind, status, summary, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)',
+                    (job_id, kind, QUEUED, json.dumps(summary or {}, ensure_ascii=False), now, now),
+                )
+                conn.execute('DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?',
+                             (SUCCEEDED, FAILED, now - self.retention))
+            self._executor.submit(self._run, job_id, kind, payload)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+        return job_id
+
+    def _update(self, job_id, status, result=None, error=None):
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE id = ?',
+                (status, None if result is None else json.dumps(result, ensure_ascii=False),
+                 error, time.time(), job_id),
+            )
+
+    def _claim(self, job_id):
+        """把排队中的任务标记为执行中，任务已经不在排队（被标记为丢失）时返回False"""
+        with self._connect() as conn:
+            cursor = conn.execute('UPDATE jobs SET status = ?, updated_at = ? WHERE id = ? AND status = ?',
+                                  (RUNNING, time.time(), job_id, QUEUED))
+            return cursor.rowcount == 1
+
+    def _heartbeat(self, job_id, stop):
+        """执行期间定期更新 updated_at，执行时间超过 stale_after 的任务不会被误判为丢失"""
+        while not stop.wait(self.stale_after / 3):
+            try:
+                with self._connect() as conn:
+                    conn.execute('UPDATE jobs SET updated_at = ? WHERE id = ? AND status = ?',
+                                 (time.time(), job_id, RUNNING))
+            except Exception as e:
+                logger.warning(f"Failed to update heartbeat of job {job_id}: {str(e)}")
+
+    def _run(self, job_id, kind, payload):
+        try:
+            if not self._claim(job_id):
+                logger.warning(f"Job {job_id} ({kind}) was marked lost before it started, skipping")
+                return
+            stop = threading.Event()
+            threading.Thread(target=self._heartbeat, args=(job_id, stop), name=f'job-heartbeat-{job_id[:8]}',
+                             daemon=True).start()
+            try:
+                result = self._handlers[kind](payload)
+            except JobFailed as e:
+                logger.error(f"Job {job_id} ({kind}) failed: {str(e)}")
+                self._update(job_id, FAILED, result=e.result, error=str(e))
+            except Exception as e:
+                logger.error(f"Job {job_id} ({kind}) failed: {str(e)}")
+                self._update(job_id, FAILED, error=str(e))
+            else:
+                self._update(job_id, SUCCEEDED, result=result)
+            finally:
+                stop.set()
+        except Exception as e:
+            logger.error(f"Failed to update job {job_id}: {str(e)}")
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _mark_stale(self, job_id):
+        """把超过 stale_after 秒没有更新的未完成任务标记为失败；与 _claim 互斥，标记后任务不会再开始执行"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE jobs SET status = ?, error = ?, updated_at = ? '
+                'WHERE id = ? AND status IN (?, ?) AND updated_at < ?',
+                (FAILED, LOST_ERROR, now, job_id, QUEUED, RUNNING, now - self.stale_after),
+            )
+
+    def _load(self, job_id):
+        with self._connect() as conn:
+            return conn.execute(
+                'SELECT id, kind, status, summary, result, error, created_at, updated_at FROM jobs WHERE id = ?',
+                (job_id,),
+            ).fetchone()
+
+    def get(self, job_id):
+        """返回任务状态字典，任务不存在时返回None"""
+        row = self._load(job_id)
+        if row is None:
+            return None
+        if row[2] not in FINISHED_STATUSES and time.time() - row[7] > self.stale_after:
+            # 执行任务的进程已经退出，或者任务排队时间过长
+            self._mark_stale(job_id)
+            row = self._load(job_id)
+
+        job = {
+            'id': row[0],
+            'kind': row[1],
+            'status': row[2],
+            'summary': json.loads(row[3]) if row[3] else {},
+            'result': json.loads(row[4]) if row[4] else None,
+            'error': row[5],
+            'created_at': row[6],
+            'updated_at': row[7],
+        }
+        return job
+
+    def stats(self):
+        with self._lock:
+            return {'pending': self._pending, 'max_pending': self.max_pending}
+
+
+def create_job_queue_from_env():
+    """根据环境变量创建任务队列"""
+    db_path = os.getenv('JOB_DB_PATH') or os.path.join(tempfile.gettempdir(), 'md2any-jobs.sqlite3')
+    return JobQueue(
+        db_path,
+        max_workers=int(os.getenv('JOB_WORKERS', '2')),
+        max_pending=int(os.getenv('JOB_MAX_PENDING', '100')),
+        stale_after=int(os.getenv('JOB_STALE_AFTER', '600')),
+    )
@@ -0,0 +1,70 @@
+"""
+Markdown转换器
+按扩展配置（profile）为每个线程缓存一个预先配置好的 Markdown 实例，
+每次转换后调用 reset() 复用，避免每个请求都重新加载扩展
+"""
+
+import threading
+
+import markdown
+
+
+def format_mermaid(source, language, css_class, options, md, **kwargs):
+    """mermaid代码块原样输出到div中，由前端的mermaid.js渲染"""
+    return f'<div class="{css_class}">{source}</div>'
+
+
+# 自定义fence类型，新增类型只需在这里添加
+CUSTOM_FENCES = [
+    {
+        'name': 'mermaid',
+        'class': 'mermaid',
+        'format': format_mermaid,
+    },
+]
+
+# 扩展配置
+EXTENSION_PROFILES = {
+    'default': {
+        'extensions': [
+            'fenced_code',
+            'tables',
+            'nl2br',
+            'pymdownx.superfences',
+            'pymdownx.magiclink',
+        ],
+        'extension_configs': {
+            'pymdownx.superfences': {
+                'custom_fences': CUSTOM_FENCES,
+            },
+        },
+    },
+}
+
+_local = threading.local()
+
+
+def get_converter(profile='default'):
+    """返回当前线程中指定profile的 Markdown 实例，不存在时创建"""
+    converters = getattr(_local, 'converters', None)
+    if converters is None:
+        converters = _local.converters = {}
+
+    converter = converters.get(profile)
+    if converter is None:
+        config = EXTENSION_PROFILES[profile]
+        converter = markdown.Markdown(
+            extensions=config['extensions'],
+            extension_configs=config.get('extension_configs', {}),
+        )
+        converters[profile] = converter
+    return converter
+
+
+def convert(text, profile='default'):
+    """将Markdown文本转换为HTML"""
+    converter = get_converter(profile)
+    try:
+        return converter.convert(text)
+    finally:
+        converter.reset()
@@ -0,0 +1,180 @@
+"""
+Markdown卡片切分
+按行扫描Markdown，识别代码块（``` / ~~~）和YAML front matter，只把代码块之外单独成行的 --- 视为卡片分隔线；
+同一次扫描中提取第一个一级标题作为文章标题。
+
+切分结果以 (offset, length) 的形式惰性产生，指向原文中去掉首尾空白后的片段，
+调用方需要文本时再切片，不会为每个section复制整篇文档。
+"""
+
+import re
+
+DEFAULT_TITLE = '默认标题'
+
+# 只关心可能影响切分的行：代码块边界、分隔线、一级标题
+_LINE_RE = re.compile(r'''
+    ^[ \t]*(?P<fence>`{3,}|~{3,})(?P<info>[^\n]*)$
+  | ^(?P<separator>[ ]{0,3}-{3,}[ \t\r]*)$
+  | ^(?P<heading>\#(?!\#)[^\n]*)$
+''', re.M | re.X)
+
+# 文档开头的YAML front matter：--- 开始，--- 或 ... 结束，中间至少一行且每行都是 key: value；
+# 开头的 --- 后面紧跟空行、或其中有列表、空行等其他内容时是分隔线和普通卡片，不能丢弃
+_FRONT_MATTER_RE = re.compile(r'''
+    ---[ \t]*\r?\n
+    (?:[A-Za-z_][\w.-]*[ \t]*:(?:[ \t][^\n]*)?\n)+
+    (?:---|\.\.\.)[ \t\r]*(?:\n|$)
+''', re.X)
+
+_NON_SPACE_RE = re.compile(r'\S')
+
+
+def _strip_span(text, start, end):
+    """返回 text[start:end] 去掉首尾空白后的 (offset, length)，全是空白时返回None"""
+    match = _NON_SPACE_RE.search(text, start, end)
+    if match is None:
+        return None
+    start = match.start()
+    while text[end - 1].isspace():
+        end -= 1
+    return start, end - start
+
+
+def _scan(text, split=True):
+    """
+    扫描Markdown，依次产生 ('title', 标题) 和 ('section', (offset, length)) 事件
+
+    :param split: 为False时不切分，只查找标题
+    """
+    front_matter = _FRONT_MATTER_RE.match(text)
+    section_start = front_matter.end() if front_matter else 0
+    fence = None
+    title_found = False
+
+    for match in _LINE_RE.finditer(text, section_start):
+        kind = match.lastgroup
+        if fence is not None:
+            # 代码块内只关心对应的结束标记：相同字符、长度不小于开始标记、后面没有其他内容
+            if kind == 'info' and match.group('fence').startswith(fence) and not match.group('info').strip():
+                fence = None
+        elif kind == 'info':
+            # ```后面的info中出现反引号时是行内代码，不是代码块
+            if not (match.group('fence')[0] == '`' and '`' in match.group('info')):
+                fence = match.group('fence')
+        elif kind == 'heading':
+            if not title_found:
+                title_found = True
+                yield 'title', match.group('heading').replace('#', '', 1).strip()
+        elif split:
+            span = _strip_span(text, section_start, match.start())
+            if span is not None:
+                yield 'section', span
+            section_start = match.end()
+
+    if split:
+        span = _strip_span(text, section_start, len(text))
+        if span is not None:
+            yield 'section', span
+
+
+class MarkdownSections:
+    """
+    一次扫描完成卡片切分和标题提取
+
+        scanner = MarkdownSections(markdown_content)
+        for offset, length in scanner.spans():
+            ...
+        scanner.title  # 扫描结束后可用
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.title = None
+
+    def spans(self):
+        """惰性产生各section的 (offset, length)，同时记录标题"""
+        for kind, value in _scan(self.text):
+            if kind == 'title':
+                self.title = value
+            else:
+                yield value
+
+    def __iter__(self):
+        text = self.text
+        for offset, length in self.spans():
+            yield text[offset:offset + length]
+
+
+def split_sections(markdown_content):
+    """按代码块外单独成行的 --- 切分卡片，返回去掉首尾空白后的非空片段"""
+    return list(MarkdownSections(markdown_content))
+
+
+def extract_title(markdown_content):
+    """提取代码块外的第一个一级标题作为文章标题，找到后立即停止扫描"""
+    for kind, value in _scan(markdown_content, split=False):
+        return value
+    return DEFAULT_TITLE
+
+
+# 增量预览按顶层块切分时需要识别的行
+_LIST_ITEM_RE = re.compile(r'[ ]{0,3}(?:[*+-]|\d+[.)])(?:[ \t]|$)')
+_FENCE_LINE_RE = re.compile(r'[ \t]*(`{3,}|~{3,})(.*)')
+# 链接引用定义对整篇文档生效，HTML块内部可能包含空行，这两种文档不能按块单独渲染
+_NOT_SPLITTABLE_RE = re.compile(r'[ ]{0,3}(?:\[[^\]]+\]:|<)')
+
+
+def split_blocks(markdown_content):
+    """
+    按代码块外的空行把Markdown切分为可以单独渲染的顶层块，
+    各块分别转换后以换行连接，结果与整篇转换相同
+
+    空行后的缩进行（列表项的后续内容、缩进代码）、同一列表的下一项和相邻的引用块并入前一个块；
+    文档包含链接引用定义或HTML块时返回None
+    """
+    blocks = []
+    current = []
+    fence = None
+    blank = False
+    # 当前块中是否出现过顶层的列表项或引用（合并多余的块不影响结果，只是增量粒度变粗）
+    has_list = has_quote = False
+
+    for line in markdown_content.split('\n'):
+        if fence is not None:
+            current.append(line)
+            match = _FENCE_LINE_RE.fullmatch(line.rstrip('\r'))
+            if match and match.group(1).startswith(fence) and not match.group(2).strip():
+                fence = None
+            continue
+
+        if not line.strip():
+            if current:
+                blank = True
+                current.append(line)
+            continue
+
+        if _NOT_SPLITTABLE_RE.match(line):
+            return None
+
+        indented = line[0] in ' \t'
+        if blank and not indented:
+            continues_list = has_list and _LIST_ITEM_RE.match(line)
+            continues_quote = has_quote and line.startswith('>')
+            if not (continues_list or continues_quote):
+                blocks.append('\n'.join(current).rstrip())
+                current = []
+                has_list = has_quote = False
+        blank = False
+        current.append(line)
+
+        if not indented:
+            has_list = has_list or bool(_LIST_ITEM_RE.match(line))
+            has_quote = has_quote or line.startswith('>')
+
+        match = _FENCE_LINE_RE.fullmatch(line.rstrip('\r'))
+        if match and not (match.group(1)[0] == '`' and '`' in match.group(2)):
+            fence = match.group(1)
+
+    if current:
+        blocks.append('\n'.join(current).rstrip())
+    return blocks
@@ -0,0 +1,262 @@
+"""
+运行指标
+进程内的计数器、直方图和回调指标，按Prometheus文本格式（0.0.4）输出，供 /metrics 抓取。
+
+gunicorn的多个worker各自统计；设置 METRICS_DIR 后每个worker定期把自己的指标快照写入该目录，
+/metrics 合并目录中所有仍在更新的快照（同名同标签的值相加），任意worker响应的都是整台机器的指标。
+"""
+
+import json
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# 与prometheus_client相同的默认分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_key(labelnames, labels):
+    if set(labels) != set(labelnames):
+        raise ValueError(f'expected labels {labelnames}, got {tuple(labels)}')
+    return tuple(str(labels[name]) for name in labelnames)
+
+
+class Counter:
+    """只增不减的计数器"""
+
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, tuple(zip(self.labelnames, key)), value) for key, value in self._values.items()]
+
+
+class Histogram:
+    """按分桶累计观测值的直方图"""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                labels = tuple(zip(self.labelnames, key))
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    samples.append((self.name + '_bucket', labels + (('le', repr(bound)),), cumulative))
+                samples.append((self.name + '_bucket', labels + (('le', '+Inf'),), count))
+                samples.append((self.name + '_sum', labels, total))
+                samples.append((self.name + '_count', labels, count))
+        return samples
+
+
+class CallbackMetric:
+    """
+    抓取时调用func取值的指标，用于导出各组件已有的统计数据（缓存命中数、队列长度等）
+
+    :param func: 无标签时返回数值；有标签时返回 {标签值元组: 数值}
+    """
+
+    def __init__(self, name, documentation, func, type='gauge', labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.func = func
+        self.type = type
+        self.labelnames = tuple(labelnames)
+
+    def samples(self):
+        try:
+            value = self.func()
+        except Exception as e:
+            logger.warning(f"Failed to collect metric {self.name}: {str(e)}")
+            return []
+        if not self.labelnames:
+            return [(self.name, (), value)]
+        return [(self.name, tuple(zip(self.labelnames, map(str, key))), v) for key, v in value.items()]
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name, documentation, func, type='gauge', labelnames=()):
+        return self.register(CallbackMetric(name, documentation, func, type, labelnames))
+
+    def collect(self):
+        """返回 [{'name', 'type', 'help', 'samples': [[样本名, [[标签名, 标签值], ...], 数值], ...]}]"""
+        with self._lock:
+            metrics = list(self._metrics)
+        return [
+            {
+                'name': metric.name,
+                'type': metric.type,
+                'help': metric.documentation,
+                'samples': [[name, [list(label) for label in labels], value]
+                            for name, labels, value in metric.samples()],
+            }
+            for metric in metrics
+        ]
+
+
+def merge_snapshots(snapshots):
+    """合并多个进程的指标快照，同名同标签的样本值相加"""
+    merged = {}
+    for snapshot in snapshots:
+        for metric in snapshot:
+            target = merged.get(metric['name'])
+            if target is None:
+                target = merged[metric['name']] = dict(metric, samples={})
+            for name, labels, value in metric['samples']:
+                key = (name, tuple(tuple(label) for label in labels))
+                target['samples'][key] = target['samples'].get(key, 0) + value
+    return [
+        dict(metric, samples=[[name, labels, value] for (name, labels), value in metric['samples'].items()])
+        for metric in merged.values()
+    ]
+
+
+def _escape_label(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, int):
+        return str(value)
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+def render_text(collected):
+    """按Prometheus文本格式输出"""
+    lines = []
+    for metric in collected:
+        lines.append(f"# HELP {metric['name']} {metric['help']}")
+        lines.append(f"# TYPE {metric['name']} {metric['type']}")
+        for name, labels, value in metric['samples']:
+            if labels:
+                label_text = ','.join(f'{k}="{_escape_label(v)}"' for k, v in labels)
+                lines.append(f'{name}{{{label_text}}} {_format_value(value)}')
+            else:
+                lines.append(f'{name} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+class SharedMetrics:
+    """
+    通过本地目录在多个worker之间合并指标
+
+    :param registry: 本进程的指标注册表
+    :param directory: 快照目录，每个进程一个 <pid>.json 文件
+    :param interval: 后台写入快照的间隔（秒）；超过3个间隔没有更新的快照视为进程已退出
+    """
+
+    def __init__(self, registry, directory, interval=5):
+        self.registry = registry
+        self.directory = directory
+        self.interval = interval
+        os.makedirs(directory, exist_ok=True)
+        self._path = os.path.join(directory, f'{os.getpid()}.json')
+        threading.Thread(target=self._run, name='metrics-flush', daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+    def flush(self):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self.registry.collect(), f)
+            os.replace(tmp_path, self._path)
+        except OSError as e:
+            logger.warning(f"Failed to write metrics snapshot: {str(e)}")
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+    def collect(self):
+        """合并本进程的最新指标和其他进程的快照"""
+        snapshots = [self.registry.collect()]
+        stale_before = time.time() - self.interval * 3
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith('.json') or entry.path == self._path:
+                continue
+            try:
+                if entry.stat().st_mtime < stale_before:
+                    os.unlink(entry.path)
+                    continue
+                with open(entry.path, 'r', encoding='utf-8') as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return merge_snapshots(snapshots)
+
+
+def create_metrics_collector_from_env(registry):
+    """
+    返回 /metrics 使用的收集函数；设置 METRICS_DIR 时合并同一台机器上所有worker的指标
+    """
+    directory = os.getenv('METRICS_DIR')
+    if not directory:
+        return registry.collect
+    return SharedMetrics(registry, directory, interval=float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))).collect
@@ -0,0 +1,206 @@
+"""
+渲染结果缓存
+按 Markdown内容 + 主题名 + 主题版本 + 渲染选项 的哈希缓存最终的<section> HTML，
+内存中按条目数和字节数做LRU淘汰；可选的磁盘后端让同一台机器上的多个gunicorn worker共享缓存
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def make_render_key(md_content, theme_name, theme_version, options=None):
+    """计算渲染缓存键，同时用作 /render 响应的ETag"""
+    digest = hashlib.sha256()
+    for part in (theme_name, theme_version, json.dumps(options or {}, sort_keys=True)):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    digest.update(md_content.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class DiskRenderCache:
+    """
+    基于目录的共享缓存后端，每个条目一个文件
+    写入时先写临时文件再原子替换，多个进程并发读写是安全的
+    """
+
+    def __init__(self, directory, max_entries=4096):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.html')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            # 更新访问时间，淘汰时按最近使用排序
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def _mkstemp(self):
+        try:
+            return tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        except FileNotFoundError:
+            # 目录被删除（例如临时目录被清理）后重新创建
+            os.makedirs(self.directory, exist_ok=True)
+            return tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+
+    def put(self, key, value):
+        try:
+            fd, tmp_path = self._mkstemp()
+        except OSError as e:
+            logger.warning(f"Failed to write render cache entry: {str(e)}")
+            return
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(value)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            logger.warning(f"Failed to write render cache entry: {str(e)}")
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            return
+
+        self._writes += 1
+        if self._writes % 64 == 0:
+            self.prune()
+
+    def prune(self):
+        """条目数超过上限时删除最久未使用的文件"""
+        try:
+            entries = [e for e in os.scandir(self.directory) if e.name.endswith('.html')]
+        except FileNotFoundError:
+            return
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_entries]:
+            try:
+                os.unlink(entry.path)
+            except OSError:
+                pass
+
+    def clear(self):
+        try:
+            entries = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            if entry.name.endswith('.html'):
+                try:
+                    os.unlink(entry.path)
+                except OSError:
+                    pass
+
+
+class RenderCache:
+    """
+    进程内LRU渲染缓存
+
+    :param max_entries: 最多缓存的条目数
+    :param max_bytes: 缓存内容的总字节数上限
+    :param backend: 可选的共享后端（如 DiskRenderCache），内存未命中时查询
+    """
+
+    def __init__(self, max_entries=256, max_bytes=32 * 1024 * 1024, backend=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.backend = backend
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.shared_hits = 0
+
+    def get(self, key):
+        """返回缓存的HTML（bytes），未命中时返回None"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+
+        if self.backend is not None:
+            value = self.backend.get(key)
+            if value is not None:
+                with self._lock:
+                    self.shared_hits += 1
+                self._store(key, value)
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self._store(key, value)
+        if self.backend is not None:
+            self.backend.put(key, value)
+
+    def _store(self, key, value):
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = value
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'shared': self.backend is not None,
+            }
+
+
+def create_render_cache_from_env():
+    """根据环境变量创建渲染缓存，设置 RENDER_CACHE_DIR 时启用磁盘共享后端"""
+    backend = None
+    cache_dir = os.getenv('RENDER_CACHE_DIR')
+    if cache_dir:
+        backend = DiskRenderCache(cache_dir, max_entries=int(os.getenv('RENDER_CACHE_DISK_ENTRIES', '4096')))
+    return RenderCache(
+        max_entries=int(os.getenv('RENDER_CACHE_SIZE', '256')),
+        max_bytes=int(os.getenv('RENDER_CACHE_BYTES', str(32 * 1024 * 1024))),
+        backend=backend,
+    )
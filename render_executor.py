@@ -0,0 +1,192 @@
+"""
+渲染进程池
+Markdown转换、CSS内联和body提取都持有GIL，线程并发无法利用多核；
+RenderExecutor把渲染提交到预先启动的进程池，每个进程启动时预加载全部主题和Markdown转换器。
+
+进程池排队的任务数有上限，超过时立即抛出 RenderQueueFull（接口返回503和Retry-After），
+每个任务有超时时间，避免请求在队列中无限等待。
+工作进程异常退出（例如被OOM killer杀掉）导致进程池损坏时重建进程池，受影响的请求在新进程池中重试一次；
+重试仍然失败时抛出 RenderWorkerCrashed（按繁忙处理，返回503）。渲染不会退回到服务进程中执行，
+导致工作进程崩溃的文档不会连带服务进程一起崩溃。
+
+适合 gunicorn --threads 或 ASGI 模式：sync worker 一次只处理一个请求，为每个worker单独开进程池没有意义。
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from render_pipeline import init_render_worker, render_article
+
+logger = logging.getLogger(__name__)
+
+
+class RenderQueueFull(Exception):
+    """进程池中排队的任务已满"""
+
+    def __init__(self, retry_after):
+        super().__init__('render queue is full')
+        self.retry_after = retry_after
+
+
+class RenderWorkerCrashed(RenderQueueFull):
+    """进程池重建后工作进程仍然异常退出，和队列已满一样返回503和Retry-After"""
+
+    def __init__(self, retry_after):
+        super().__init__(retry_after)
+        self.args = ('render worker process died twice',)
+
+
+class RenderTimeout(Exception):
+    """渲染任务超时"""
+
+
+def _ping():
+    return os.getpid()
+
+
+class RenderExecutor:
+    """
+    预热的渲染进程池
+
+    :param workers: 进程数
+    :param max_queue: 除正在执行的任务外最多排队的任务数
+    :param timeout: 单个任务的超时时间（秒，包括排队时间）
+    :param retry_after: 队列已满时建议客户端等待的秒数
+    :param themes_dir: 主题目录，工作进程启动时预加载其中的全部主题（有主题包时按需加载）
+    """
+
+    def __init__(self, workers, max_queue=None, timeout=30, retry_after=1, themes_dir='./themes'):
+        self.workers = workers
+        self.max_queue = workers * 2 if max_queue is None else max_queue
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.themes_dir = themes_dir
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._pool_lock = threading.Lock()
+        self.rejected = 0
+        self.timeouts = 0
+        self.restarts = 0
+        self.crashes = 0
+        self._pool = self._start_pool()
+
+    def _start_pool(self):
+        pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_render_worker,
+            initargs=(self.themes_dir, True),
+        )
+        # 同时提交 workers 个空任务，让进程池立即启动全部进程并完成预热
+        for _ in range(self.workers):
+            pool.submit(_ping)
+        return pool
+
+    def _rebuild(self, pool):
+        """重建损坏的进程池；多个线程同时发现时只重建一次"""
+        with self._pool_lock:
+            if self._pool is not pool:
+                return
+            logger.warning("Render worker process died, restarting the render process pool")
+            pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = self._start_pool()
+            self.restarts += 1
+
+    def crashed(self):
+        """重试后工作进程仍然异常退出：记录并返回要抛出的 RenderWorkerCrashed"""
+        with self._lock:
+            self.crashes += 1
+        return RenderWorkerCrashed(self.retry_after)
+
+    def _release(self, future):
+        with self._lock:
+            self._in_flight -= 1
+
+    def _submit(self, markdown_content, style_name, dash_separator):
+        """返回 (提交到的进程池, Future)"""
+        with self._lock:
+            if self._in_flight >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise RenderQueueFull(self.retry_after)
+            self._in_flight += 1
+        for _ in range(2):
+            pool = self._pool
+            try:
+                future = pool.submit(render_article, markdown_content, style_name, dash_separator)
+            except BrokenProcessPool:
+                # 进程池已经损坏（之前的任务中有工作进程退出），重建后再提交一次
+                self._rebuild(pool)
+                continue
+            except Exception:
+                self._release(None)
+                raise
+            # 超时的任务仍然占用进程，直到真正结束才释放名额
+            future.add_done_callback(self._release)
+            return pool, future
+        self._release(None)
+        raise self.crashed()
+
+    def submit(self, markdown_content, style_name, dash_separator=False):
+        """
+        提交渲染任务，返回结果为 (html, title, 各阶段耗时) 的 concurrent.futures.Future
+        排队的任务已满时抛出 RenderQueueFull；进程池已损坏时先重建进程池，重建后仍然损坏时抛出 RenderWorkerCrashed。
+        Future 抛出 BrokenProcessPool 时（执行中的工作进程退出）调用方可以再提交一次
+        """
+        return self._submit(markdown_content, style_name, dash_separator)[1]
+
+    def render(self, markdown_content, style_name, dash_separator=False):
+        """
+        同步渲染，返回 (html, title, 各阶段耗时)；超时抛出 RenderTimeout
+        执行中的工作进程异常退出时重建进程池并重试一次，仍然失败时抛出 RenderWorkerCrashed
+        """
+        for _ in range(2):
+            pool, future = self._submit(markdown_content, style_name, dash_separator)
+            try:
+                return future.result(timeout=self.timeout)
+            except TimeoutError:
+                future.cancel()
+                with self._lock:
+                    self.timeouts += 1
+                raise RenderTimeout(f'render did not finish within {self.timeout}s')
+            except BrokenProcessPool:
+                logger.warning("Render worker process died while rendering, retrying in a new process pool")
+                self._rebuild(pool)
+        raise self.crashed()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_queue': self.max_queue,
+                'in_flight': self._in_flight,
+                'rejected': self.rejected,
+                'timeouts': self.timeouts,
+                'restarts': self.restarts,
+                'crashes': self.crashes,
+            }
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+
+def create_render_executor_from_env(themes_dir='./themes'):
+    """
+    根据环境变量创建渲染进程池；RENDER_EXECUTOR_WORKERS 未设置或为0时返回None（在请求线程中渲染）
+    """
+    workers = int(os.getenv('RENDER_EXECUTOR_WORKERS', '0'))
+    if workers <= 0:
+        return None
+    max_queue = os.getenv('RENDER_EXECUTOR_QUEUE')
+    executor = RenderExecutor(
+        workers,
+        max_queue=int(max_queue) if max_queue else None,
+        timeout=float(os.getenv('RENDER_EXECUTOR_TIMEOUT', '30')),
+        retry_after=int(os.getenv('RENDER_EXECUTOR_RETRY_AFTER', '1')),
+        themes_dir=themes_dir,
+    )
+    logger.info(f"Render executor started with {workers} worker processes")
+    return executor
@@ -0,0 +1,254 @@
+"""
+渲染流水线
+/render、/wechat/send_draft、批处理任务和基准测试共用的 Markdown → 内联样式HTML 流程：
+
+    theme   解析主题（主题缓存 + 预编译内联器）
+    split   按分隔线切分卡片（仅卡片模式）
+    parse   Markdown 转 HTML
+    inline  CSS内联
+    wrap    提取body内容并用<section>包裹
+
+不依赖Flask，可以直接调用；每个阶段的耗时记录在结果中，并通知注册的钩子
+"""
+
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import md_converter
+from css_variables import resolve_css_variables
+from html_fragment import extract_body_fragment, wrap_section
+from md_sections import DEFAULT_TITLE, MarkdownSections, extract_title
+from theme_bundle import load_theme_bundle_from_env
+from theme_cache import ThemeCache
+
+logger = logging.getLogger(__name__)
+
+STAGES = ('theme', 'split', 'parse', 'inline', 'wrap')
+
+def inline_document(body_html):
+    """
+    构造用于CSS内联的HTML文档；主题样式由预编译的内联器提供，文档中不再包含<style>块
+    """
+    return f'''
+<!DOCTYPE html>
+<html>
+<head>
+</head>
+<body>
+{body_html}
+</body>
+</html>'''
+
+
+def _convert_section(args):
+    text, profile = args
+    return md_converter.convert(text, profile)
+
+
+def _warm_converter(profile):
+    md_converter.get_converter(profile)
+
+
+def create_section_executor(workers=None, kind=None, profile='default'):
+    """
+    创建卡片模式下并发渲染各section的工作池，workers不大于1时返回None（串行渲染）
+
+    默认不启用：每个服务进程都会各自启动一组子进程，section的转换通常比进程间传递参数和结果更快，
+    只有单个进程、文档很长时才值得通过RENDER_SECTION_WORKERS开启。
+    Markdown转换是纯Python代码，受GIL限制，默认使用进程池；
+    子进程用spawn方式启动，避免在多线程的服务进程中fork
+    """
+    if workers is None:
+        workers = int(os.getenv('RENDER_SECTION_WORKERS', '0'))
+    if workers <= 1:
+        return None
+    kind = kind or os.getenv('RENDER_SECTION_EXECUTOR', 'process')
+    if kind == 'thread':
+        return ThreadPoolExecutor(max_workers=workers, thread_name_prefix='render-section')
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_warm_converter,
+        initargs=(profile,),
+    )
+
+
+class RenderResult:
+    """一次渲染的结果"""
+
+    __slots__ = ('html', 'theme', 'sections', 'title', 'timings')
+
+    def __init__(self, html, theme, sections, title, timings):
+        self.html = html
+        self.theme = theme
+        self.sections = sections
+        self.title = title
+        self.timings = timings
+
+
+class RenderPipeline:
+    """
+    Markdown渲染流水线
+
+    :param theme_cache: 主题缓存
+    :param profile: md_converter中的扩展配置名
+    :param section_executor: 卡片模式下并发渲染section的工作池，None表示串行渲染
+    """
+
+    def __init__(self, theme_cache, profile='default', section_executor=None):
+        self.theme_cache = theme_cache
+        self.profile = profile
+        self.section_executor = section_executor
+        self._stage_hooks = []
+
+    def add_stage_hook(self, hook):
+        """注册阶段耗时钩子，hook(stage, seconds) 在每个阶段结束后调用"""
+        self._stage_hooks.append(hook)
+
+    def _record(self, timings, stage, started):
+        elapsed = time.perf_counter() - started
+        timings[stage] = timings.get(stage, 0.0) + elapsed
+        for hook in self._stage_hooks:
+            try:
+                hook(stage, elapsed)
+            except Exception as e:
+                logger.warning(f"Render stage hook failed: {str(e)}")
+
+    def resolve_theme(self, style_name):
+        """
+        读取主题缓存条目，主题不存在或名称非法时返回None
+        """
+        # Security: Ensure style_name is a valid filename and doesn't contain path traversal characters.
+        if not style_name or '..' in style_name or not style_name.endswith('.css'):
+            return None
+        try:
+            return self.theme_cache.get(style_name)
+        except FileNotFoundError:
+            # Handle case where style file doesn't exist
+            return None
+
+    def parse(self, markdown_content):
+        return md_converter.convert(markdown_content, self.profile)
+
+    def parse_sections(self, sections):
+        """渲染各section，有工作池时并发渲染，结果保持原顺序"""
+        executor = self.section_executor
+        if executor is None or len(sections) < 2:
+            return [self.parse(section) for section in sections]
+        try:
+            return list(executor.map(_convert_section, [(section, self.profile) for section in sections]))
+        except BrokenProcessPool as e:
+            # 子进程崩溃后进程池不可再用，之后都串行渲染；其他异常（例如转换出错）照常抛出
+            logger.warning(f"Section worker pool is broken, falling back to serial: {str(e)}")
+            self.section_executor = None
+            return [self.parse(section) for section in sections]
+
+    def parse_cards(self, sections):
+        """渲染卡片：第一个section用content-card，其余用section-card"""
+        html_sections = []
+        for i, section_html in enumerate(self.parse_sections(sections)):
+            card_class = 'content-card' if i == 0 else 'section-card'
+            html_sections.append(f'<div class="{card_class}">{section_html}</div>')
+        return ''.join(html_sections)
+
+    def inline(self, theme, html_content):
+        return theme.inline(inline_document(f'<div class="markdown-body">\n{html_content}\n</div>'))
+
+    def render(self, markdown_content, style_name, dash_separator=False):
+        """
+        渲染Markdown为内联样式后的<section> HTML
+
+        :param dash_separator: 为True时按 --- 切分为多张卡片分别渲染
+        """
+        timings = {}
+
+        started = time.perf_counter()
+        theme = self.resolve_theme(style_name)
+        self._record(timings, 'theme', started)
+
+        sections = None
+        if dash_separator:
+            # 切分卡片的同一次扫描中提取标题
+            started = time.perf_counter()
+            scanner = MarkdownSections(markdown_content)
+            sections = list(scanner)
+            title = scanner.title or DEFAULT_TITLE
+            self._record(timings, 'split', started)
+            logger.info(f"Found {len(sections)} sections after splitting by ---")
+        else:
+            title = extract_title(markdown_content)
+
+        started = time.perf_counter()
+        if sections is None:
+            html_content = self.parse(markdown_content)
+        else:
+            html_content = self.parse_cards(sections)
+        self._record(timings, 'parse', started)
+
+        if not theme or not theme.inliner:
+            # 如果没有CSS，直接用<section>标签包裹内容
+            html = f'<section><div class="markdown-body">{html_content}</div></section>'
+            return RenderResult(html, theme, sections, title, timings)
+
+        started = time.perf_counter()
+        inlined_html = self.inline(theme, html_content)
+        self._record(timings, 'inline', started)
+
+        # 提取body中的内容和markdown-body容器的背景样式，并用<section>标签包裹
+        started = time.perf_counter()
+        html = wrap_section(*extract_body_fragment(inlined_html))
+        self._record(timings, 'wrap', started)
+
+        return RenderResult(html, theme, sections, title, timings)
+
+
+_default_pipeline = None
+
+
+def default_pipeline(themes_dir='./themes'):
+    """返回进程内共享的默认流水线，主题包默认为主题目录旁边的 themes.bundle"""
+    global _default_pipeline
+    if _default_pipeline is None:
+        bundle_path = os.path.join(os.path.dirname(os.path.abspath(themes_dir)), 'themes.bundle')
+        _default_pipeline = RenderPipeline(
+            ThemeCache(
+                themes_dir, resolve_css_variables,
+                maxsize=int(os.getenv('THEME_CACHE_SIZE', '64')),
+                bundle=load_theme_bundle_from_env(bundle_path),
+            ),
+            section_executor=create_section_executor(),
+        )
+    return _default_pipeline
+
+
+def render_markdown(markdown_content, style_name, dash_separator=False):
+    """不依赖Flask的渲染入口，返回<section> HTML字符串"""
+    return default_pipeline().render(markdown_content, style_name, dash_separator).html
+
+
+def init_render_worker(themes_dir='./themes', preload_themes=False):
+    """
+    渲染进程池的初始化函数：预先创建流水线和Markdown转换器，preload_themes为True时预加载全部主题；
+    进程池中的任务已经并行执行，进程内不再为卡片section创建工作池
+
+    有主题包时不预加载：主题CSS已经编译好，首次使用时只需从包中读取，启动时间不随主题数量增长
+    """
+    os.environ['RENDER_SECTION_WORKERS'] = '0'
+    pipeline = default_pipeline(themes_dir)
+    md_converter.get_converter(pipeline.profile)
+    if preload_themes and pipeline.theme_cache.bundle is None:
+        for name in sorted(pipeline.theme_cache.names()):
+            try:
+                pipeline.theme_cache.get(name)
+            except Exception as e:
+                logger.warning(f"Failed to preload theme {name}: {str(e)}")
+
+
+def render_article(markdown_content, style_name, dash_separator=False):
+    """可以提交到进程池的渲染入口，返回 (html, title, 各阶段耗时)"""
+    result = default_pipeline().render(markdown_content, style_name, dash_separator)
+    return result.html, result.title, result.timings
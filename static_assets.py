@@ -0,0 +1,193 @@
+"""
+静态资源
+frontend.html、frontend.js、主题CSS等文件按内容哈希生成指纹和强ETag，读取一次后保存在内存中，
+文件变化（mtime/size）后重新读取；读取时同时压缩好gzip和brotli版本，请求时按Accept-Encoding直接返回。
+URL中带有当前指纹（?v=<hash>）的请求可以被浏览器长期缓存，其他请求每次用ETag确认，未变化时返回304。
+
+还提供动态响应（/render的HTML）按请求压缩的函数，包括流式响应。
+brotli为可选依赖（pip install "md2any[compression]"），未安装时只提供gzip。
+"""
+
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import threading
+import zlib
+
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # 未安装brotli时只提供gzip压缩
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+_COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'application/xml', 'image/svg+xml')
+
+# 静态资源只压缩一次，使用最高压缩率；动态响应每次请求都要压缩，使用较快的级别
+_STATIC_LEVELS = {'br': 11, 'gzip': 9}
+_DYNAMIC_LEVELS = {'br': 5, 'gzip': 6}
+
+
+def supported_encodings():
+    """按优先级排列的可用压缩编码"""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def choose_encoding(accept_encodings, available=None):
+    """
+    按请求的Accept-Encoding（werkzeug的Accept对象）选择压缩编码，优先brotli；不压缩时返回None
+
+    :param available: 可选的编码，默认为全部可用编码
+    """
+    for encoding in supported_encodings():
+        if (available is None or encoding in available) and accept_encodings.quality(encoding) > 0:
+            return encoding
+    return None
+
+
+def is_compressible(mimetype):
+    return bool(mimetype) and mimetype.startswith(_COMPRESSIBLE_TYPES)
+
+
+def compress(data, encoding, static=False):
+    level = (_STATIC_LEVELS if static else _DYNAMIC_LEVELS)[encoding]
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    # mtime固定为0，相同内容压缩结果相同
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def compress_stream(chunks, encoding):
+    """逐块压缩流式响应，每块都立即刷出，客户端可以边接收边解压"""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=_DYNAMIC_LEVELS['br'])
+        for chunk in chunks:
+            data = compressor.process(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+            data += compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+        return
+
+    compressor = zlib.compressobj(_DYNAMIC_LEVELS['gzip'], zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+        data += compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class Asset:
+    """
+    内存中的一个静态资源及其预压缩版本
+
+    :param stamp: 判断内容是否变化的标记，例如文件的 (mtime_ns, size)
+    """
+
+    __slots__ = ('name', 'mimetype', 'stamp', 'hash', 'variants')
+
+    def __init__(self, name, data, mimetype, stamp, min_size=1024):
+        self.name = name
+        self.mimetype = mimetype
+        self.stamp = stamp
+        self.hash = hashlib.sha256(data).hexdigest()[:16]
+        # 编码 -> 内容，None为未压缩的原始内容；压缩后没有变小的编码不提供
+        self.variants = {None: data}
+        if is_compressible(mimetype) and len(data) >= min_size:
+            for encoding in supported_encodings():
+                compressed = compress(data, encoding, static=True)
+                if len(compressed) < len(data):
+                    self.variants[encoding] = compressed
+
+    @property
+    def data(self):
+        return self.variants[None]
+
+    def etag(self, encoding=None):
+        """强ETag：同一内容的不同压缩编码使用不同的ETag"""
+        return self.hash if encoding is None else f'{self.hash}-{encoding}'
+
+    def etags(self):
+        return [self.etag(encoding) for encoding in self.variants]
+
+
+class AssetStore:
+    """
+    目录下静态资源的内存缓存
+
+    :param root: 资源目录
+    :param min_size: 小于该字节数的资源不压缩
+    :param max_size: 大于该字节数的文件不缓存（get返回None，由调用方直接发送文件）
+    """
+
+    def __init__(self, root, min_size=1024, max_size=8 * 1024 * 1024):
+        self.root = root
+        self.min_size = min_size
+        self.max_size = max_size
+        self._assets = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def get(self, name):
+        """返回文件对应的Asset；文件不存在、不在目录内或超过max_size时返回None"""
+        path = safe_join(self.root, name)
+        if path is None:
+            return None
+        try:
+            stat = os.stat(path)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        if not os.path.isfile(path) or stat.st_size > self.max_size:
+            return None
+
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            asset = self._assets.get(name)
+        if asset is not None and asset.stamp == stamp:
+            return asset
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        return self.put(name, data, stamp)
+
+    def put(self, name, data, stamp, mimetype=None):
+        """
+        缓存由调用方生成的内容（例如改写过的页面、主题包中的主题），stamp不变时直接返回已缓存的Asset
+        """
+        with self._lock:
+            asset = self._assets.get(name)
+        if asset is not None and asset.stamp == stamp:
+            return asset
+
+        if mimetype is None:
+            mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        # 压缩在锁外进行，同一资源并发加载时最多重复压缩一次
+        asset = Asset(name, data, mimetype, stamp, self.min_size)
+        with self._lock:
+            self._assets[name] = asset
+            self.loads += 1
+        return asset
+
+    def stats(self):
+        with self._lock:
+            return {
+                'assets': len(self._assets),
+                'bytes': sum(len(data) for asset in self._assets.values() for data in asset.variants.values()),
+                'loads': self.loads,
+            }
+
+
+def create_asset_store_from_env(root):
+    return AssetStore(
+        root,
+        min_size=int(os.getenv('COMPRESS_MIN_SIZE', '1024')),
+        max_size=int(os.getenv('STATIC_MAX_FILE_SIZE', str(8 * 1024 * 1024))),
+    )
@@ -0,0 +1,78 @@
+import os
+import sys
+
+# 项目模块都在仓库根目录下
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """本地模拟服务的请求处理：按 server.routes 中 (方法, 路径) 对应的函数生成响应"""
+
+    def _handle(self):
+        path = self.path.split('?', 1)[0]
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        self.server.requests.append((self.command, self.path, dict(self.headers), body))
+        route = self.server.routes.get((self.command, path))
+        if route is None:
+            status, headers, data = 404, {}, b'not found'
+        else:
+            status, headers, data = route(self)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if 'Content-Length' not in headers:
+            self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = _handle
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stand_in_server():
+    """
+    在127.0.0.1的随机端口上启动模拟服务
+    测试向 server.routes 注册处理函数，处理函数返回 (状态码, 响应头, 响应体)；server.requests 记录收到的请求
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    server.routes = {}
+    server.requests = []
+    server.url = f'http://127.0.0.1:{server.server_address[1]}'
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(scope='session')
+def api_server(tmp_path_factory):
+    """
+    导入Flask应用：不启用渲染进程池，任务队列、图片缓存和token缓存写到临时目录；
+    应用按相对路径读取主题和静态文件，测试期间工作目录切换到仓库根目录
+    """
+    directory = tmp_path_factory.mktemp('api_server')
+    with pytest.MonkeyPatch.context() as patch:
+        patch.chdir(ROOT)
+        patch.setenv('RENDER_EXECUTOR_WORKERS', '0')
+        patch.setenv('JOB_DB_PATH', str(directory / 'jobs.sqlite3'))
+        patch.setenv('WECHAT_IMAGE_DB_PATH', str(directory / 'images.sqlite3'))
+        patch.setenv('WECHAT_TOKEN_DIR', str(directory / 'tokens'))
+        import api_server
+        yield api_server
+
+
+@pytest.fixture
+def client(api_server):
+    return api_server.app.test_client()
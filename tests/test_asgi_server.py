@@ -0,0 +1,85 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from wechat_client import AsyncWeChatClient
+
+MARKDOWN = '# Title\n\nSome **bold** text.\n'
+
+
+@pytest.fixture
+def asgi_server(api_server):
+    import asgi_server
+    yield asgi_server
+    if asgi_server._State.client is not None:
+        asyncio.run(asgi_server._State.client.close())
+        asgi_server._State.client = None
+
+
+def _post(asgi_server, path, payload):
+    async def run():
+        transport = httpx.ASGITransport(app=asgi_server.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://testserver') as client:
+            return await client.post(path, json=payload)
+    return asyncio.run(run())
+
+
+def test_render_matches_flask_app(asgi_server, client):
+    payload = {'md': MARKDOWN, 'style': 'alibaba.css', 'dashseparator': True}
+    response = _post(asgi_server, '/render', payload)
+    assert response.status_code == 200
+    assert response.headers['Content-Type'].startswith('text/html')
+    assert response.text == client.post('/render', json=payload).get_data(as_text=True)
+    assert 'Title' in response.text
+
+
+def test_raw_draft_is_sent_from_event_loop(asgi_server, stand_in_server):
+    stand_in_server.routes[('POST', '/cgi-bin/draft/add')] = lambda handler: (
+        200, {'Content-Type': 'application/json'}, b'{"media_id": "m1"}')
+    asgi_server._State.client = AsyncWeChatClient(api_base=stand_in_server.url)
+
+    response = _post(asgi_server, '/wechat/draft', {'access_token': 't', 'content': '<p>hi</p>', 'title': 'T'})
+    assert response.status_code == 200
+    assert response.json() == {'media_id': 'm1'}
+    method, path, _, body = stand_in_server.requests[0]
+    assert path == '/cgi-bin/draft/add?access_token=t'
+    assert json.loads(body)['articles'][0]['content'] == '<p>hi</p>'
+
+
+def test_raw_draft_maps_wechat_errors(asgi_server, stand_in_server):
+    stand_in_server.routes[('POST', '/cgi-bin/draft/add')] = lambda handler: (
+        200, {'Content-Type': 'application/json'}, b'{"errcode": 40007, "errmsg": "invalid media_id"}')
+    asgi_server._State.client = AsyncWeChatClient(api_base=stand_in_server.url)
+
+    assert _post(asgi_server, '/wechat/draft', {'access_token': 't'}).json() == {'errcode': 400, 'errmsg': '缺少内容'}
+    response = _post(asgi_server, '/wechat/draft', {'access_token': 't', 'content': '<p>hi</p>'})
+    assert response.status_code == 400
+    assert response.json()['errcode'] == 40007
+
+
+@pytest.mark.parametrize('draft_result, status_code, article_status', [
+    (b'{"media_id": "m1"}', 200, 'ok'),
+    (b'{"errcode": 45002, "errmsg": "content size out of limit"}', 400, 'error'),
+])
+def test_batch_publish_matches_flask_app(asgi_server, client, api_server, stand_in_server, monkeypatch,
+                                         draft_result, status_code, article_status):
+    stand_in_server.routes[('GET', '/cgi-bin/token')] = lambda handler: (
+        200, {'Content-Type': 'application/json'}, b'{"access_token": "t", "expires_in": 7200}')
+    stand_in_server.routes[('POST', '/cgi-bin/draft/add')] = lambda handler: (
+        200, {'Content-Type': 'application/json'}, draft_result)
+    monkeypatch.setattr(api_server.wechat_client, 'api_base', stand_in_server.url)
+    asgi_server._State.client = AsyncWeChatClient(api_base=stand_in_server.url, max_retries=0)
+
+    articles = [{'markdown': MARKDOWN, 'title': 'First'}, {'markdown': '# Second\n', 'style': 'alibaba.css'}]
+    payload = {'appid': 'wx-batch', 'secret': 's', 'upload_images': False, 'articles': articles}
+    response = _post(asgi_server, '/wechat/send_draft_batch', payload)
+    flask_response = client.post('/wechat/send_draft_batch', json=payload)
+    assert response.status_code == flask_response.status_code == status_code
+    assert response.json() == flask_response.get_json()
+    assert [article['status'] for article in response.json()['articles']] == [article_status] * 2
+    assert [article['title'] for article in response.json()['articles']] == ['First', 'Second']
+    # 两种方式提交的草稿内容相同
+    drafts = [json.loads(body) for method, _, _, body in stand_in_server.requests if method == 'POST']
+    assert len(drafts) == 2 and drafts[0] == drafts[1]
@@ -0,0 +1,46 @@
+from css_variables import DARK_SCOPE, ROOT_SCOPE, extract_css_variables, resolve_css_variables
+
+
+def test_dark_mode_overrides_root_values():
+    css = (':root { --text: #333; --bg: white; }\n'
+           '.dark-mode { --text: #eee; }\n'
+           'p { color: var(--text); background: var(--bg); }\n'
+           '.dark-mode p { color: var(--text); background: var(--bg); }\n')
+    assert extract_css_variables(css) == {ROOT_SCOPE: {'--text': '#333', '--bg': 'white'},
+                                          DARK_SCOPE: {'--text': '#eee'}}
+    resolved = resolve_css_variables(css)
+    assert 'p { color: #333; background: white; }' in resolved
+    # 暗黑模式中没有覆盖的变量使用 :root 中的值
+    assert '.dark-mode p { color: #eee; background: white; }' in resolved
+    assert '--text' not in resolved
+
+
+def test_nested_fallbacks():
+    css = ':root { --size: 2px; }\np { margin: var(--a, var(--b, 3px)); padding: var(--a, var(--size, 9px)); }'
+    assert resolve_css_variables(css) == ':root { }\np { margin: 3px; padding: 2px; }'
+
+
+def test_chained_variables():
+    css = (':root { --base: 4px; --double: calc(var(--base) * 2); --gap: var(--double); }\n'
+           'p { margin: var(--gap); }')
+    assert resolve_css_variables(css) == ':root { }\np { margin: calc(4px * 2); }'
+
+
+def test_cycles_stay_unresolved():
+    css = ':root { --a: var(--b); --b: var(--a); --c: var(--a); }\np { margin: var(--c); padding: var(--a, 1px); }'
+    # 循环引用及依赖它的变量都无效：没有fallback时保持原样，有fallback时使用fallback
+    assert resolve_css_variables(css) == ':root { }\np { margin: var(--c); padding: 1px; }'
+
+
+def test_semicolons_inside_strings():
+    css = ':root { --quote: "a;b}c"; --font: \'x;y\', serif; }\nh1::before { content: var(--quote); font-family: var(--font); }'
+    assert extract_css_variables(css)[ROOT_SCOPE] == {'--quote': '"a;b}c"', '--font': "'x;y', serif"}
+    assert resolve_css_variables(css) == ':root { }\nh1::before { content: "a;b}c"; font-family: \'x;y\', serif; }'
+
+
+def test_dark_mode_toggle_is_not_dark_scope():
+    css = (':root { --color: red; }\n'
+           '.dark-mode-toggle { --color: blue; }\n'
+           '.dark-mode-toggle span { color: var(--color); }\n')
+    assert extract_css_variables(css)[DARK_SCOPE] == {}
+    assert '.dark-mode-toggle span { color: blue; }' in resolve_css_variables(css)
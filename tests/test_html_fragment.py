@@ -0,0 +1,105 @@
+"""
+html_fragment 的输出必须与此前 BeautifulSoup(html.parser) 逐个序列化body子节点的结果逐字节一致
+"""
+
+import os
+
+import pytest
+from bs4 import BeautifulSoup
+from css_inline import CSSInliner
+
+from conftest import ROOT
+from css_variables import resolve_css_variables
+from html_fragment import extract_body_fragment, wrap_section
+from render_pipeline import RenderPipeline, inline_document
+from theme_cache import ThemeCache
+
+THEMES_DIR = os.path.join(ROOT, 'themes')
+THEMES = sorted(name for name in os.listdir(THEMES_DIR) if name.endswith('.css'))
+
+DOCUMENT = '''# 标题 Title &amp; more
+
+Some **bold** and *em* text with a link https://example.com and [named](http://a.b "t&quot;").
+A line with a hard break  
+and&nbsp;non-breaking&nbsp;spaces, <span class="  a   b ">classes</span> <!-- a comment -->
+
+- item 1
+- item 2
+
+1. one
+2. two
+
+> quote line
+> second
+
+| a | b |
+|---|---|
+| 1 | 2 |
+
+```python
+def f():
+    return 1 < 2 and "x" != 'y'
+```
+
+<textarea>
+  keep   spaces
+</textarea>
+
+![img](https://example.com/x.png?a=1&b=2) <img src="y.png" alt='say "hi"'>
+
+---
+
+<svg viewBox="0 0 10 10"><circle cx="5" cy="5" r="4"/></svg>
+
+### Card two
+
+text & more <b>html</b><br>
+'''
+
+
+def beautifulsoup_section(inlined_html):
+    """此前的实现"""
+    soup = BeautifulSoup(inlined_html, 'html.parser')
+    markdown_body = soup.find(class_='markdown-body')
+    container_bg_style = ''
+    if markdown_body and markdown_body.get('style'):
+        bg_styles = []
+        for style_part in markdown_body.get('style').split(';'):
+            style_part = style_part.strip()
+            if style_part.startswith(('background', 'padding', 'border-radius', 'box-shadow')):
+                bg_styles.append(style_part)
+        if bg_styles:
+            container_bg_style = f' style="{"; ".join(bg_styles)}"'
+    body_content = ''.join([str(child) for child in soup.body.children])
+    return f'<section{container_bg_style}>{body_content}</section>'
+
+
+@pytest.fixture(scope='module')
+def pipeline():
+    return RenderPipeline(ThemeCache(THEMES_DIR, resolve_css_variables))
+
+
+@pytest.mark.parametrize('theme_name', THEMES)
+def test_matches_beautifulsoup_for_every_theme(pipeline, theme_name):
+    theme = pipeline.resolve_theme(theme_name)
+    if theme is None or theme.inliner is None:
+        pytest.skip(f'{theme_name} cannot be inlined')
+    inlined_html = pipeline.inline(theme, pipeline.parse(DOCUMENT))
+    assert wrap_section(*extract_body_fragment(inlined_html)) == beautifulsoup_section(inlined_html)
+
+
+def test_matches_beautifulsoup_for_script_and_style():
+    body = ('<div class="markdown-body other" style="background: red; color: blue; padding: 1px">'
+            '<script>if (a < b && c) {}</script>\n\n<style>p > a { color: red }</style>'
+            '<pre>  a\n\n  <b>b</b>  </pre> \n <p title="&amp;&lt;">x&nbsp;y</p></div>')
+    inlined_html = CSSInliner().inline(inline_document(body))
+    assert wrap_section(*extract_body_fragment(inlined_html)) == beautifulsoup_section(inlined_html)
+
+
+def test_void_elements_do_not_swallow_end_tags():
+    # 大量空元素之后的结束标签照常输出
+    body = '<div class="markdown-body"><p>' + 'a<br>' * 2000 + '<img src="x.png"><hr></p></div>'
+    inlined_html = CSSInliner().inline(inline_document(body))
+    content, _ = extract_body_fragment(inlined_html)
+    assert content.count('<br/>') == 2000
+    assert content == ''.join(str(child) for child in BeautifulSoup(inlined_html, 'html.parser').body.children)
@@ -0,0 +1,103 @@
+import os
+
+import pytest
+
+from conftest import ROOT
+from incremental_render import theme_supports_blocks
+
+THEMES = ['alibaba.css', 'apple-notes.css', 'art-deco.css', 'custom.css']
+
+MARKDOWN = '''# {style}
+
+Intro paragraph with **bold**, *italic* and `code`.
+
+- first item
+- second item
+
+  continued item
+
+> quoted text
+> on two lines
+
+---
+
+## Second card
+
+```python
+print("---")
+```
+
+| a | b |
+|---|---|
+| 1 | 2 |
+
+1. one
+2. two
+
+---
+
+Closing paragraph.
+'''
+
+
+def _assemble(result, blocks):
+    return result['prefix'] + result['separator'].join(blocks[block_id] for block_id in result['order']) + result['suffix']
+
+
+def _render(client, md, style, dash_separator, **extra):
+    return client.post('/render', json=dict(extra, md=md, style=style, dashseparator=dash_separator))
+
+
+@pytest.mark.parametrize('dash_separator', [False, True])
+@pytest.mark.parametrize('style', THEMES)
+def test_blocks_and_stream_match_full_render(client, style, dash_separator):
+    md = MARKDOWN.format(style=f'{style} {dash_separator}')
+
+    response = client.post('/render/blocks', json={'md': md, 'style': style, 'dashseparator': dash_separator})
+    result = response.get_json()
+    assert result['mode'] == 'blocks'
+    blocks = {block['id']: block['html'] for block in result['blocks']}
+
+    # 流式渲染在整篇渲染之前请求，避免直接返回渲染缓存中的结果
+    streamed = _render(client, md, style, dash_separator, stream=True)
+    assert streamed.is_streamed
+    full = _render(client, md, style, dash_separator).get_data(as_text=True)
+    assert _assemble(result, blocks) == full
+    assert streamed.get_data(as_text=True) == full
+
+    # 客户端持有全部块时只返回顺序
+    again = client.post('/render/blocks', json={'md': md, 'style': style, 'dashseparator': dash_separator,
+                                                'known': result['order']}).get_json()
+    assert again['order'] == result['order'] and again['blocks'] == []
+    assert _assemble(again, blocks) == full
+
+
+def test_stream_chunks_match_full_render(api_server, client, monkeypatch):
+    # 每个块单独内联时，批次之间的拼接也与整篇渲染一致
+    monkeypatch.setattr(api_server.incremental_renderer, 'stream_chunk_size', 1)
+    md = MARKDOWN.format(style='chunked')
+    streamed = _render(client, md, 'alibaba.css', False, stream=True).get_data(as_text=True)
+    assert streamed == _render(client, md, 'alibaba.css', False).get_data(as_text=True)
+
+
+@pytest.mark.parametrize('md, style', [
+    # 主题使用依赖相邻元素的选择器
+    (MARKDOWN.format(style='context'), 'chinese_colorful.css'),
+    # 文档包含HTML块
+    ('# Title\n\n<div>raw</div>\n\ntext\n', 'alibaba.css'),
+    # 文档包含链接引用定义
+    ('[link][ref]\n\n[ref]: https://example.com\n', 'alibaba.css'),
+    # 主题不存在
+    ('# Title\n', 'missing.css'),
+])
+def test_unsupported_documents_fall_back_to_full_render(api_server, client, md, style):
+    if style == 'chinese_colorful.css':
+        with open(os.path.join(ROOT, 'themes', style), encoding='utf-8') as f:
+            assert not theme_supports_blocks(f.read())
+    assert api_server.incremental_renderer.stream(md, style) is None
+
+    result = client.post('/render/blocks', json={'md': md, 'style': style}).get_json()
+    assert result['mode'] == 'full'
+    full = _render(client, md, style, False).get_data(as_text=True)
+    assert result['html'] == full
+    assert _render(client, md, style, False, stream=True).get_data(as_text=True) == full
@@ -0,0 +1,60 @@
+import os
+import threading
+import time
+
+from job_queue import FAILED, LOST_ERROR, SUCCEEDED, JobQueue
+
+
+def _wait_finished(queue, job_id, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job['status'] in (SUCCEEDED, FAILED):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f'job {job_id} did not finish')
+
+
+def test_runs_job_and_stores_result(tmp_path):
+    queue = JobQueue(os.path.join(tmp_path, 'jobs.sqlite3'))
+    queue.register('echo', lambda payload: {'echo': payload})
+    job_id = queue.submit('echo', 'hi', summary={'title': 'T'})
+    job = _wait_finished(queue, job_id)
+    assert job['status'] == SUCCEEDED
+    assert job['result'] == {'echo': 'hi'}
+    assert job['summary'] == {'title': 'T'}
+
+
+def test_stale_queued_job_is_not_run(tmp_path):
+    queue = JobQueue(os.path.join(tmp_path, 'jobs.sqlite3'), max_workers=1, stale_after=0.2)
+    release = threading.Event()
+    ran = []
+
+    def handler(payload):
+        ran.append(payload)
+        release.wait(5)
+        return payload
+
+    queue.register('publish', handler)
+    first = queue.submit('publish', 'first')
+    second = queue.submit('publish', 'second')
+    time.sleep(0.3)
+    job = queue.get(second)
+    assert job['status'] == FAILED
+    assert job['error'] == LOST_ERROR
+
+    release.set()
+    assert _wait_finished(queue, first)['status'] == SUCCEEDED
+    queue._executor.shutdown(wait=True)
+    assert ran == ['first']
+    assert queue.get(second)['status'] == FAILED
+    assert queue.stats()['pending'] == 0
+
+
+def test_heartbeat_keeps_long_running_job_alive(tmp_path):
+    queue = JobQueue(os.path.join(tmp_path, 'jobs.sqlite3'), stale_after=0.3)
+    queue.register('slow', lambda payload: time.sleep(1) or 'done')
+    job_id = queue.submit('slow', None)
+    time.sleep(0.7)
+    assert queue.get(job_id)['status'] == 'running'
+    assert _wait_finished(queue, job_id)['result'] == 'done'
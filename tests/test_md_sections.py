@@ -0,0 +1,32 @@
+import pytest
+
+from md_sections import DEFAULT_TITLE, extract_title, split_sections
+
+
+def test_splits_on_separator_lines_outside_fences():
+    text = '# T\n\na\n\n---\n\n```\n---\n```\n\n---\nb\n'
+    assert split_sections(text) == ['# T\n\na', '```\n---\n```', 'b']
+
+
+def test_skips_yaml_front_matter():
+    text = '---\ntitle: Hi\ndate: 2024-01-01\n---\n# T\n\n---\n\nB'
+    assert split_sections(text) == ['# T', 'B']
+    assert extract_title(text) == 'T'
+
+
+@pytest.mark.parametrize('text, expected', [
+    # 开头的分隔线后面是列表
+    ('---\n\n- item one\n- item two\n\n---\n\n# T\n', ['- item one\n- item two', '# T']),
+    # 开头的 --- 后面紧跟空行
+    ('---\n\nKey: value\n\n---\n\n# T\n', ['Key: value', '# T']),
+    # key: value 之间夹着其他内容
+    ('---\nNote: x\n- a\n---\n# T\n', ['Note: x\n- a', '# T']),
+    ('---\n---\n# T\n', ['# T']),
+])
+def test_keeps_leading_cards_that_are_not_front_matter(text, expected):
+    assert split_sections(text) == expected
+
+
+def test_title_ignores_fenced_code():
+    assert extract_title('```\n# not a title\n```\n# Real\n') == 'Real'
+    assert extract_title('no heading') == DEFAULT_TITLE
@@ -0,0 +1,72 @@
+import os
+import shutil
+
+from render_cache import DiskRenderCache, RenderCache
+
+
+def test_lru_evicts_least_recently_used():
+    cache = RenderCache(max_entries=2)
+    cache.put('a', b'1')
+    cache.put('b', b'2')
+    assert cache.get('a') == b'1'
+    cache.put('c', b'3')
+    assert cache.get('b') is None
+    assert cache.get('a') == b'1' and cache.get('c') == b'3'
+    assert cache.stats()['entries'] == 2
+
+
+def test_lru_evicts_by_bytes():
+    cache = RenderCache(max_entries=10, max_bytes=10)
+    cache.put('a', b'x' * 4)
+    cache.put('b', b'x' * 4)
+    cache.put('c', b'x' * 4)
+    assert cache.get('a') is None
+    assert cache.stats()['bytes'] == 8
+    # 超过上限的条目不缓存，也不淘汰已有条目
+    cache.put('big', b'x' * 11)
+    assert cache.get('big') is None and cache.get('b') == b'x' * 4
+
+
+def test_disk_prune_removes_oldest(tmp_path):
+    backend = DiskRenderCache(str(tmp_path), max_entries=2)
+    for i, key in enumerate(['a', 'b', 'c']):
+        backend.put(key, key.encode())
+        os.utime(tmp_path / f'{key}.html', (i, i))
+    backend.prune()
+    assert sorted(os.listdir(tmp_path)) == ['b.html', 'c.html']
+
+
+def test_disk_cache_survives_missing_directory(tmp_path):
+    directory = tmp_path / 'cache'
+    cache = RenderCache(backend=DiskRenderCache(str(directory)))
+    cache.put('a', b'1')
+    shutil.rmtree(directory)
+
+    cache.clear()
+    assert cache.get('a') is None
+    cache.put('b', b'2')
+    assert (directory / 'b.html').read_bytes() == b'2'
+
+
+def test_refresh_with_missing_cache_directory(api_server, client, tmp_path, monkeypatch):
+    directory = tmp_path / 'cache'
+    monkeypatch.setattr(api_server.render_cache, 'backend', DiskRenderCache(str(directory)))
+    shutil.rmtree(directory)
+    assert client.post('/styles/refresh').status_code == 200
+
+
+def test_render_etag_not_modified(client):
+    payload = {'md': '# ETag\n\ntext', 'style': 'alibaba.css'}
+    response = client.post('/render', json=payload)
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+
+    not_modified = client.post('/render', json=payload, headers={'If-None-Match': etag})
+    assert not_modified.status_code == 304
+    assert not_modified.data == b'' and not_modified.headers['ETag'] == etag
+    assert client.post('/render', json=payload, headers={'If-None-Match': f'W/{etag}'}).status_code == 304
+
+    # 主题或卡片模式不同时ETag不同
+    for changed in (dict(payload, style='apple-notes.css'), dict(payload, dashseparator=True)):
+        response = client.post('/render', json=changed, headers={'If-None-Match': etag})
+        assert response.status_code == 200 and response.headers['ETag'] != etag
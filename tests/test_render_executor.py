@@ -0,0 +1,79 @@
+import os
+import signal
+
+import pytest
+
+import render_executor
+import render_pipeline
+from conftest import ROOT
+from render_executor import RenderExecutor, RenderQueueFull, RenderWorkerCrashed
+
+THEMES_DIR = os.path.join(ROOT, 'themes')
+MARKDOWN = '# Title\n\nSome **bold** text.\n'
+
+
+def _crash(*args):
+    # 在工作进程中执行：模拟被OOM killer杀掉
+    os._exit(1)
+
+
+@pytest.fixture
+def executor():
+    executor = RenderExecutor(1, timeout=60, themes_dir=THEMES_DIR)
+    yield executor
+    executor.shutdown(wait=False)
+
+
+@pytest.fixture
+def no_local_render(monkeypatch):
+    """服务进程中的渲染会导致测试失败（工作进程由spawn启动，不受影响）"""
+    def render(*args, **kwargs):
+        raise AssertionError('rendered in the server process')
+    monkeypatch.setattr(render_pipeline.RenderPipeline, 'render', render)
+
+
+def _kill_workers(executor):
+    # 等待预热完成，确保工作进程已经启动
+    executor.render(MARKDOWN, 'alibaba.css')
+    for process in list(executor._pool._processes.values()):
+        os.kill(process.pid, signal.SIGKILL)
+        process.join()
+
+
+def test_retries_in_new_pool_after_worker_died(executor):
+    html, title, _ = executor.render(MARKDOWN, 'alibaba.css')
+    _kill_workers(executor)
+
+    assert executor.render(MARKDOWN, 'alibaba.css')[:2] == (html, title)
+    stats = executor.stats()
+    assert stats['restarts'] == 1
+    assert stats['crashes'] == 0
+    assert stats['in_flight'] == 0
+
+
+def test_submit_to_broken_pool_rebuilds_it(executor):
+    html, title, _ = executor.render(MARKDOWN, 'alibaba.css')
+    _kill_workers(executor)
+    # 等进程池发现工作进程退出
+    with pytest.raises(Exception):
+        executor._pool.submit(os.getpid).result(timeout=30)
+
+    assert executor.submit(MARKDOWN, 'alibaba.css').result(timeout=60)[:2] == (html, title)
+    assert executor.stats()['restarts'] == 1
+
+
+def test_fails_with_busy_error_when_new_pool_also_breaks(executor, monkeypatch, no_local_render):
+    monkeypatch.setattr(render_executor, 'render_article', _crash)
+    with pytest.raises(RenderWorkerCrashed) as excinfo:
+        executor.render(MARKDOWN, 'alibaba.css')
+    # 和队列已满一样返回503和Retry-After
+    assert isinstance(excinfo.value, RenderQueueFull)
+    assert excinfo.value.retry_after == executor.retry_after
+    stats = executor.stats()
+    assert stats['restarts'] == 2
+    assert stats['crashes'] == 1
+    assert stats['in_flight'] == 0
+
+    # 重建后的进程池可以继续使用
+    monkeypatch.undo()
+    assert executor.render(MARKDOWN, 'alibaba.css')[1] == 'Title'
@@ -0,0 +1,48 @@
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from render_pipeline import RenderPipeline, create_section_executor
+
+SECTIONS = ['# One\n\n*a*', '## Two\n\n- b', '`three`']
+
+
+class FailingExecutor:
+    """map时抛出指定异常的工作池"""
+
+    def __init__(self, error):
+        self.error = error
+
+    def map(self, fn, *iterables):
+        raise self.error
+
+
+def _serial(sections):
+    return RenderPipeline(None).parse_sections(sections)
+
+
+def test_section_executor_is_opt_in(monkeypatch):
+    monkeypatch.delenv('RENDER_SECTION_WORKERS', raising=False)
+    assert create_section_executor() is None
+
+
+def test_thread_executor_matches_serial():
+    executor = create_section_executor(2, kind='thread')
+    try:
+        assert RenderPipeline(None, section_executor=executor).parse_sections(SECTIONS) == _serial(SECTIONS)
+    finally:
+        executor.shutdown()
+
+
+def test_broken_pool_falls_back_to_serial():
+    pipeline = RenderPipeline(None, section_executor=FailingExecutor(BrokenProcessPool('worker died')))
+    assert pipeline.parse_sections(SECTIONS) == _serial(SECTIONS)
+    assert pipeline.section_executor is None
+
+
+def test_other_errors_propagate_and_keep_executor():
+    executor = FailingExecutor(ValueError('bad section'))
+    pipeline = RenderPipeline(None, section_executor=executor)
+    with pytest.raises(ValueError):
+        pipeline.parse_sections(SECTIONS)
+    assert pipeline.section_executor is executor
@@ -0,0 +1,100 @@
+import asyncio
+import json
+import socket
+import time
+
+import pytest
+import requests
+
+from wechat_client import AsyncWeChatClient, WeChatClient, WeChatHTTPError
+
+
+def _json(body, status=200):
+    return lambda handler: (status, {'Content-Type': 'application/json'}, json.dumps(body).encode())
+
+
+def _sequence(*responses):
+    """依次返回给定的响应，最后一个响应重复使用"""
+    remaining = list(responses)
+
+    def route(handler):
+        response = remaining.pop(0) if len(remaining) > 1 else remaining[0]
+        return response(handler)
+    return route
+
+
+BAD_GATEWAY = lambda handler: (502, {'Content-Type': 'text/html'}, b'<html>502 Bad Gateway</html>')
+
+
+def _client(server, **kwargs):
+    kwargs.setdefault('backoff', 0)
+    return WeChatClient(api_base=server.url, **kwargs)
+
+
+def test_get_retries_server_errors(stand_in_server):
+    stand_in_server.routes[('GET', '/cgi-bin/token')] = _sequence(BAD_GATEWAY, _json({'access_token': 't'}))
+    assert _client(stand_in_server).get('/cgi-bin/token') == {'access_token': 't'}
+    assert len(stand_in_server.requests) == 2
+
+
+def test_non_json_response_raises_with_http_status(stand_in_server):
+    stand_in_server.routes[('POST', '/cgi-bin/draft/add')] = BAD_GATEWAY
+    with pytest.raises(WeChatHTTPError) as excinfo:
+        _client(stand_in_server).add_draft('token', {'articles': []})
+    assert excinfo.value.status_code == 502
+    assert excinfo.value.result['http_status'] == 502
+    # 提交草稿在5xx时不重试
+    assert len(stand_in_server.requests) == 1
+
+
+def test_post_does_not_retry_system_busy(stand_in_server):
+    stand_in_server.routes[('POST', '/cgi-bin/draft/add')] = _json({'errcode': -1, 'errmsg': 'system error'})
+    result = _client(stand_in_server).add_draft('token', {'articles': []})
+    assert result['errcode'] == -1
+    assert len(stand_in_server.requests) == 1
+
+
+def test_post_retries_rate_limit(stand_in_server):
+    stand_in_server.routes[('POST', '/cgi-bin/draft/add')] = _sequence(
+        _json({'errcode': 45009, 'errmsg': 'reach max api daily quota limit'}), _json({'media_id': 'm'}))
+    assert _client(stand_in_server).add_draft('token', {'articles': []}) == {'media_id': 'm'}
+    assert len(stand_in_server.requests) == 2
+
+
+def test_post_does_not_retry_read_timeout(stand_in_server):
+    def slow(handler):
+        time.sleep(0.5)
+        return _json({'media_id': 'm'})(handler)
+    stand_in_server.routes[('POST', '/cgi-bin/draft/add')] = slow
+    with pytest.raises(requests.ReadTimeout):
+        _client(stand_in_server, read_timeout=0.1).add_draft('token', {'articles': []})
+    assert len(stand_in_server.requests) == 1
+
+
+def test_post_retries_refused_connection():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    client = WeChatClient(api_base=f'http://127.0.0.1:{port}', max_retries=2, backoff=0)
+    outcomes = []
+    client.add_request_hook(lambda path, outcome, seconds: outcomes.append(outcome))
+    with pytest.raises(requests.ConnectionError):
+        client.add_draft('token', {'articles': []})
+    assert outcomes == ['network_error'] * 3
+
+
+def test_async_client_retry_policy(stand_in_server):
+    stand_in_server.routes[('GET', '/cgi-bin/token')] = _sequence(BAD_GATEWAY, _json({'access_token': 't'}))
+    stand_in_server.routes[('POST', '/cgi-bin/draft/add')] = BAD_GATEWAY
+
+    async def run():
+        client = AsyncWeChatClient(api_base=stand_in_server.url, backoff=0)
+        try:
+            assert await client.get('/cgi-bin/token') == {'access_token': 't'}
+            with pytest.raises(WeChatHTTPError):
+                await client.add_draft('token', {'articles': []})
+        finally:
+            await client.close()
+
+    asyncio.run(run())
+    assert [request[0] for request in stand_in_server.requests] == ['GET', 'GET', 'POST']
@@ -0,0 +1,171 @@
+import base64
+import hashlib
+import json
+import os
+import socket
+
+import pytest
+import requests
+
+from wechat_client import WeChatClient
+from wechat_images import ImageUploadCache, ImageUploader, _PinnedAddressAdapter
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 64
+
+
+def _image(data, etag=True):
+    tag = '"%s"' % hashlib.md5(data).hexdigest()
+
+    def route(handler):
+        if etag and handler.headers.get('If-None-Match') == tag:
+            return 304, {'ETag': tag}, b''
+        return 200, {'Content-Type': 'image/png', **({'ETag': tag} if etag else {})}, data
+    return route
+
+
+@pytest.fixture
+def server(stand_in_server):
+    """模拟的图片服务器和微信 media/uploadimg 接口"""
+    def upload(handler):
+        count = sum(1 for request in stand_in_server.requests if request[1].startswith('/cgi-bin/media/uploadimg'))
+        body = {'url': f'http://mmbiz.qpic.cn/img/{count}.png'}
+        return 200, {'Content-Type': 'application/json'}, json.dumps(body).encode()
+
+    stand_in_server.routes[('POST', '/cgi-bin/media/uploadimg')] = upload
+    stand_in_server.routes[('GET', '/img/a.png')] = _image(PNG)
+    return stand_in_server
+
+
+def _uploader(server, tmp_path, **kwargs):
+    kwargs.setdefault('fetch_remote', True)
+    kwargs.setdefault('allow_private_addresses', True)
+    client = WeChatClient(api_base=server.url, max_retries=0)
+    return ImageUploader(ImageUploadCache(os.path.join(tmp_path, 'images.sqlite3')), client, workers=2, **kwargs)
+
+
+def _paths(server):
+    return [(method, path.split('?', 1)[0]) for method, path, _, _ in server.requests]
+
+
+def test_downloads_and_uploads_images(server, tmp_path):
+    uploader = _uploader(server, tmp_path)
+    contents, report = uploader.upload_images([f'<p><img src="{server.url}/img/a.png"></p>'], 'token', 'wx1')
+    assert contents == ['<p><img src="http://mmbiz.qpic.cn/img/1.png"></p>']
+    assert report == {'uploaded': 1, 'cached': 0, 'failed': []}
+
+
+def test_revalidates_unchanged_images(server, tmp_path):
+    src = f'{server.url}/img/a.png'
+    _uploader(server, tmp_path).upload_images([f'<img src="{src}">'], 'token', 'wx1')
+    server.requests.clear()
+
+    contents, report = _uploader(server, tmp_path).upload_images([f'<img src="{src}">'], 'token', 'wx1')
+    assert contents == ['<img src="http://mmbiz.qpic.cn/img/1.png">']
+    assert report == {'uploaded': 0, 'cached': 1, 'failed': []}
+    assert _paths(server) == [('GET', '/img/a.png')]
+    assert server.requests[0][2]['If-None-Match']
+
+
+def test_same_content_is_uploaded_once(server, tmp_path):
+    server.routes[('GET', '/img/copy.png')] = _image(PNG, etag=False)
+    data_uri = 'data:image/png;base64,' + base64.b64encode(PNG).decode()
+    contents = [f'<img src="{server.url}/img/a.png">', f'<img src="{server.url}/img/copy.png"><img src="{data_uri}">']
+    uploader = _uploader(server, tmp_path)
+    contents, report = uploader.upload_images(contents, 'token', 'wx1')
+    assert report == {'uploaded': 1, 'cached': 0, 'failed': []}
+    assert contents[1] == '<img src="http://mmbiz.qpic.cn/img/1.png"><img src="http://mmbiz.qpic.cn/img/1.png">'
+
+    # 同一appid再次发布时命中内容哈希缓存，不再上传
+    contents, report = uploader.upload_images([f'<img src="{data_uri}">'], 'token', 'wx1')
+    assert report == {'uploaded': 0, 'cached': 1, 'failed': []}
+    assert _paths(server).count(('POST', '/cgi-bin/media/uploadimg')) == 1
+
+
+@pytest.mark.parametrize('route', [
+    lambda handler: (404, {}, b'not found'),
+    # 声明的长度大于实际发送的内容，读取时连接中断
+    lambda handler: (200, {'Content-Type': 'image/png', 'Content-Length': '4096'}, PNG),
+    lambda handler: (200, {'Content-Type': 'image/gif'}, b'GIF89a' + b'\x00' * 16),
+])
+def test_failed_image_keeps_src(server, tmp_path, route):
+    server.routes[('GET', '/img/bad.png')] = route
+    content = f'<img src="{server.url}/img/bad.png"><img src="{server.url}/img/a.png">'
+    contents, report = _uploader(server, tmp_path).upload_images([content], 'token', 'wx1')
+    assert contents == [f'<img src="{server.url}/img/bad.png"><img src="http://mmbiz.qpic.cn/img/1.png">']
+    assert report['uploaded'] == 1
+    assert [failure['src'] for failure in report['failed']] == [f'{server.url}/img/bad.png']
+
+
+def test_remote_images_are_opt_in(server, tmp_path):
+    content = f'<img src="{server.url}/img/a.png">'
+    contents, report = _uploader(server, tmp_path, fetch_remote=False).upload_images([content], 'token', 'wx1')
+    assert contents == [content]
+    assert len(report['failed']) == 1
+    assert server.requests == []
+
+
+@pytest.mark.parametrize('src', [
+    'http://127.0.0.1/img/a.png',
+    'http://localhost/img/a.png',
+    'http://10.0.0.8/img/a.png',
+    'http://169.254.169.254/latest/meta-data',
+    'http://[::1]/img/a.png',
+    'http://0.0.0.0/img/a.png',
+])
+def test_rejects_private_addresses(server, tmp_path, src):
+    uploader = _uploader(server, tmp_path, allow_private_addresses=False)
+    contents, report = uploader.upload_images([f'<img src="{src}">'], 'token', 'wx1')
+    assert report['failed'] == [{'src': src, 'errmsg': '图片链接指向内网或保留地址'}]
+    assert contents == [f'<img src="{src}">']
+
+
+def test_checks_every_redirect_hop(server, tmp_path):
+    server.routes[('GET', '/redirect')] = lambda handler: (302, {'Location': '/img/a.png'}, b'')
+    server.routes[('GET', '/redirect-file')] = lambda handler: (302, {'Location': 'file:///etc/passwd'}, b'')
+    server.routes[('GET', '/loop')] = lambda handler: (302, {'Location': '/loop'}, b'')
+    content = ''.join(f'<img src="{server.url}{path}">' for path in ('/redirect', '/redirect-file', '/loop'))
+    contents, report = _uploader(server, tmp_path).upload_images([content], 'token', 'wx1')
+    assert report['uploaded'] == 1
+    assert {failure['src'].rsplit('/', 1)[1]: failure['errmsg'] for failure in report['failed']} == {
+        'redirect-file': '只支持http(s)图片链接',
+        'loop': '下载图片失败: 重定向次数过多',
+    }
+    assert _paths(server).count(('GET', '/loop')) == 4
+
+
+def test_connects_to_checked_address(server, tmp_path, monkeypatch):
+    """第一次解析返回公网地址，之后返回127.0.0.1（DNS rebinding）时不能连接到本机"""
+    port = int(server.url.rsplit(':', 1)[1])
+    real_getaddrinfo = socket.getaddrinfo
+    lookups = []
+
+    def getaddrinfo(host, *args, **kwargs):
+        if host != 'rebind.test':
+            return real_getaddrinfo(host, *args, **kwargs)
+        lookups.append(host)
+        address = '93.184.216.34' if len(lookups) == 1 else '127.0.0.1'
+        return [(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP, '', (address, port))]
+
+    monkeypatch.setattr(socket, 'getaddrinfo', getaddrinfo)
+    uploader = _uploader(server, tmp_path, allow_private_addresses=False, timeout=(0.2, 0.2))
+    src = f'http://rebind.test:{port}/img/a.png'
+    contents, report = uploader.upload_images([f'<img src="{src}">'], 'token', 'wx1')
+    assert lookups == ['rebind.test']
+    assert server.requests == []
+    assert contents == [f'<img src="{src}">']
+    assert report['failed'][0]['errmsg'].startswith('下载图片失败')
+
+
+def test_ignores_proxy_environment(server, tmp_path, monkeypatch):
+    # 代理不可用：图片仍然直接下载（上传到微信的请求使用代理，这里会失败）
+    monkeypatch.setenv('HTTP_PROXY', 'http://127.0.0.1:9')
+    _uploader(server, tmp_path).upload_images([f'<img src="{server.url}/img/a.png">'], 'token', 'wx1')
+    assert _paths(server) == [('GET', '/img/a.png')]
+
+
+def test_https_keeps_hostname_for_sni_and_certificate():
+    request = requests.Request('GET', 'https://93.184.216.34:443/a.png', headers={'Host': 'example.com'}).prepare()
+    host_params, pool_kwargs = _PinnedAddressAdapter().build_connection_pool_key_attributes(request, True)
+    assert host_params['host'] == '93.184.216.34'
+    assert pool_kwargs['server_hostname'] == 'example.com'
+    assert pool_kwargs['assert_hostname'] == 'example.com'
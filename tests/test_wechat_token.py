@@ -0,0 +1,65 @@
+import itertools
+import json
+import threading
+
+from wechat_client import WeChatClient
+from wechat_token import AccessTokenManager, FileTokenStore
+
+
+def _token_endpoint(server):
+    counter = itertools.count(1)
+
+    def token(handler):
+        body = {'access_token': f'token-{next(counter)}', 'expires_in': 7200}
+        return 200, {'Content-Type': 'application/json'}, json.dumps(body).encode()
+
+    server.routes[('GET', '/cgi-bin/token')] = token
+
+
+def _manager(server, tmp_path):
+    client = WeChatClient(api_base=server.url, max_retries=0)
+    return AccessTokenManager(store=FileTokenStore(str(tmp_path)), client=client)
+
+
+def test_caches_token_across_managers(stand_in_server, tmp_path):
+    _token_endpoint(stand_in_server)
+    first = _manager(stand_in_server, tmp_path).get_token('wx1', 'secret')
+    # 另一个进程的manager共享同一个存储目录
+    second = _manager(stand_in_server, tmp_path).get_token('wx1', 'secret')
+    assert first['access_token'] == second['access_token'] == 'token-1'
+    assert len(stand_in_server.requests) == 1
+
+
+def test_changed_secret_fetches_new_token(stand_in_server, tmp_path):
+    _token_endpoint(stand_in_server)
+    manager = _manager(stand_in_server, tmp_path)
+    manager.get_token('wx1', 'secret')
+    assert manager.get_token('wx1', 'other')['access_token'] == 'token-2'
+
+
+def test_concurrent_forced_refreshes_fetch_once(stand_in_server, tmp_path):
+    _token_endpoint(stand_in_server)
+    rejected = _manager(stand_in_server, tmp_path).get_token('wx1', 'secret')['access_token']
+    managers = [_manager(stand_in_server, tmp_path) for _ in range(8)]
+    results = []
+
+    def refresh(manager):
+        results.append(manager.get_token('wx1', 'secret', force_refresh=True,
+                                         rejected_token=rejected)['access_token'])
+
+    threads = [threading.Thread(target=refresh, args=(m,)) for m in managers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ['token-2'] * 8
+    assert len(stand_in_server.requests) == 2
+
+
+def test_forced_refresh_without_rejected_token_always_fetches(stand_in_server, tmp_path):
+    _token_endpoint(stand_in_server)
+    manager = _manager(stand_in_server, tmp_path)
+    manager.get_token('wx1', 'secret')
+    assert manager.get_token('wx1', 'secret', force_refresh=True)['access_token'] == 'token-2'
+    assert manager.get_token('wx1', 'secret', force_refresh=True)['access_token'] == 'token-3'
@@ -0,0 +1,116 @@
+import hashlib
+import os
+import time
+
+import wxcss
+from conftest import ROOT
+
+CSS = '.rich_media_title {\n    font-size: 22px\n}'
+
+
+def _article(title, stylesheets):
+    links = ''.join(f'<link rel="stylesheet" href="{href}">' for href in stylesheets)
+    html = f'<html><head><meta charset="utf-8"><title>{title}</title>{links}</head><body>x</body></html>'
+    return lambda handler: (200, {'Content-Type': 'text/html; charset=utf-8'}, html.encode())
+
+
+def _stylesheet(css):
+    body = css.encode()
+    etag = '"%s"' % hashlib.md5(body).hexdigest()
+
+    def route(handler):
+        if handler.headers.get('If-None-Match') == etag:
+            return 304, {'ETag': etag}, b''
+        return 200, {'Content-Type': 'text/css; charset=utf-8', 'ETag': etag}, body
+    return route
+
+
+def _extract(urls, output_dir, fetcher):
+    return wxcss.extract_articles(urls, str(output_dir), fetcher, beautify_workers=1, cache_dir=None)
+
+
+def test_revalidates_cached_stylesheets(stand_in_server, tmp_path):
+    stand_in_server.routes[('GET', '/s/1')] = _article('Article', ['/css/a.css'])
+    stand_in_server.routes[('GET', '/css/a.css')] = _stylesheet(CSS)
+    cache = wxcss.HTTPCache(str(tmp_path / 'http'))
+
+    first = _extract([f'{stand_in_server.url}/s/1'], tmp_path / 'out', wxcss.Fetcher(cache, rate=0, cache_ttl=0))
+    assert first[0]['status'] == 'written'
+    written = (tmp_path / 'out' / first[0]['file']).read_text(encoding='utf-8')
+    assert written.startswith(wxcss.GENERATED_MARKER.format(url=f'{stand_in_server.url}/s/1'))
+    assert 'font-size: 22px' in written
+
+    fetcher = wxcss.Fetcher(cache, rate=0, cache_ttl=0)
+    second = _extract([f'{stand_in_server.url}/s/1'], tmp_path / 'out', fetcher)
+    assert second[0]['status'] == 'written'
+    # 文章页没有ETag，重新下载；样式表返回304
+    assert fetcher.stats['not_modified'] == 1
+    conditional = [headers for method, path, headers, _ in stand_in_server.requests[2:] if path == '/css/a.css']
+    assert conditional[0]['If-None-Match']
+    assert (tmp_path / 'out' / second[0]['file']).read_text(encoding='utf-8') == written
+
+    # 缓存未过期时不发送请求
+    fetcher = wxcss.Fetcher(cache, rate=0, cache_ttl=3600)
+    _extract([f'{stand_in_server.url}/s/1'], tmp_path / 'out', fetcher)
+    assert fetcher.stats == {'requests': 0, 'cache_hits': 2, 'not_modified': 0}
+
+
+def test_rate_limits_requests_per_host(stand_in_server, tmp_path):
+    times = []
+    for i in range(5):
+        article = _article(f'Article {i}', ['/css/a.css'])
+
+        def route(handler, article=article):
+            times.append(time.monotonic())
+            return article(handler)
+        stand_in_server.routes[('GET', f'/s/{i}')] = route
+    stand_in_server.routes[('GET', '/css/a.css')] = _stylesheet(CSS)
+
+    urls = [f'{stand_in_server.url}/s/{i}' for i in range(5)]
+    results = _extract(urls, tmp_path / 'out', wxcss.Fetcher(None, rate=10))
+    assert [result['status'] for result in results] == ['written'] + ['duplicate'] * 4
+    times.sort()
+    assert min(b - a for a, b in zip(times, times[1:])) >= 0.09
+
+
+def test_does_not_overwrite_hand_written_theme(stand_in_server, tmp_path):
+    stand_in_server.routes[('GET', '/s/1')] = _article('Article', ['/css/a.css'])
+    stand_in_server.routes[('GET', '/css/a.css')] = _stylesheet(CSS)
+    output_dir = tmp_path / 'out'
+    os.makedirs(output_dir)
+    (output_dir / 'Article.css').write_text('/* hand made */\n', encoding='utf-8')
+
+    url = f'{stand_in_server.url}/s/1'
+    for _ in range(2):
+        result = _extract([url], output_dir, wxcss.Fetcher(None, rate=0))[0]
+        assert result['status'] == 'written'
+        assert result['file'] == f'Article-{wxcss.content_hash(url)[:8]}.css'
+    assert (output_dir / 'Article.css').read_text(encoding='utf-8') == '/* hand made */\n'
+    assert set(os.listdir(output_dir)) == {'Article.css', result['file']}
+
+
+def test_themes_output_only_writes_valid_themes(stand_in_server, tmp_path):
+    with open(os.path.join(ROOT, 'themes', 'template.css'), encoding='utf-8') as f:
+        theme = f.read()
+    stand_in_server.routes[('GET', '/s/1')] = _article('Article', ['/css/a.css'])
+    stand_in_server.routes[('GET', '/css/a.css')] = _stylesheet(CSS)
+    stand_in_server.routes[('GET', '/s/2')] = _article('Theme', ['/css/theme.css'])
+    stand_in_server.routes[('GET', '/css/theme.css')] = _stylesheet(theme)
+
+    urls = [f'{stand_in_server.url}/s/1', f'{stand_in_server.url}/s/2']
+    results = wxcss.extract_articles(urls, str(tmp_path / 'themes'), wxcss.Fetcher(None, rate=0),
+                                     beautify_workers=1, cache_dir=None, validate=True)
+    assert [result['status'] for result in results] == ['invalid', 'written']
+    assert os.listdir(tmp_path / 'themes') == ['Theme.css']
+
+
+def test_cli_defaults_to_extracted_css(stand_in_server, tmp_path, monkeypatch):
+    stand_in_server.routes[('GET', '/s/1')] = _article('Article', ['/css/a.css'])
+    stand_in_server.routes[('GET', '/css/a.css')] = _stylesheet(CSS)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr('sys.argv', ['wxcss.py', '--no-cache', '--rate', '0', '--beautify-workers', '1',
+                                     f'{stand_in_server.url}/s/1'])
+
+    assert wxcss.main() == 0
+    assert os.listdir(tmp_path / 'extracted_css') == ['Article.css']
+    assert not os.path.exists(tmp_path / 'themes')
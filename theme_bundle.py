@@ -0,0 +1,250 @@
+"""
+主题包
+把 themes/*.css 和 all_themes_data.json 中的主题预先编译（CSS变量已替换）为一个带索引的二进制文件：
+
+    文件头  MAGIC（8字节） + 格式版本、索引长度（各4字节，小端）
+    索引    JSON：主题包版本和每个主题的元数据（file、id、name、enName）、来源、数据偏移/长度、内容哈希
+    数据    各主题编译后的CSS（UTF-8）依次拼接
+
+运行时只解析索引，主题CSS通过mmap按需读取，进程启动和单个主题的查找不随主题数量增长；
+多个worker映射同一个文件，共享操作系统的页缓存。
+
+构建：python theme_bundle.py [--themes-dir ./themes] [--themes-data all_themes_data.json] [--output themes.bundle]
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import sys
+import tempfile
+
+from css_inline import CSSInliner
+
+from css_variables import resolve_css_variables
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'MD2THEME'
+FORMAT_VERSION = 1
+_HEADER = struct.Struct('<II')
+
+# 主题来源：themes/ 目录中的文件，或只存在于 all_themes_data.json 中的主题
+SOURCE_THEMES = 'themes'
+SOURCE_DATA = 'data'
+
+# all_themes_data.json 是从前端JS导出的，部分条目的css在结束引号后还带着后续条目的JS源码，
+# 以 "转义的换行 + 引号 + 真实换行" 为界截断
+_DATA_CSS_END_RE = re.compile(r'(?<=\\n)["\'],?[ \t\r]*\n')
+_JS_ESCAPE_RE = re.compile(r'\\(u[0-9a-fA-F]{4}|.)', re.S)
+_JS_ESCAPES = {'n': '\n', 'r': '\r', 't': '\t'}
+
+
+def content_hash(text):
+    """CSS文本的内容哈希，用作主题版本"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+
+def _unescape_js(match):
+    escape = match.group(1)
+    if len(escape) == 5:
+        return chr(int(escape[1:], 16))
+    return _JS_ESCAPES.get(escape, escape)
+
+
+def decode_data_css(raw):
+    """还原 all_themes_data.json 中按JS字符串转义保存的CSS（\\n、\\"、\\uXXXX 及代理对）"""
+    match = _DATA_CSS_END_RE.search(raw)
+    if match:
+        raw = raw[:match.start()]
+    css = _JS_ESCAPE_RE.sub(_unescape_js, raw)
+    # \uD83C\uDF3F 这样的代理对先各自解码为单独的代理字符，再合并为一个字符
+    return css.encode('utf-16', 'surrogatepass').decode('utf-16')
+
+
+def load_theme_data(path):
+    """读取 all_themes_data.json，返回 [{'file', 'id', 'name', 'enName', 'css'}]，CSS已还原"""
+    with open(path, 'r', encoding='utf-8') as f:
+        entries = json.load(f)
+    return [
+        {
+            'file': f"{entry['id']}.css",
+            'id': entry['id'],
+            'name': entry.get('name', entry['id']),
+            'enName': entry.get('enName', ''),
+            'css': decode_data_css(entry.get('css', '')),
+        }
+        for entry in entries
+    ]
+
+
+def build_bundle(themes_dir, data_file, output, compile_css=resolve_css_variables):
+    """
+    编译全部主题并写入主题包，返回主题包版本
+    themes/ 中的文件优先；all_themes_data.json 为同名主题提供 name/enName，只存在于其中的主题使用它的CSS。
+    无法编译的主题记录警告后跳过
+    """
+    metadata = {}
+    data_css = {}
+    if data_file and os.path.exists(data_file):
+        for entry in load_theme_data(data_file):
+            metadata[entry['file']] = entry
+            data_css[entry['file']] = entry['css']
+
+    sources = {}
+    for name in sorted(os.listdir(themes_dir)):
+        if not name.endswith('.css'):
+            continue
+        path = os.path.join(themes_dir, name)
+        stat = os.stat(path)
+        with open(path, 'r', encoding='utf-8') as f:
+            sources[name] = (SOURCE_THEMES, f.read(), stat)
+    for name, css in data_css.items():
+        sources.setdefault(name, (SOURCE_DATA, css, None))
+
+    index = []
+    chunks = []
+    offset = 0
+    for name in sorted(sources):
+        source, text, stat = sources[name]
+        try:
+            css = compile_css(text)
+            # 提前发现内联器无法解析的主题；内联器本身不能序列化，运行时按需从编译后的CSS创建
+            CSSInliner(extra_css=css)
+        except Exception as e:
+            logger.warning(f"Skipping theme {name}: {str(e)}")
+            continue
+        data = css.encode('utf-8')
+        meta = metadata.get(name, {})
+        index.append({
+            'file': name,
+            'id': meta.get('id', name[:-len('.css')]),
+            'name': meta.get('name', name[:-len('.css')]),
+            'enName': meta.get('enName', ''),
+            'source': source,
+            'offset': offset,
+            'length': len(data),
+            'hash': content_hash(css),
+            'source_hash': content_hash(text),
+            'mtime_ns': stat.st_mtime_ns if stat else None,
+            'size': stat.st_size if stat else None,
+        })
+        chunks.append(data)
+        offset += len(data)
+
+    version = hashlib.sha256(''.join(f"{entry['file']}\0{entry['hash']}\0" for entry in index)
+                             .encode('utf-8')).hexdigest()[:16]
+    index_data = json.dumps({'version': version, 'themes': index}, ensure_ascii=False).encode('utf-8')
+
+    # 先写临时文件再替换，正在映射旧文件的进程不受影响
+    directory = os.path.dirname(os.path.abspath(output))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(MAGIC)
+            f.write(_HEADER.pack(FORMAT_VERSION, len(index_data)))
+            f.write(index_data)
+            for data in chunks:
+                f.write(data)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, output)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    logger.info(f"Wrote {len(index)} themes to {output} (version {version})")
+    return version
+
+
+class BundledTheme:
+    """主题包索引中的单个主题"""
+
+    __slots__ = ('file', 'id', 'name', 'en_name', 'source', 'offset', 'length', 'hash', 'source_hash', 'stamp')
+
+    def __init__(self, entry):
+        self.file = entry['file']
+        self.id = entry['id']
+        self.name = entry['name']
+        self.en_name = entry['enName']
+        self.source = entry['source']
+        self.offset = entry['offset']
+        self.length = entry['length']
+        self.hash = entry['hash']
+        self.source_hash = entry['source_hash']
+        # 构建时主题文件的 (mtime_ns, size)，文件未变化时直接使用包中编译好的CSS
+        self.stamp = (entry['mtime_ns'], entry['size']) if entry['mtime_ns'] is not None else None
+
+
+class ThemeBundle:
+    """
+    只读的主题包，CSS通过mmap按需读取
+    文件格式不正确时抛出 ValueError
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        header_size = len(MAGIC) + _HEADER.size
+        if self._mmap[:len(MAGIC)] != MAGIC or len(self._mmap) < header_size:
+            self._mmap.close()
+            raise ValueError(f'{path} is not a theme bundle')
+        format_version, index_length = _HEADER.unpack(self._mmap[len(MAGIC):header_size])
+        if format_version != FORMAT_VERSION:
+            self._mmap.close()
+            raise ValueError(f'unsupported theme bundle format {format_version}')
+        index = json.loads(self._mmap[header_size:header_size + index_length].decode('utf-8'))
+        self._data_start = header_size + index_length
+        self.version = index['version']
+        self._themes = {entry['file']: BundledTheme(entry) for entry in index['themes']}
+
+    def find(self, name):
+        """按文件名查找主题，不存在时返回None"""
+        return self._themes.get(name)
+
+    def read_css(self, theme):
+        start = self._data_start + theme.offset
+        return self._mmap[start:start + theme.length].decode('utf-8')
+
+    def themes(self):
+        return list(self._themes.values())
+
+    def close(self):
+        self._mmap.close()
+
+
+def load_theme_bundle_from_env(default_path='themes.bundle'):
+    """
+    读取 THEME_BUNDLE 指定的主题包（默认 default_path，设置为空字符串时不使用）
+    主题包不存在或无法读取时返回None，主题直接从 themes/ 读取和编译
+    """
+    path = os.getenv('THEME_BUNDLE', default_path)
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        return ThemeBundle(path)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Failed to load theme bundle {path}: {str(e)}")
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='把 themes/ 和 all_themes_data.json 中的主题编译为主题包')
+    parser.add_argument('--themes-dir', default='./themes')
+    parser.add_argument('--themes-data', default='all_themes_data.json')
+    parser.add_argument('--output', default='themes.bundle')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    build_bundle(args.themes_dir, args.themes_data, args.output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""
+主题缓存
+在进程内缓存已解析（CSS变量已替换）的主题及其预编译的CSS内联器，
+避免每次渲染都重新读取、解析主题文件；配置了主题包（theme_bundle.py）时，
+未修改的主题直接使用包中编译好的CSS
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+from css_inline import CSSInliner
+
+from theme_bundle import SOURCE_DATA, content_hash
+
+
+class CachedTheme:
+    """缓存中的单个主题条目"""
+
+    __slots__ = ('name', 'css', 'stamp', 'version', 'inliner')
+
+    def __init__(self, name, css, stamp, version=None):
+        self.name = name
+        self.css = css
+        # 主题文件的 (mtime_ns, size)；主题只存在于主题包中时为None
+        self.stamp = stamp
+        # 主题版本号为编译后CSS的内容哈希，与文件时间无关，各worker和各台机器一致
+        self.version = version or content_hash(css)
+        # 主题CSS作为extra_css交给内联器，渲染时文档中不再需要<style>块
+        self.inliner = CSSInliner(extra_css=css) if css else None
+
+    def inline(self, html):
+        """对完整HTML文档应用主题样式"""
+        return self.inliner.inline(html)
+
+
+class ThemeCache:
+    """
+    以文件名为键、按文件mtime/size校验的LRU主题缓存
+
+    :param themes_dir: 主题目录
+    :param compile_css: 将原始CSS文本编译为可直接使用的CSS的函数（例如解析CSS变量）
+    :param maxsize: 最多缓存的主题数量
+    :param bundle: 可选的主题包（ThemeBundle），其中的CSS必须由同一个compile_css编译
+    """
+
+    def __init__(self, themes_dir, compile_css, maxsize=64, bundle=None):
+        self.themes_dir = themes_dir
+        self.compile_css = compile_css
+        self.maxsize = maxsize
+        self.bundle = bundle
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, name):
+        """
+        获取主题，缓存未命中或文件已变化时重新读取并编译
+        主题目录和主题包中都不存在时抛出 FileNotFoundError
+        """
+        path = os.path.join(self.themes_dir, name)
+        try:
+            stat = os.stat(path)
+            stamp = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            stamp = None
+        bundled = self.bundle.find(name) if self.bundle is not None else None
+        # 目录中的文件优先；来自主题目录的包内主题在文件删除后不再可用
+        if stamp is None and (bundled is None or bundled.source != SOURCE_DATA):
+            raise FileNotFoundError(path)
+
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry.stamp == stamp:
+                self._entries.move_to_end(name)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        # 在锁外读取和编译，避免慢速主题阻塞其他请求
+        if stamp is None or (bundled is not None and bundled.stamp == stamp):
+            entry = CachedTheme(name, self.bundle.read_css(bundled), stamp, bundled.hash)
+        else:
+            with open(path, 'r', encoding='utf-8') as f:
+                source = f.read()
+            if bundled is not None and bundled.source_hash == content_hash(source):
+                # 文件时间变了（例如复制到镜像中）但内容与构建主题包时相同
+                entry = CachedTheme(name, self.bundle.read_css(bundled), stamp, bundled.hash)
+            else:
+                entry = CachedTheme(name, self.compile_css(source), stamp)
+
+        with self._lock:
+            self._entries[name] = entry
+            self._entries.move_to_end(name)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return entry
+
+    def names(self):
+        """全部可用主题的文件名：主题目录中的CSS文件，加上只存在于主题包中的主题"""
+        try:
+            names = [f for f in os.listdir(self.themes_dir) if f.endswith('.css')]
+        except FileNotFoundError:
+            names = []
+        if self.bundle is not None:
+            present = set(names)
+            names.extend(theme.file for theme in self.bundle.themes()
+                         if theme.source == SOURCE_DATA and theme.file not in present)
+        return names
+
+    def catalog(self):
+        """全部可用主题的元数据 [{'file', 'id', 'name', 'enName'}]，主题包之外的主题以文件名作为名称"""
+        catalog = []
+        for name in self.names():
+            bundled = self.bundle.find(name) if self.bundle is not None else None
+            stem = name[:-len('.css')]
+            catalog.append({
+                'file': name,
+                'id': bundled.id if bundled else stem,
+                'name': bundled.name if bundled else stem,
+                'enName': bundled.en_name if bundled else '',
+            })
+        return catalog
+
+    def invalidate(self, name=None):
+        """移除指定主题的缓存；name为None时清空全部缓存"""
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'bundle': self.bundle.version if self.bundle is not None else None,
+            }
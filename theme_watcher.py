@@ -0,0 +1,164 @@
+"""
+主题热更新
+用watchdog监听主题目录，文件变化（编辑器保存时通常连续触发多次）合并在debounce秒内处理：
+只让变化的主题失效并立即重新编译（主题版本为内容哈希，随之变化），再把变化推送给订阅者，
+/styles/events 以Server-Sent Events转发给打开的编辑器，编辑器据此重新加载主题并刷新预览。
+
+gunicorn的每个worker各自监听并各自维护主题缓存，订阅者连接到哪个worker都能收到同一台机器上的变化。
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+
+logger = logging.getLogger(__name__)
+
+
+class ThemeEvents:
+    """
+    主题变化的发布/订阅
+
+    事件ID取发布时的微秒时间戳，同一台机器上的各个worker可以比较；
+    客户端重连时提交最后收到的事件ID（Last-Event-ID），补发最近 history 条中之后的事件
+    """
+
+    def __init__(self, history=100, max_queue=100):
+        self.max_queue = max_queue
+        self._history = deque(maxlen=history)
+        self._subscribers = set()
+        self._last_id = 0
+        self._lock = threading.Lock()
+
+    def publish(self, event_type, data):
+        with self._lock:
+            self._last_id = max(self._last_id + 1, time.time_ns() // 1000)
+            event = {'id': self._last_id, 'type': event_type, 'data': data}
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.put_nowait(event)
+            except queue.Full:
+                # 长时间不读取的订阅者不再接收事件，重连后通过Last-Event-ID补发
+                logger.warning("Theme event subscriber is not keeping up, dropping event")
+        return event
+
+    def subscribe(self, last_event_id=None):
+        """返回接收事件的队列，last_event_id之后的历史事件先放入队列"""
+        subscription = queue.Queue(self.max_queue)
+        with self._lock:
+            if last_event_id is not None:
+                for event in self._history:
+                    if event['id'] > last_event_id and not subscription.full():
+                        subscription.put_nowait(event)
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+
+class _ThemeEventHandler(FileSystemEventHandler):
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        if event.is_directory or event.event_type in ('opened', 'closed_no_write'):
+            return
+        for path in (event.src_path, getattr(event, 'dest_path', '')):
+            if path:
+                name = os.path.basename(os.fsdecode(path))
+                if name.endswith('.css'):
+                    self.watcher.schedule(name)
+
+
+class ThemeWatcher:
+    """
+    监听主题目录并在主题文件变化后重新编译
+
+    :param theme_cache: 主题缓存（ThemeCache）
+    :param events: 发布变化的 ThemeEvents
+    :param debounce: 同一主题的多次变化合并处理的等待时间（秒）
+    """
+
+    def __init__(self, theme_cache, events, debounce=0.2):
+        self.theme_cache = theme_cache
+        self.events = events
+        self.debounce = debounce
+        self._pending = {}
+        self._condition = threading.Condition()
+        self._observer = None
+        self.reloads = 0
+
+    def start(self):
+        self._observer = Observer()
+        self._observer.schedule(_ThemeEventHandler(self), self.theme_cache.themes_dir, recursive=False)
+        self._observer.daemon = True
+        self._observer.start()
+        threading.Thread(target=self._run, name='theme-watcher', daemon=True).start()
+        logger.info(f"Watching {self.theme_cache.themes_dir} for theme changes")
+        return self
+
+    def stop(self):
+        if self._observer is not None:
+            self._observer.stop()
+
+    def schedule(self, name):
+        """记录主题变化，debounce秒内没有新的变化后处理"""
+        with self._condition:
+            self._pending[name] = time.monotonic() + self.debounce
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    now = time.monotonic()
+                    due = [name for name, deadline in self._pending.items() if deadline <= now]
+                    if due:
+                        for name in due:
+                            del self._pending[name]
+                        break
+                    timeout = min(self._pending.values()) - now if self._pending else None
+                    self._condition.wait(timeout)
+            for name in sorted(due):
+                try:
+                    self.reload(name)
+                except Exception as e:
+                    logger.error(f"Failed to reload theme {name}: {str(e)}")
+
+    def reload(self, name):
+        """重新编译单个主题并发布变化，返回新版本；主题已删除时返回None"""
+        self.theme_cache.invalidate(name)
+        try:
+            version = self.theme_cache.get(name).version
+        except FileNotFoundError:
+            version = None
+        self.reloads += 1
+        logger.info(f"Theme {name} changed, version {version}")
+        self.events.publish('theme', {'theme': name, 'version': version, 'deleted': version is None})
+        return version
+
+
+def create_theme_watcher_from_env(theme_cache, events):
+    """THEME_WATCH 不为0时启动主题目录的监听，返回 ThemeWatcher；不监听或无法监听时返回None"""
+    if os.getenv('THEME_WATCH', '1') == '0' or not os.path.isdir(theme_cache.themes_dir):
+        return None
+    watcher = ThemeWatcher(theme_cache, events, debounce=float(os.getenv('THEME_WATCH_DEBOUNCE', '0.2')))
+    try:
+        return watcher.start()
+    except OSError as e:
+        # 例如inotify监听数量已达上限，主题缓存仍会在每次使用时按文件mtime/size校验
+        logger.warning(f"Failed to watch {theme_cache.themes_dir}: {str(e)}")
+        return None
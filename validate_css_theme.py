@@ -2,16 +2,38 @@
 """
 CSS主题验证脚本
 用于检查CSS文件是否符合标准规范
+
+每个样式表只扫描一次，切分为规则（选择器列表 + 声明块），再按规则检查：
+- 语法错误（未闭合的块/注释/字符串、多余的 }、缺少选择器等），保存主题时据此拒绝
+- 必需的类和HTML元素：某条规则的选择器作用对象（最后一个复合选择器）带有该类/元素
+- 禁用的类：任何选择器中出现该类（按类名匹配，不是子串）
+- .markdown-body 和 .section-card 自身的声明块中 max-width 为 677px（支持 var() 引用）
+
+结果按内容哈希缓存在本地文件中，未变化的主题不再重复验证；需要验证的主题较多时分发到进程池。
+
+用法：
+    python validate_css_theme.py                    # themes/*.css 和 all_themes_data.json 中的主题
+    python validate_css_theme.py themes/warm.css    # 指定文件
+    python validate_css_theme.py --json             # 输出JSON
 """
 
+import argparse
+import bisect
+import hashlib
+import json
 import os
 import re
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+from css_variables import ROOT_SCOPE, extract_css_variables
+
 # 标准类结构
 REQUIRED_CLASSES = {
     '.markdown-body',
-    '.section-card', 
+    '.section-card',
     '.rich_pages.wxw-img'
 }
 
@@ -21,153 +43,498 @@ OPTIONAL_CLASSES = {
 
 FORBIDDEN_CLASSES = {
     '.header-section',
-    '.content-card', 
+    '.content-card',
     '.container'
 }
 
 # 必需的HTML元素
 REQUIRED_ELEMENTS = {
-    'body', 'h1', 'h2', 'h3', 'h4', 'p', 
+    'body', 'h1', 'h2', 'h3', 'h4', 'p',
     'ul', 'ol', 'li', 'strong', 'em', 'a',
-    'pre', 'code', 'figure', 'figcaption', 
+    'pre', 'code', 'figure', 'figcaption',
     'blockquote', 'hr', 'table'
 }
 
-def extract_css_selectors(css_content):
-    """提取CSS文件中的所有选择器"""
-    # 匹配选择器的正则表达式
-    selector_pattern = r'^\s*([.#]?[\w.-]+(?:\s*[>+~]\s*[\w.-]+)*)\s*(?:,\s*([.#]?[\w.-]+(?:\s*[>+~]\s*[\w.-]+)*)\s*)*\s*\{'
-    
-    selectors = set()
-    lines = css_content.split('\n')
-    
-    for line in lines:
-        # 跳过注释行
-        if line.strip().startswith('/*') or line.strip().startswith('*') or line.strip().startswith('*/'):
-            continue
-            
-        # 匹配选择器
-        match = re.search(r'^\s*([^{]+)\s*\{', line)
-        if match:
-            selector_part = match.group(1).strip()
-            # 分割多个选择器（逗号分隔）
-            for selector in selector_part.split(','):
-                selector = selector.strip()
-                if selector:
-                    selectors.add(selector)
-    
+# 必须限制宽度的容器及其宽度
+WIDTH_CLASSES = ('.markdown-body', '.section-card')
+REQUIRED_MAX_WIDTH = '677px'
+
+# 检查规则变化时修改，使旧的缓存结果失效
+VALIDATOR_VERSION = '2'
+
+# 内容为规则的at-rule，其他带块的at-rule（@font-face、@page等）内容为声明，@keyframes等内容不检查
+_GROUPING_AT_RULES = {'@media', '@supports', '@document', '@-moz-document', '@layer', '@container', '@scope'}
+_DECLARATION_AT_RULES = {'@font-face', '@page', '@font-feature-values', '@counter-style', '@property', '@viewport'}
+
+_TOKEN_RE = re.compile(r'''/\*.*?(?:\*/|\Z)|"(?:\\.|[^"\\\n])*"?|'(?:\\.|[^'\\\n])*'?|[{};]''', re.S)
+_AT_KEYWORD_RE = re.compile(r'@[\w-]+')
+_NESTED_RE = re.compile(r'\([^()]*\)|\[[^\[\]]*\]')
+_COMBINATOR_RE = re.compile(r'\s*[>+~]\s*|\s+')
+_TAG_RE = re.compile(r'[a-zA-Z][\w-]*|\*')
+_CLASS_RE = re.compile(r'\.(-?[_a-zA-Z][\w-]*)')
+_VAR_RE = re.compile(r'var\(\s*(--[\w-]+)\s*(?:,\s*([^()]*))?\)')
+_IMPORTANT_RE = re.compile(r'\s*!\s*important\s*$', re.I)
+
+
+def _class_set(compound):
+    return frozenset(_CLASS_RE.findall(compound))
+
+
+_REQUIRED_CLASS_SETS = {name: _class_set(name) for name in REQUIRED_CLASSES}
+_FORBIDDEN_CLASS_SETS = {name: _class_set(name) for name in FORBIDDEN_CLASSES}
+_KNOWN_CLASS_NAMES = frozenset().union(*(_class_set(name) for name in REQUIRED_CLASSES | OPTIONAL_CLASSES | FORBIDDEN_CLASSES))
+
+
+class Rule:
+    """一条样式规则：选择器列表、声明列表 [(属性, 值, 是否!important)]、所在的分组at-rule"""
+
+    __slots__ = ('selectors', 'declarations', 'line', 'media')
+
+    def __init__(self, selectors, line, media):
+        self.selectors = selectors
+        self.declarations = []
+        self.line = line
+        self.media = media
+
+
+class _Block:
+    __slots__ = ('kind', 'rule', 'media', 'line', 'nested')
+
+    def __init__(self, kind, rule=None, media=None, line=0):
+        self.kind = kind  # rules / declarations / skip
+        self.rule = rule
+        self.media = media
+        self.line = line
+        self.nested = False
+
+
+def split_selectors(prelude):
+    """按顶层逗号切分选择器列表（括号、方括号和字符串中的逗号不算）"""
+    selectors = []
+    depth = 0
+    quote = None
+    start = 0
+    for i, char in enumerate(prelude):
+        if quote:
+            if char == quote and prelude[i - 1] != '\\':
+                quote = None
+        elif char in '"\'':
+            quote = char
+        elif char in '([':
+            depth += 1
+        elif char in ')]':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            selectors.append(' '.join(prelude[start:i].split()))
+            start = i + 1
+    selectors.append(' '.join(prelude[start:].split()))
     return selectors
 
-def validate_theme(css_file_path):
-    """验证单个CSS主题文件"""
-    print(f"\n验证文件: {css_file_path.name}")
-    print("=" * 50)
-    
-    with open(css_file_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    selectors = extract_css_selectors(content)
-    
-    # 提取类选择器
-    class_selectors = {s for s in selectors if s.startswith('.')}
-    
-    # 提取元素选择器
-    element_selectors = {s for s in selectors if not s.startswith('.') and not s.startswith('#') and not ' ' in s}
-    
-    # 检查结果
+
+def selector_compounds(selector):
+    """返回选择器中的复合选择器 [(元素名或None, 类名集合)]，忽略伪类参数和属性选择器"""
+    stripped = selector
+    while True:
+        reduced = _NESTED_RE.sub('', stripped)
+        if reduced == stripped:
+            break
+        stripped = reduced
+    compounds = []
+    for compound in _COMBINATOR_RE.split(stripped.strip()):
+        if compound:
+            tag = _TAG_RE.match(compound)
+            compounds.append((tag.group().lower() if tag else None, _class_set(compound)))
+    return compounds
+
+
+def tokenize(css_content):
+    """
+    扫描样式表，返回 (规则列表, 语法错误列表)
+    语法错误形如 {'line', 'message'}
+    """
+    newlines = [i for i, char in enumerate(css_content) if char == '\n']
+
+    def line_of(pos):
+        return bisect.bisect_right(newlines, pos - 1) + 1
+
+    rules = []
+    errors = []
+    stack = [_Block('rules')]
+    buffer = []
+    buffer_pos = 0
+    pos = 0
+
+    def take_buffer():
+        text = ''.join(buffer)
+        buffer.clear()
+        return text
+
+    def add_declaration(text, at):
+        text = text.strip()
+        if not text:
+            return
+        block = stack[-1]
+        name, colon, value = text.partition(':')
+        if not colon or not name.strip():
+            errors.append({'line': line_of(at), 'message': f'无效的声明: {text[:60]}'})
+            return
+        if block.rule is not None:
+            important = bool(_IMPORTANT_RE.search(value))
+            block.rule.declarations.append((name.strip().lower(), _IMPORTANT_RE.sub('', value).strip(), important))
+
+    for match in _TOKEN_RE.finditer(css_content):
+        if not buffer:
+            buffer_pos = pos
+        buffer.append(css_content[pos:match.start()])
+        token = match.group()
+        pos = match.end()
+
+        if token.startswith('/*'):
+            if len(token) < 4 or not token.endswith('*/'):
+                errors.append({'line': line_of(match.start()), 'message': '注释没有结束'})
+            buffer.append(' ')
+            continue
+        if token[0] in '"\'':
+            if len(token) < 2 or token[-1] != token[0]:
+                errors.append({'line': line_of(match.start()), 'message': '字符串没有结束'})
+            buffer.append(token)
+            continue
+
+        block = stack[-1]
+        text = take_buffer()
+        line = line_of(match.start())
+
+        if token == '{':
+            prelude = ' '.join(text.split())
+            if block.kind == 'skip':
+                stack.append(_Block('skip', line=line))
+            elif block.kind == 'declarations':
+                # 常见原因是上一条规则少了 }，之后的规则都会落在这个块中，只报告第一条；css_inline也不支持嵌套规则
+                if not block.nested:
+                    block.nested = True
+                    errors.append({'line': line, 'message': f'声明块中出现规则 "{prelude[:60]}"（是否缺少 "}}"？）'})
+                stack.append(_Block('skip', line=line))
+            elif prelude.startswith('@'):
+                keyword = _AT_KEYWORD_RE.match(prelude)
+                keyword = keyword.group().lower() if keyword else prelude
+                if keyword in _GROUPING_AT_RULES:
+                    media = f'{block.media} {prelude}' if block.media else prelude
+                    stack.append(_Block('rules', media=media, line=line))
+                elif keyword in _DECLARATION_AT_RULES:
+                    stack.append(_Block('declarations', line=line))
+                else:
+                    stack.append(_Block('skip', line=line))
+            elif not prelude:
+                errors.append({'line': line, 'message': '规则缺少选择器'})
+                stack.append(_Block('declarations', line=line))
+            else:
+                rule = Rule(split_selectors(prelude), line, block.media)
+                if any(not selector for selector in rule.selectors):
+                    errors.append({'line': line, 'message': f'选择器列表中有空的选择器: {prelude[:60]}'})
+                stack.append(_Block('declarations', rule=rule, line=line))
+        elif token == '}':
+            if block.kind == 'declarations':
+                add_declaration(text, buffer_pos)
+            elif text.strip() and block.kind == 'rules':
+                errors.append({'line': line, 'message': f'不完整的规则: {text.strip()[:60]}'})
+            if len(stack) == 1:
+                errors.append({'line': line, 'message': '多余的 "}"'})
+                continue
+            stack.pop()
+            if block.rule is not None:
+                rules.append(block.rule)
+        else:  # ;
+            if block.kind == 'declarations':
+                add_declaration(text, buffer_pos)
+            elif block.kind == 'rules':
+                statement = text.strip()
+                if statement and not statement.startswith('@'):
+                    errors.append({'line': line, 'message': f'规则之外的声明: {statement[:60]}'})
+
+    trailing = ''.join(buffer) + css_content[pos:]
+    if stack[-1].kind == 'rules' and len(stack) == 1 and trailing.strip():
+        errors.append({'line': line_of(len(css_content)), 'message': f'不完整的规则: {trailing.strip()[:60]}'})
+    for block in stack[1:]:
+        errors.append({'line': block.line, 'message': '块没有闭合（缺少 "}"）'})
+    return rules, errors
+
+
+def _resolve_value(value, variables):
+    for _ in range(10):
+        resolved = _VAR_RE.sub(lambda m: variables.get(m.group(1), m.group(2) or '').strip(), value)
+        if resolved == value:
+            break
+        value = resolved
+    return ' '.join(value.split())
+
+
+def validate_css(css_content):
+    """
+    验证单个样式表，返回结果字典：
+    {'valid', 'errors': 语法错误, 'issues': 不符合规范的问题, 'warnings', 'stats'}
+    errors和issues为空时valid为True（只有警告时仍算通过）
+    """
+    rules, errors = tokenize(css_content)
     issues = []
     warnings = []
-    
+
+    styled_classes = []   # 各规则作用对象的类名集合
+    styled_elements = set()
+    used_classes = set()
+    for rule in rules:
+        for selector in rule.selectors:
+            compounds = selector_compounds(selector)
+            if not compounds:
+                continue
+            for _, classes in compounds:
+                used_classes |= classes
+            tag, classes = compounds[-1]
+            if rule.declarations:
+                styled_classes.append(classes)
+                if tag:
+                    styled_elements.add(tag)
+    # :not() 等伪类参数中的类也算使用
+    for rule in rules:
+        for selector in rule.selectors:
+            used_classes |= _class_set(selector)
+
     # 1. 检查必需的类
-    missing_required = REQUIRED_CLASSES - class_selectors
+    missing_required = sorted(name for name, required in _REQUIRED_CLASS_SETS.items()
+                              if not any(required <= classes for classes in styled_classes))
     if missing_required:
-        issues.append(f"缺少必需的类: {', '.join(missing_required)}")
-    
+        issues.append({'code': 'missing-class', 'classes': missing_required,
+                       'message': f"缺少必需的类: {', '.join(missing_required)}"})
+
     # 2. 检查禁用的类
-    forbidden_found = FORBIDDEN_CLASSES & class_selectors
+    forbidden_found = sorted(name for name, forbidden in _FORBIDDEN_CLASS_SETS.items() if forbidden <= used_classes)
     if forbidden_found:
-        issues.append(f"使用了禁用的类: {', '.join(forbidden_found)}")
-    
-    # 3. 检查未知的类
-    known_classes = REQUIRED_CLASSES | OPTIONAL_CLASSES | FORBIDDEN_CLASSES
-    unknown_classes = class_selectors - known_classes
+        issues.append({'code': 'forbidden-class', 'classes': forbidden_found,
+                       'message': f"使用了禁用的类: {', '.join(forbidden_found)}"})
+
+    # 3. 检查未知的类（代码高亮的 hljs-* 归入 .hljs）
+    unknown_classes = sorted(f'.{name}' for name in used_classes - _KNOWN_CLASS_NAMES if not name.startswith('hljs'))
     if unknown_classes:
-        warnings.append(f"发现未知类 (可能需要移除): {', '.join(unknown_classes)}")
-    
+        warnings.append({'code': 'unknown-class', 'classes': unknown_classes,
+                         'message': f"发现未知类 (可能需要移除): {', '.join(unknown_classes)}"})
+
     # 4. 检查必需的HTML元素
-    missing_elements = REQUIRED_ELEMENTS - element_selectors
+    missing_elements = sorted(REQUIRED_ELEMENTS - styled_elements)
     if missing_elements:
-        warnings.append(f"可能缺少HTML元素样式: {', '.join(missing_elements)}")
-    
-    # 5. 检查容器宽度
-    if '.markdown-body' in content:
-        if 'max-width: 677px' not in content:
-            issues.append("markdown-body 必须设置 max-width: 677px")
-    
-    if '.section-card' in content:
-        if 'max-width: 677px' not in content:
-            issues.append("section-card 必须设置 max-width: 677px")
-    
-    # 输出结果
-    if not issues and not warnings:
-        print("✅ 完全符合标准规范！")
-        return True
+        warnings.append({'code': 'missing-element', 'elements': missing_elements,
+                         'message': f"可能缺少HTML元素样式: {', '.join(missing_elements)}"})
+
+    # 5. 检查容器宽度：容器自身（不在@media中）的声明块里最终生效的 max-width
+    variables = None
+    for name in WIDTH_CLASSES:
+        if name in missing_required:
+            continue
+        max_width = None
+        max_width_important = False
+        for rule in rules:
+            if rule.media is not None or name not in rule.selectors:
+                continue
+            for prop, value, important in rule.declarations:
+                if prop == 'max-width' and (important or not max_width_important):
+                    max_width, max_width_important = value, important
+        if max_width is not None and 'var(' in max_width:
+            if variables is None:
+                variables = extract_css_variables(css_content)[ROOT_SCOPE]
+            max_width = _resolve_value(max_width, variables)
+        if max_width != REQUIRED_MAX_WIDTH:
+            found = f'（当前为 {max_width}）' if max_width else ''
+            issues.append({'code': 'max-width', 'selector': name, 'value': max_width,
+                           'message': f"{name[1:]} 必须设置 max-width: {REQUIRED_MAX_WIDTH}{found}"})
+
+    return {
+        'valid': not errors and not issues,
+        'errors': errors,
+        'issues': issues,
+        'warnings': warnings,
+        'stats': {'rules': len(rules), 'declarations': sum(len(rule.declarations) for rule in rules)},
+    }
+
+
+def content_key(css_content):
+    return hashlib.sha256(f'{VALIDATOR_VERSION}\0{css_content}'.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """
+    按内容哈希缓存验证结果的JSON文件
+
+    :param max_entries: 最多保存的结果数，超出时丢弃最早的结果
+    """
+
+    def __init__(self, path, max_entries=5000):
+        self.path = path
+        self.max_entries = max_entries
+        self._results = {}
+        self._dirty = False
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self._results = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def get(self, key):
+        return self._results.get(key)
+
+    def put(self, key, result):
+        self._results.pop(key, None)
+        self._results[key] = result
+        self._dirty = True
+
+    def save(self):
+        if not self._dirty:
+            return
+        while len(self._results) > self.max_entries:
+            self._results.pop(next(iter(self._results)))
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self._results, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+        self._dirty = False
+
+
+def validate_themes(themes, cache=None, workers=None):
+    """
+    验证多个主题，返回与themes顺序一致的结果列表
+
+    :param themes: [(名称, 来源, CSS文本)]
+    :param cache: 可选的 ResultCache
+    :param workers: 进程数，默认为CPU核数；未命中缓存的主题不多时在当前进程中验证
+    """
+    keys = [content_key(css) for _, _, css in themes]
+    results = [cache.get(key) if cache is not None else None for key in keys]
+    pending = [i for i, result in enumerate(results) if result is None]
+
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(pending) >= workers * 2:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunksize = max(1, len(pending) // (workers * 4))
+            computed = list(pool.map(validate_css, [themes[i][2] for i in pending], chunksize=chunksize))
     else:
-        if issues:
-            print("❌ 发现问题:")
-            for issue in issues:
-                print(f"  - {issue}")
-        
-        if warnings:
-            print("⚠️  警告:")
-            for warning in warnings:
-                print(f"  - {warning}")
-        
-        return len(issues) == 0  # 只有警告时仍算通过
+        computed = [validate_css(themes[i][2]) for i in pending]
 
-def main():
-    """主函数"""
+    for i, result in zip(pending, computed):
+        results[i] = result
+        if cache is not None:
+            cache.put(keys[i], result)
+    if cache is not None:
+        cache.save()
+
+    return [
+        dict(result, name=name, source=source, hash=key[:16], cached=i not in pending)
+        for i, ((name, source, _), key, result) in enumerate(zip(themes, keys, results))
+    ]
+
+
+def collect_themes(paths, themes_dir, data_file):
+    """返回待验证的 [(名称, 来源, CSS文本)]；未指定文件时为主题目录（不含模板）和 all_themes_data.json 中的主题"""
+    themes = []
+    if paths:
+        files = [Path(path) for path in paths]
+    else:
+        files = sorted(path for path in Path(themes_dir).glob('*.css') if path.name != 'template.css')
+    for path in files:
+        with open(path, 'r', encoding='utf-8') as f:
+            themes.append((path.name, str(path), f.read()))
+
+    if not paths and data_file and os.path.exists(data_file):
+        from theme_bundle import load_theme_data
+        for entry in load_theme_data(data_file):
+            themes.append((entry['file'], f"{Path(data_file).name}#{entry['id']}", entry['css']))
+    return themes
+
+
+def print_report(results):
+    """按文本格式输出结果"""
     print("CSS主题标准规范验证器")
     print("=" * 50)
-    
-    themes_dir = Path('themes')
-    if not themes_dir.exists():
-        print("❌ themes 目录不存在")
-        return
-    
-    css_files = list(themes_dir.glob('*.css'))
-    if not css_files:
-        print("❌ 未找到CSS文件")
-        return
-    
-    # 排除模板文件
-    css_files = [f for f in css_files if f.name != 'template.css']
-    
-    print(f"找到 {len(css_files)} 个CSS文件待验证\n")
-    
-    results = {}
-    for css_file in sorted(css_files):
-        results[css_file.name] = validate_theme(css_file)
-    
-    # 总结报告
+    print(f"找到 {len(results)} 个主题待验证")
+
+    for result in results:
+        print(f"\n验证: {result['source']}")
+        print("=" * 50)
+        if not result['errors'] and not result['issues'] and not result['warnings']:
+            print("✅ 完全符合标准规范！")
+            continue
+        if result['errors']:
+            print("❌ 语法错误:")
+            for error in result['errors']:
+                print(f"  - 第{error['line']}行: {error['message']}")
+        if result['issues']:
+            print("❌ 发现问题:")
+            for issue in result['issues']:
+                print(f"  - {issue['message']}")
+        if result['warnings']:
+            print("⚠️  警告:")
+            for warning in result['warnings']:
+                print(f"  - {warning['message']}")
+
     print("\n" + "=" * 50)
     print("验证总结报告")
     print("=" * 50)
-    
-    passed = sum(results.values())
-    total = len(results)
-    
-    print(f"通过: {passed}/{total}")
-    
-    if passed == total:
+    passed = sum(result['valid'] for result in results)
+    print(f"通过: {passed}/{len(results)}（{sum(result['cached'] for result in results)} 个结果来自缓存）")
+    if passed == len(results):
         print("🎉 所有主题都符合标准规范！")
     else:
         print("❌ 以下主题需要修复:")
-        for filename, passed in results.items():
-            if not passed:
-                print(f"  - {filename}")
-    
-    return passed == total
+        for result in results:
+            if not result['valid']:
+                print(f"  - {result['source']}")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='CSS主题标准规范验证器')
+    parser.add_argument('files', nargs='*', help='要验证的CSS文件（默认 themes/*.css 和 all_themes_data.json）')
+    parser.add_argument('--themes-dir', default='themes')
+    parser.add_argument('--themes-data', default='all_themes_data.json')
+    parser.add_argument('--json', action='store_true', help='输出JSON')
+    parser.add_argument('--output', help='把JSON结果写入文件')
+    parser.add_argument('--workers', type=int, help='进程数（默认为CPU核数）')
+    parser.add_argument('--cache', default=os.path.join(tempfile.gettempdir(), 'md2any-theme-validation.json'),
+                        help='验证结果缓存文件')
+    parser.add_argument('--no-cache', action='store_true', help='不读取也不写入缓存')
+    args = parser.parse_args()
+
+    if not args.files and not Path(args.themes_dir).exists():
+        print(f"❌ {args.themes_dir} 目录不存在")
+        return 1
+    themes = collect_themes(args.files, args.themes_dir, args.themes_data)
+    if not themes:
+        print("❌ 未找到CSS文件")
+        return 1
+
+    cache = None if args.no_cache else ResultCache(args.cache)
+    results = validate_themes(themes, cache, args.workers)
+
+    report = {
+        'validator_version': VALIDATOR_VERSION,
+        'passed': sum(result['valid'] for result in results),
+        'total': len(results),
+        'themes': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.json:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    else:
+        print_report(results)
+    return 0 if report['passed'] == report['total'] else 1
+
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    sys.exit(main())
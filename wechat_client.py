@@ -0,0 +1,286 @@
+"""
+微信公众平台接口客户端
+每个worker共享一个 requests.Session 连接池（keep-alive，复用TCP/TLS连接），
+统一配置超时，并对网络错误和微信返回的临时性错误码做带随机抖动的指数退避重试。
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+except ImportError:  # 只有ASGI模式（asgi_server.py）需要httpx
+    httpx = None
+
+logger = logging.getLogger(__name__)
+
+WECHAT_API_BASE = os.getenv('WECHAT_API_BASE', 'https://api.weixin.qq.com')
+
+# 系统繁忙（-1）和接口调用频率限制（45009）可以稍后重试
+DEFAULT_RETRY_ERRCODES = (-1, 45009)
+
+# 请求被拒绝、没有被处理的错误码，非幂等请求（提交草稿、上传图片）也只重试这些错误码
+SAFE_RETRY_ERRCODES = (45009,)
+
+
+class WeChatAPIError(Exception):
+    """微信接口返回错误，result为微信返回的原始结果"""
+
+    def __init__(self, result):
+        super().__init__(result.get('errmsg', 'unknown error'))
+        self.result = result
+
+
+class WeChatHTTPError(WeChatAPIError):
+    """微信接口（或中间的网关）返回了非JSON响应，例如502错误页"""
+
+    def __init__(self, status_code, body=''):
+        super().__init__({'errmsg': f'微信接口返回了非JSON响应: HTTP {status_code}', 'http_status': status_code})
+        self.status_code = status_code
+        self.body = body[:200]
+
+
+class _BaseWeChatClient:
+    """
+    微信接口客户端的公共配置和重试策略
+
+    :param api_base: 接口地址，测试时可以指向本地的模拟服务
+    :param pool_size: 连接池大小
+    :param connect_timeout: 建立连接的超时时间（秒）
+    :param read_timeout: 读取响应的超时时间（秒）
+    :param max_retries: 最多重试次数
+    :param backoff: 第一次重试前的最长等待时间（秒），之后每次翻倍
+    :param max_backoff: 单次重试等待时间的上限（秒）
+    :param retry_errcodes: 需要重试的微信错误码
+    """
+
+    def __init__(self, api_base=WECHAT_API_BASE, pool_size=10, connect_timeout=5, read_timeout=10,
+                 max_retries=3, backoff=0.5, max_backoff=8, retry_errcodes=DEFAULT_RETRY_ERRCODES):
+        self.api_base = api_base.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retry_errcodes = frozenset(retry_errcodes)
+        self.pool_size = pool_size
+        self._request_hooks = []
+
+    def add_request_hook(self, hook):
+        """
+        注册请求耗时钩子，每次请求（包括重试）结束后调用 hook(path, outcome, seconds)；
+        outcome 为 ok、wechat_error（微信返回错误码）、http_error（5xx或非JSON响应）或 network_error
+        """
+        self._request_hooks.append(hook)
+
+    def _notify(self, path, outcome, seconds):
+        for hook in self._request_hooks:
+            try:
+                hook(path, outcome, seconds)
+            except Exception as e:
+                logger.warning(f"WeChat request hook failed: {str(e)}")
+
+    def _retry_delay(self, attempt, reason):
+        # full jitter：在 [0, min(max_backoff, backoff * 2^attempt)] 中随机等待，避免多个worker同时重试
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+        logger.warning(f"WeChat API {reason}, retrying in {delay:.2f}s ({attempt + 1}/{self.max_retries})")
+        return delay
+
+    def _retry_errcode(self, method, errcode):
+        """GET重试 retry_errcodes 中的错误码；非幂等请求可能已经被微信处理，只重试 SAFE_RETRY_ERRCODES"""
+        return errcode in self.retry_errcodes and (method == 'GET' or errcode in SAFE_RETRY_ERRCODES)
+
+    def _json(self, response):
+        """解析微信返回的JSON，非JSON响应（网关错误页等）抛出 WeChatHTTPError"""
+        try:
+            return response.json()
+        except ValueError:
+            raise WeChatHTTPError(response.status_code, response.text)
+
+
+def _connect_failed(error):
+    """请求还没有发出：建立连接超时或连接被拒绝"""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, urllib3.exceptions.NewConnectionError)
+
+
+class WeChatClient(_BaseWeChatClient):
+    """微信接口客户端，参数见 _BaseWeChatClient"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _sleep_before_retry(self, attempt, reason):
+        time.sleep(self._retry_delay(attempt, reason))
+
+    def request(self, method, path, params=None, json=None, files=None):
+        """
+        调用微信接口并返回解析后的JSON结果（包括带errcode的错误结果）
+        files 为 multipart/form-data 上传的文件，格式同 requests
+
+        GET在网络错误、5xx响应和 retry_errcodes 中的错误码时重试；
+        非幂等请求（提交草稿、上传图片）可能已经被微信处理，只在请求发出前连接失败和 SAFE_RETRY_ERRCODES 时重试，
+        避免重复提交。响应不是JSON时抛出 WeChatHTTPError
+        """
+        url = f'{self.api_base}{path}'
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, params=params, json=json, files=files,
+                                                timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._notify(path, 'network_error', time.perf_counter() - started)
+                retryable = method == 'GET' or _connect_failed(e)
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                self._sleep_before_retry(attempt, f'request failed ({str(e)})')
+                attempt += 1
+                continue
+
+            elapsed = time.perf_counter() - started
+            if response.status_code >= 500:
+                self._notify(path, 'http_error', elapsed)
+                if method == 'GET' and attempt < self.max_retries:
+                    self._sleep_before_retry(attempt, f'returned HTTP {response.status_code}')
+                    attempt += 1
+                    continue
+                return self._json(response)
+
+            try:
+                result = self._json(response)
+            except WeChatHTTPError:
+                self._notify(path, 'http_error', elapsed)
+                raise
+            self._notify(path, 'wechat_error' if result.get('errcode') else 'ok', elapsed)
+            if self._retry_errcode(method, result.get('errcode')) and attempt < self.max_retries:
+                self._sleep_before_retry(attempt, f'returned errcode {result.get("errcode")}')
+                attempt += 1
+                continue
+            return result
+
+    def get(self, path, params=None):
+        return self.request('GET', path, params=params)
+
+    def post(self, path, params=None, json=None, files=None):
+        return self.request('POST', path, params=params, json=json, files=files)
+
+    def add_draft(self, access_token, articles):
+        """新增草稿：https://developers.weixin.qq.com/doc/service/api/draftbox/draftmanage/api_draft_add.html"""
+        return self.post('/cgi-bin/draft/add', params={'access_token': access_token}, json=articles)
+
+    def upload_image(self, access_token, filename, data, mimetype):
+        """
+        上传图文消息内的图片，成功时结果中的url可以用在草稿正文中（只支持1MB以下的jpg/png）：
+        https://developers.weixin.qq.com/doc/service/api/material/permanent/api_uploadimage.html
+        """
+        return self.post('/cgi-bin/media/uploadimg', params={'access_token': access_token},
+                         files={'media': (filename, data, mimetype)})
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncWeChatClient(_BaseWeChatClient):
+    """
+    基于httpx的异步微信接口客户端，参数和重试策略与 WeChatClient 相同，
+    供ASGI模式下在事件循环中调用，等待微信响应时不占用线程
+    """
+
+    def __init__(self, *args, **kwargs):
+        if httpx is None:
+            raise RuntimeError('AsyncWeChatClient requires httpx (pip install "md2any[asgi]")')
+        super().__init__(*args, **kwargs)
+        connect_timeout, read_timeout = self.timeout
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+        )
+
+    async def request(self, method, path, params=None, json=None):
+        """重试策略同 WeChatClient.request"""
+        url = f'{self.api_base}{path}'
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                response = await self.client.request(method, url, params=params, json=json)
+            except httpx.TransportError as e:
+                self._notify(path, 'network_error', time.perf_counter() - started)
+                retryable = method == 'GET' or isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout))
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                await asyncio.sleep(self._retry_delay(attempt, f'request failed ({str(e)})'))
+                attempt += 1
+                continue
+
+            elapsed = time.perf_counter() - started
+            if response.status_code >= 500:
+                self._notify(path, 'http_error', elapsed)
+                if method == 'GET' and attempt < self.max_retries:
+                    await asyncio.sleep(self._retry_delay(attempt, f'returned HTTP {response.status_code}'))
+                    attempt += 1
+                    continue
+                return self._json(response)
+
+            try:
+                result = self._json(response)
+            except WeChatHTTPError:
+                self._notify(path, 'http_error', elapsed)
+                raise
+            self._notify(path, 'wechat_error' if result.get('errcode') else 'ok', elapsed)
+            if self._retry_errcode(method, result.get('errcode')) and attempt < self.max_retries:
+                await asyncio.sleep(self._retry_delay(attempt, f'returned errcode {result.get("errcode")}'))
+                attempt += 1
+                continue
+            return result
+
+    async def get(self, path, params=None):
+        return await self.request('GET', path, params=params)
+
+    async def post(self, path, params=None, json=None):
+        return await self.request('POST', path, params=params, json=json)
+
+    async def add_draft(self, access_token, articles):
+        return await self.post('/cgi-bin/draft/add', params={'access_token': access_token}, json=articles)
+
+    async def close(self):
+        await self.client.aclose()
+
+
+def _client_options_from_env():
+    retry_errcodes = os.getenv('WECHAT_RETRY_ERRCODES')
+    if retry_errcodes is None:
+        retry_errcodes = DEFAULT_RETRY_ERRCODES
+    else:
+        retry_errcodes = [int(code) for code in retry_errcodes.split(',') if code.strip()]
+    return {
+        'pool_size': int(os.getenv('WECHAT_POOL_SIZE', '10')),
+        'connect_timeout': float(os.getenv('WECHAT_CONNECT_TIMEOUT', '5')),
+        'read_timeout': float(os.getenv('WECHAT_READ_TIMEOUT', '10')),
+        'max_retries': int(os.getenv('WECHAT_MAX_RETRIES', '3')),
+        'backoff': float(os.getenv('WECHAT_RETRY_BACKOFF', '0.5')),
+        'retry_errcodes': retry_errcodes,
+    }
+
+
+def create_async_wechat_client_from_env():
+    """根据环境变量创建异步微信接口客户端"""
+    return AsyncWeChatClient(**_client_options_from_env())
+
+
+def create_wechat_client_from_env():
+    """根据环境变量创建微信接口客户端"""
+    return WeChatClient(**_client_options_from_env())
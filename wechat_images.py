@@ -0,0 +1,398 @@
+"""
+文章图片上传
+微信草稿正文中的图片必须使用 media/uploadimg 上传后返回的URL。发布前找出渲染后HTML中的所有 <img src>，
+并发下载图片，按内容哈希查找已上传的URL，只上传没有上传过的图片，然后替换src。
+
+内容哈希 -> 微信图片URL 的映射保存在本地SQLite中，同一台机器上的任意gunicorn worker共享；
+同时记录每个图片链接的ETag/Last-Modified和内容哈希，再次发布时用条件请求确认图片没有变化，不用重新下载。
+无法处理的图片（下载失败、格式或大小不符合要求等）保留原来的src，并在结果中列出。
+
+下载远程图片需要显式开启（WECHAT_IMAGE_FETCH_REMOTE=1）：图片链接来自用户提交的Markdown，
+下载前解析域名并拒绝回环、内网、链路本地和保留地址，然后直接连接检查过的IP（不再次解析，避免DNS rebinding），
+不使用环境变量中的代理；重定向不自动跟随，每一跳都重新检查，避免被用来访问内网服务（SSRF）。
+"""
+
+import base64
+import hashlib
+import html
+import ipaddress
+import logging
+import os
+import re
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import unquote_to_bytes, urljoin, urlparse
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+from wechat_client import WeChatAPIError, WeChatHTTPError
+
+logger = logging.getLogger(__name__)
+
+# 微信图片服务器上的图片不需要上传
+WECHAT_IMAGE_HOSTS = ('mmbiz.qpic.cn', 'mmbiz.qlogo.cn')
+
+# uploadimg只支持1MB以下的jpg/png
+DEFAULT_MAX_SIZE = 1024 * 1024
+
+# 下载图片时最多跟随的重定向次数
+MAX_REDIRECTS = 3
+_IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png', 'png'),
+)
+
+_IMG_SRC_RE = re.compile(r'''(<img\b[^>]*?\ssrc=)(["'])(.*?)\2''', re.I | re.S)
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS uploads (
+    appid TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    url TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (appid, hash)
+);
+CREATE TABLE IF NOT EXISTS sources (
+    src TEXT PRIMARY KEY,
+    hash TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    updated_at REAL NOT NULL
+);
+'''
+
+
+class ImageError(Exception):
+    """单张图片无法上传，图片保留原来的src"""
+
+
+def image_type(data):
+    """按文件头判断图片类型，返回 (mimetype, 扩展名)，不是jpg/png时返回None"""
+    for signature, mimetype, extension in _IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return mimetype, extension
+    return None
+
+
+def find_image_sources(content):
+    """返回HTML中所有 <img> 的src（已反转义HTML实体），按出现顺序去重"""
+    return list(dict.fromkeys(html.unescape(match.group(3)) for match in _IMG_SRC_RE.finditer(content)))
+
+
+def rewrite_image_sources(content, urls):
+    """把HTML中的图片src按 {原src: 新URL} 替换"""
+    def replace(match):
+        url = urls.get(html.unescape(match.group(3)))
+        if url is None:
+            return match.group(0)
+        return f'{match.group(1)}{match.group(2)}{html.escape(url, quote=True)}{match.group(2)}'
+    return _IMG_SRC_RE.sub(replace, content)
+
+
+def _is_public_address(address):
+    """地址是否为公网地址（拒绝回环、内网、链路本地、保留、组播等地址）"""
+    ip = ipaddress.ip_address(address.split('%', 1)[0])
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+class _PinnedAddressAdapter(HTTPAdapter):
+    """
+    请求URL中的主机已经替换为检查过的IP，Host头保留原来的主机；
+    HTTPS连接的SNI和证书校验也使用Host头中的域名，而不是IP
+    """
+
+    def build_connection_pool_key_attributes(self, request, verify, cert=None):
+        host_params, pool_kwargs = super().build_connection_pool_key_attributes(request, verify, cert)
+        if host_params['scheme'] == 'https':
+            hostname = urlparse('//' + request.headers['Host']).hostname
+            pool_kwargs['server_hostname'] = hostname
+            pool_kwargs['assert_hostname'] = hostname
+        return host_params, pool_kwargs
+
+
+def _decode_data_uri(src):
+    header, _, payload = src[len('data:'):].partition(',')
+    if header.endswith(';base64'):
+        return base64.b64decode(payload)
+    return unquote_to_bytes(payload)
+
+
+class ImageUploadCache:
+    """
+    已上传图片的SQLite缓存
+    微信图片URL按 (appid, 内容哈希) 保存；图片链接的验证器（ETag/Last-Modified）和内容哈希按链接保存
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        # 每次操作使用独立连接，sqlite3连接不能在线程之间共享
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get_upload(self, appid, content_hash):
+        with self._connect() as conn:
+            row = conn.execute('SELECT url FROM uploads WHERE appid = ? AND hash = ?', (appid, content_hash)).fetchone()
+        return row[0] if row else None
+
+    def put_upload(self, appid, content_hash, url, size):
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO uploads (appid, hash, url, size, created_at) VALUES (?, ?, ?, ?, ?)',
+                         (appid, content_hash, url, size, time.time()))
+
+    def get_source(self, src):
+        """返回 {'hash', 'etag', 'last_modified'}，没有记录时返回None"""
+        with self._connect() as conn:
+            row = conn.execute('SELECT hash, etag, last_modified FROM sources WHERE src = ?', (src,)).fetchone()
+        return {'hash': row[0], 'etag': row[1], 'last_modified': row[2]} if row else None
+
+    def put_source(self, src, content_hash, etag, last_modified):
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO sources (src, hash, etag, last_modified, updated_at) '
+                         'VALUES (?, ?, ?, ?, ?)', (src, content_hash, etag, last_modified, time.time()))
+
+    def stats(self):
+        with self._connect() as conn:
+            uploads, size = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM uploads').fetchone()
+        return {'uploads': uploads, 'bytes': size}
+
+
+class ImageUploader:
+    """
+    下载文章中的图片并上传到微信
+
+    :param cache: ImageUploadCache
+    :param client: 微信接口客户端（WeChatClient）
+    :param workers: 并发下载/上传的线程数
+    :param max_size: 超过该字节数的图片不上传
+    :param timeout: 下载图片的 (连接, 读取) 超时时间（秒）
+    :param abort_errcodes: 上传返回这些错误码（例如access_token失效）时抛出 WeChatAPIError，不再处理其他图片
+    :param fetch_remote: 是否下载http(s)图片；为False时只处理data URI图片
+    :param allow_private_addresses: 允许下载解析到内网等非公网地址的图片（仅用于测试或可信的内网部署）
+    """
+
+    def __init__(self, cache, client, workers=8, max_size=DEFAULT_MAX_SIZE, timeout=(5, 15), abort_errcodes=(),
+                 fetch_remote=False, allow_private_addresses=False):
+        self.cache = cache
+        self.client = client
+        self.max_size = max_size
+        self.timeout = timeout
+        self.abort_errcodes = frozenset(abort_errcodes)
+        self.fetch_remote = fetch_remote
+        self.allow_private_addresses = allow_private_addresses
+        self.session = requests.Session()
+        # 代理服务器会重新解析域名，绕过地址检查
+        self.session.trust_env = False
+        adapter = _PinnedAddressAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-upload')
+        self._lock = threading.Lock()
+        self.counts = {'uploaded': 0, 'cached': 0, 'failed': 0}
+
+    def _count(self, result, n=1):
+        with self._lock:
+            self.counts[result] += n
+
+    def _resolve(self, url):
+        """
+        只允许http(s)链接，并且域名解析到的所有地址都是公网地址；
+        返回 (主机替换为IP的URL, Host头)，请求直接连接该IP
+        """
+        parsed = urlparse(url)
+        if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+            raise ImageError('只支持http(s)图片链接')
+        try:
+            port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+            addresses = socket.getaddrinfo(parsed.hostname, port, proto=socket.IPPROTO_TCP)
+        except (OSError, ValueError) as e:
+            raise ImageError(f'无法解析图片域名: {str(e)}')
+        if not self.allow_private_addresses:
+            for *_, sockaddr in addresses:
+                if not _is_public_address(sockaddr[0]):
+                    raise ImageError('图片链接指向内网或保留地址')
+        address = addresses[0][4][0]
+        host = f'[{address}]' if ':' in address else address
+        pinned = parsed._replace(netloc=f'{host}:{port}').geturl()
+        return pinned, parsed.netloc.rpartition('@')[2]
+
+    def _get(self, src, headers):
+        """发送GET请求，手动跟随重定向并检查每一跳的地址"""
+        url = src
+        for _ in range(MAX_REDIRECTS + 1):
+            pinned, host = self._resolve(url)
+            try:
+                response = self.session.get(pinned, headers=dict(headers, Host=host), timeout=self.timeout,
+                                            stream=True, allow_redirects=False)
+            except requests.RequestException as e:
+                raise ImageError(f'下载图片失败: {str(e)}')
+            if not response.is_redirect:
+                return response
+            url = urljoin(url, response.headers['Location'])
+            response.close()
+        raise ImageError('下载图片失败: 重定向次数过多')
+
+    def _download(self, src, appid):
+        """返回 (内容哈希, 图片内容)；图片没有变化且已经为该appid上传过时不下载内容，返回 (内容哈希, None)"""
+        if src.startswith('data:'):
+            try:
+                data = _decode_data_uri(src)
+            except ValueError as e:
+                raise ImageError(f'无法解析data URI: {str(e)}')
+            return hashlib.sha256(data).hexdigest(), data
+        if not self.fetch_remote:
+            raise ImageError('未开启远程图片下载（WECHAT_IMAGE_FETCH_REMOTE）')
+
+        headers = {}
+        known = self.cache.get_source(src)
+        if known is not None and self.cache.get_upload(appid, known['hash']) is not None:
+            if known['etag']:
+                headers['If-None-Match'] = known['etag']
+            if known['last_modified']:
+                headers['If-Modified-Since'] = known['last_modified']
+
+        response = self._get(src, headers)
+        with response:
+            if response.status_code == 304 and headers:
+                return known['hash'], None
+            if response.status_code != 200:
+                raise ImageError(f'下载图片失败: HTTP {response.status_code}')
+            if int(response.headers.get('Content-Length') or 0) > self.max_size:
+                raise ImageError(f'图片超过{self.max_size // 1024}KB')
+            try:
+                data = response.raw.read(self.max_size + 1, decode_content=True)
+            except (urllib3.exceptions.HTTPError, OSError) as e:
+                # 读取超时、连接中断、响应体不完整等
+                raise ImageError(f'下载图片失败: {str(e)}')
+        content_hash = hashlib.sha256(data).hexdigest()
+        self.cache.put_source(src, content_hash, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        return content_hash, data
+
+    def _upload(self, access_token, appid, content_hash, data):
+        if len(data) > self.max_size:
+            raise ImageError(f'图片超过{self.max_size // 1024}KB')
+        kind = image_type(data)
+        if kind is None:
+            raise ImageError('只支持jpg/png图片')
+        mimetype, extension = kind
+        result = self.client.upload_image(access_token, f'{content_hash[:16]}.{extension}', data, mimetype)
+        if result.get('errcode') in self.abort_errcodes:
+            raise WeChatAPIError(result)
+        if not result.get('url'):
+            raise ImageError(f"上传图片失败: {result.get('errmsg', result)}")
+        self.cache.put_upload(appid, content_hash, result['url'], len(data))
+        return result['url']
+
+    def upload_images(self, contents, access_token, appid):
+        """
+        上传多篇文章HTML中的图片并替换src，返回 (替换后的HTML列表, 结果)
+        结果为 {'uploaded': 本次上传数, 'cached': 使用缓存数, 'failed': [{'src', 'errmsg'}]}；
+        相同链接和相同内容的图片在所有文章中只下载/上传一次
+        """
+        sources = list(dict.fromkeys(src for content in contents for src in find_image_sources(content)))
+        sources = [src for src in sources if src.startswith('data:image/') or
+                   (urlparse(src).scheme in ('http', 'https') and urlparse(src).hostname not in WECHAT_IMAGE_HOSTS)]
+        report = {'uploaded': 0, 'cached': 0, 'failed': []}
+        if not sources:
+            return list(contents), report
+
+        errors = {}
+        downloads = {}
+        for src, future in [(src, self._executor.submit(self._download, src, appid)) for src in sources]:
+            try:
+                downloads[src] = future.result()
+            except ImageError as e:
+                errors[src] = str(e)
+
+        # 内容相同的图片只上传一次
+        urls_by_hash = {}
+        pending = {}
+        for content_hash, data in downloads.values():
+            if content_hash in urls_by_hash or content_hash in pending:
+                continue
+            url = self.cache.get_upload(appid, content_hash)
+            if url is not None:
+                urls_by_hash[content_hash] = url
+            elif data is not None:
+                pending[content_hash] = data
+        futures = {content_hash: self._executor.submit(self._upload, access_token, appid, content_hash, data)
+                   for content_hash, data in pending.items()}
+        upload_errors = {}
+        abort = None
+        for content_hash, future in futures.items():
+            try:
+                urls_by_hash[content_hash] = future.result()
+            except (ImageError, WeChatHTTPError) as e:
+                upload_errors[content_hash] = str(e)
+            except WeChatAPIError as e:
+                abort = e
+            except requests.RequestException as e:
+                upload_errors[content_hash] = f'上传图片失败: {str(e)}'
+        if abort is not None:
+            # 已上传的图片已经写入缓存，换新的access_token重试时不会重复上传
+            raise abort
+
+        urls = {}
+        for src, (content_hash, _) in downloads.items():
+            if content_hash in urls_by_hash:
+                urls[src] = urls_by_hash[content_hash]
+            else:
+                errors[src] = upload_errors.get(content_hash, '图片没有上传')
+        report['uploaded'] = len(urls_by_hash.keys() & futures.keys())
+        report['cached'] = len(urls_by_hash) - report['uploaded']
+        report['failed'] = [{'src': src if len(src) <= 200 else src[:200] + '...', 'errmsg': errmsg}
+                            for src, errmsg in errors.items()]
+        self._count('uploaded', report['uploaded'])
+        self._count('cached', report['cached'])
+        self._count('failed', len(errors))
+        for failure in report['failed']:
+            logger.warning(f"Image {failure['src']} kept its original src: {failure['errmsg']}")
+        return [rewrite_image_sources(content, urls) for content in contents], report
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+
+def create_image_uploader_from_env(client, abort_errcodes=()):
+    """
+    WECHAT_IMAGE_UPLOAD 为0时返回None（发布时不处理图片）；
+    WECHAT_IMAGE_FETCH_REMOTE 为1时才下载http(s)图片，否则只上传data URI图片
+    """
+    if os.getenv('WECHAT_IMAGE_UPLOAD', '1') == '0':
+        return None
+    db_path = os.getenv('WECHAT_IMAGE_DB_PATH') or os.path.join(tempfile.gettempdir(), 'md2any-images.sqlite3')
+    return ImageUploader(
+        ImageUploadCache(db_path),
+        client,
+        workers=int(os.getenv('WECHAT_IMAGE_WORKERS', '8')),
+        max_size=int(os.getenv('WECHAT_IMAGE_MAX_SIZE', str(DEFAULT_MAX_SIZE))),
+        abort_errcodes=abort_errcodes,
+        fetch_remote=os.getenv('WECHAT_IMAGE_FETCH_REMOTE', '0') == '1',
+    )
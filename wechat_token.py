@@ -0,0 +1,237 @@
+"""
+微信 access_token 管理
+按appid缓存access_token直到过期前的安全余量，剩余时间不足时在后台提前刷新；
+同一appid的并发刷新只请求一次微信接口（进程内用锁，多个gunicorn worker之间用文件锁），
+token保存在本地目录中供同一台机器上的所有worker共享。
+
+access_token文档：https://developers.weixin.qq.com/doc/service/api/base/api_getaccesstoken.html
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from wechat_client import WeChatAPIError, WeChatClient
+
+try:
+    import fcntl
+except ImportError:  # Windows下没有fcntl，只在进程内保证单次刷新
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class WeChatTokenError(WeChatAPIError):
+    """获取access_token时微信接口返回错误"""
+
+
+def _secret_fingerprint(appid, secret):
+    # 只有提供相同secret的请求才能使用缓存的token
+    return hashlib.sha256(f'{appid}\0{secret}'.encode('utf-8')).hexdigest()
+
+
+class MemoryTokenStore:
+    """进程内token存储"""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def load(self, appid):
+        with self._lock:
+            return self._entries.get(appid)
+
+    def save(self, appid, entry):
+        with self._lock:
+            self._entries[appid] = entry
+
+    @contextmanager
+    def locked(self, appid):
+        yield
+
+
+class FileTokenStore:
+    """
+    基于目录的token存储，每个appid一个JSON文件
+    写入时先写临时文件再原子替换；locked()用文件锁保证多个进程不会同时刷新同一个appid
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+
+    def _path(self, appid, suffix):
+        name = hashlib.sha256(appid.encode('utf-8')).hexdigest()[:32]
+        return os.path.join(self.directory, name + suffix)
+
+    def load(self, appid):
+        try:
+            with open(self._path(appid, '.json'), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, appid, entry):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self._path(appid, '.json'))
+        except OSError as e:
+            logger.warning(f"Failed to save access_token: {str(e)}")
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+    @contextmanager
+    def locked(self, appid):
+        if fcntl is None:
+            yield
+            return
+        with open(self._path(appid, '.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class AccessTokenManager:
+    """
+    按appid管理access_token
+
+    :param store: token存储（MemoryTokenStore 或 FileTokenStore）
+    :param client: 微信接口客户端（WeChatClient）
+    :param expiry_margin: 距离过期不足该秒数的token视为已过期
+    :param refresh_ahead: 距离过期不足该秒数时在后台提前刷新
+    """
+
+    def __init__(self, store=None, client=None, expiry_margin=300, refresh_ahead=900):
+        self.store = store if store is not None else MemoryTokenStore()
+        self.client = client if client is not None else WeChatClient()
+        self.expiry_margin = expiry_margin
+        self.refresh_ahead = refresh_ahead
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        self._refreshing = set()
+        self.hits = 0
+        self.refreshes = 0
+
+    def _lock_for(self, appid):
+        with self._locks_lock:
+            lock = self._locks.get(appid)
+            if lock is None:
+                lock = self._locks[appid] = threading.Lock()
+            return lock
+
+    def _usable(self, entry, fingerprint, now):
+        return (entry is not None
+                and entry.get('fingerprint') == fingerprint
+                and entry.get('expires_at', 0) - self.expiry_margin > now)
+
+    def _fetch(self, appid, secret):
+        result = self.client.get(
+            '/cgi-bin/token',
+            params={'grant_type': 'client_credential', 'appid': appid, 'secret': secret},
+        )
+        if 'errcode' in result and result['errcode'] != 0:
+            raise WeChatTokenError(result)
+        return result
+
+    def _refresh(self, appid, secret, fingerprint, force=False, rejected_token=None):
+        """
+        单次刷新：拿到锁后先检查其他线程或进程是否已经刷新过
+        强制刷新时如果保存的token已经不是被拒绝的 rejected_token，说明其他worker已经换过，直接使用
+        """
+        with self._lock_for(appid), self.store.locked(appid):
+            entry = self.store.load(appid)
+            now = time.time()
+            if self._usable(entry, fingerprint, now):
+                if not force and entry.get('refresh_at', 0) > now:
+                    return entry
+                if force and rejected_token is not None and entry['access_token'] != rejected_token:
+                    self.hits += 1
+                    return entry
+
+            result = self._fetch(appid, secret)
+            self.refreshes += 1
+            now = time.time()
+            expires_in = int(result.get('expires_in', 7200))
+            entry = {
+                'access_token': result['access_token'],
+                'expires_at': now + expires_in,
+                # 有效期很短时至少使用一半时间再刷新，避免每次请求都触发刷新
+                'refresh_at': now + max(expires_in - self.refresh_ahead, expires_in / 2),
+                'fingerprint': fingerprint,
+            }
+            self.store.save(appid, entry)
+            logger.info(f"Refreshed access_token for appid {appid}")
+            return entry
+
+    def _refresh_in_background(self, appid, secret, fingerprint):
+        with self._locks_lock:
+            if appid in self._refreshing:
+                return
+            self._refreshing.add(appid)
+
+        def run():
+            try:
+                self._refresh(appid, secret, fingerprint)
+            except Exception as e:
+                logger.warning(f"Background access_token refresh failed for appid {appid}: {str(e)}")
+            finally:
+                with self._locks_lock:
+                    self._refreshing.discard(appid)
+
+        threading.Thread(target=run, name=f'wechat-token-{appid}', daemon=True).start()
+
+    def get_token(self, appid, secret, force_refresh=False, rejected_token=None):
+        """
+        返回 {'access_token': ..., 'expires_in': 剩余秒数}
+        微信接口返回错误时抛出 WeChatTokenError，重试后仍然网络错误时抛出 requests 的异常
+
+        :param force_refresh: 不使用缓存的token
+        :param rejected_token: 被微信拒绝的token；强制刷新时缓存的token已经不是它（其他worker已经刷新过）则直接使用，
+            多个worker同时遇到token失效时只刷新一次
+        """
+        fingerprint = _secret_fingerprint(appid, secret)
+        entry = None if force_refresh else self.store.load(appid)
+        now = time.time()
+
+        if self._usable(entry, fingerprint, now):
+            self.hits += 1
+            if entry.get('refresh_at', 0) <= now:
+                self._refresh_in_background(appid, secret, fingerprint)
+        else:
+            entry = self._refresh(appid, secret, fingerprint, force=force_refresh, rejected_token=rejected_token)
+
+        return {
+            'access_token': entry['access_token'],
+            'expires_in': max(0, int(entry['expires_at'] - time.time())),
+        }
+
+    def stats(self):
+        return {'hits': self.hits, 'refreshes': self.refreshes}
+
+
+def create_token_manager_from_env(client=None):
+    """
+    根据环境变量创建token管理器
+    WECHAT_TOKEN_DIR 为空字符串时只在进程内缓存，未设置时使用系统临时目录在worker之间共享
+    """
+    directory = os.getenv('WECHAT_TOKEN_DIR')
+    if directory is None:
+        directory = os.path.join(tempfile.gettempdir(), 'md2any-wechat-tokens')
+    store = FileTokenStore(directory) if directory else MemoryTokenStore()
+    return AccessTokenManager(
+        store=store,
+        client=client,
+        expiry_margin=int(os.getenv('WECHAT_TOKEN_EXPIRY_MARGIN', '300')),
+        refresh_ahead=int(os.getenv('WECHAT_TOKEN_REFRESH_AHEAD', '900')),
+    )
@@ -1,108 +1,526 @@
+"""
+公众号文章CSS批量提取
+并发请求文章和文章引用的外部CSS（每个域名单独限速），提取内嵌<style>和外部CSS，格式化后每篇文章写入一个
+<输出目录>/<文章标题>.css（默认为 extracted_css）。使用 --themes 时直接写入主题目录，只写入通过主题规范验证
+（validate_css_theme）的样式表。
+
+- 同一外部CSS只请求一次，内容相同的样式表只格式化一次；所有样式表都相同的文章只写入一次
+- 响应保存在本地HTTP缓存中，cache_ttl 秒内直接使用，之后带 If-None-Match/If-Modified-Since 重新验证；
+  格式化结果按内容哈希缓存，重复提取时几乎不需要重新计算
+- 只覆盖本工具生成的文件（第一行为 /* wxcss: <文章链接> */），不会覆盖手写的主题
+
+用法：
+    python wxcss.py https://mp.weixin.qq.com/s/xxx https://mp.weixin.qq.com/s/yyy
+    python wxcss.py -f urls.txt [--output extracted_css | --themes] [--workers 8] [--rate 2] [--manifest report.json]
+    python wxcss.py                 # 交互输入单个链接
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from urllib.parse import urljoin, urlparse
+
+import cssutils
 import requests
 from bs4 import BeautifulSoup
-import cssutils
-import os
-from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+
+from validate_css_theme import validate_css
+
+logger = logging.getLogger(__name__)
+
+# 模拟浏览器，避免被反爬拦截
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Referer": "https://mp.weixin.qq.com/"
+}
+
+DEFAULT_OUTPUT_DIR = 'extracted_css'
+THEMES_DIR = 'themes'
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'md2any-wxcss-cache')
+
+# 本工具生成的主题文件的第一行
+GENERATED_MARKER = '/* wxcss: {url} */'
+
+# 格式化规则变化时修改，使旧的格式化缓存失效
+BEAUTIFY_VERSION = '1'
+
+_CHARSET_RE = re.compile(r'charset=["\']?([\w-]+)', re.I)
+_INVALID_FILENAME_CHARS = set('/\\:*?"<>|\n\r\t')
+_RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+def _write_atomic(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class HTTPCache:
+    """
+    基于目录的HTTP响应缓存，每个URL一个响应体文件和一个元数据（JSON）文件
+    元数据保存验证器（ETag、Last-Modified）、Content-Type和保存时间
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, url, suffix):
+        return os.path.join(self.directory, hashlib.sha256(url.encode('utf-8')).hexdigest()[:32] + suffix)
+
+    def load(self, url):
+        """返回 (元数据, 响应体)，没有缓存时返回 (None, None)"""
+        try:
+            with open(self._path(url, '.json'), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(self._path(url, '.body'), 'rb') as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None, None
+        if meta.get('url') != url or meta.get('size') != len(body):
+            return None, None
+        return meta, body
+
+    def save(self, url, meta, body):
+        meta = dict(meta, url=url, size=len(body), stored_at=time.time())
+        try:
+            # 先写响应体再写元数据，元数据存在时响应体一定完整
+            _write_atomic(self._path(url, '.body'), body)
+            _write_atomic(self._path(url, '.json'), json.dumps(meta).encode('utf-8'))
+        except OSError as e:
+            logger.warning(f"Failed to cache {url}: {str(e)}")
+        return meta
+
+    def touch(self, url, meta):
+        """304响应后刷新保存时间"""
+        meta = dict(meta, stored_at=time.time())
+        try:
+            _write_atomic(self._path(url, '.json'), json.dumps(meta).encode('utf-8'))
+        except OSError as e:
+            logger.warning(f"Failed to cache {url}: {str(e)}")
+        return meta
+
+
+class HostRateLimiter:
+    """
+    每个域名每秒最多 rate 个请求（不同域名互不影响）
+    请求时间在锁内预约，等待在锁外进行，同一域名的请求依次间隔 1/rate 秒发出
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0
+        self._next = {}
+        self._lock = threading.Lock()
+
+    def wait(self, host):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next.get(host, now))
+            self._next[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class Fetcher:
+    """
+    带缓存、限速和重试的HTTP GET，多个线程共享一个连接池
+
+    :param cache: HTTPCache，None时不缓存
+    :param rate: 每个域名每秒的请求数，0为不限速
+    :param cache_ttl: 缓存在该秒数内直接使用，不发送请求；之后发送条件请求重新验证
+    :param max_retries: 连接失败、429和5xx的最多重试次数
+    """
+
+    def __init__(self, cache=None, rate=2, cache_ttl=86400, pool_size=16, timeout=(5, 10),
+                 max_retries=2, backoff=0.5):
+        self.cache = cache
+        self.limiter = HostRateLimiter(rate)
+        self.cache_ttl = cache_ttl
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._stats_lock = threading.Lock()
+        self.stats = {'requests': 0, 'cache_hits': 0, 'not_modified': 0}
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _request(self, url, headers):
+        host = urlparse(url).netloc
+        attempt = 0
+        while True:
+            self.limiter.wait(host)
+            self._count('requests')
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+            else:
+                if response.status_code not in _RETRY_STATUS or attempt >= self.max_retries:
+                    return response
+            time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+            attempt += 1
+
+    def get(self, url):
+        """返回 (响应体bytes, Content-Type)；非2xx响应抛出 requests.HTTPError"""
+        meta, body = self.cache.load(url) if self.cache is not None else (None, None)
+        if meta is not None and time.time() - meta['stored_at'] < self.cache_ttl:
+            self._count('cache_hits')
+            return body, meta.get('content_type', '')
+
+        headers = {}
+        if meta is not None:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        response = self._request(url, headers)
+        if response.status_code == 304 and meta is not None:
+            self._count('not_modified')
+            self.cache.touch(url, meta)
+            return body, meta.get('content_type', '')
+        response.raise_for_status()
+
+        content_type = response.headers.get('Content-Type', '')
+        if self.cache is not None:
+            self.cache.save(url, {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'content_type': content_type,
+            }, response.content)
+        return response.content, content_type
+
+    def get_text(self, url):
+        """按Content-Type中的charset（默认UTF-8）解码响应"""
+        body, content_type = self.get(url)
+        match = _CHARSET_RE.search(content_type)
+        try:
+            return body.decode(match.group(1) if match else 'utf-8', errors='replace')
+        except LookupError:
+            return body.decode('utf-8', errors='replace')
+
+    def close(self):
+        self.session.close()
+
+
+def parse_article(html, article_url):
+    """从文章HTML中提取标题、内嵌<style>的CSS和外部CSS的完整URL（按出现顺序）"""
+    soup = BeautifulSoup(html, "html.parser")
+    title = soup.title.get_text(strip=True) if soup.title else ""
+    styles = [css for css in (tag.get_text(strip=True) for tag in soup.find_all("style")) if css]
+    # 相对路径和 //res.wx.qq.com/... 这样省略协议的链接都补全为完整URL
+    stylesheets = [urljoin(article_url, tag["href"]) for tag in soup.find_all("link", rel="stylesheet", href=True)]
+    return {'title': title, 'styles': styles, 'stylesheets': list(dict.fromkeys(stylesheets))}
+
+
+def fetch_article(fetcher, article_url):
+    parsed_url = urlparse(article_url)
+    if parsed_url.scheme not in ('http', 'https') or not parsed_url.netloc:
+        raise ValueError("请输入完整的公众号文章链接（如https://mp.weixin.qq.com/s/xxx）")
+    # 交给BeautifulSoup按<meta charset>解码
+    html, _ = fetcher.get(article_url)
+    return parse_article(html, article_url)
+
+
+def _init_beautify_worker():
+    # cssutils会对每个不认识的属性输出警告，批量提取时没有意义
+    cssutils.log.setLevel(logging.CRITICAL)
+
+
+def beautify_css(css):
+    """使用cssutils格式化CSS（去除无效字符，统一格式）"""
+    sheet = cssutils.parseString(css)
+    return sheet.cssText.decode(sheet.encoding or 'utf-8')
+
+
+def beautify_all(sheets, cache_dir=None, workers=None):
+    """
+    格式化多个样式表，sheets 为 {内容哈希: CSS}，返回 {内容哈希: 格式化后的CSS}
+    结果按内容哈希缓存在 cache_dir/beautified 中；需要格式化的样式表较多时分发到进程池
+    """
+    directory = os.path.join(cache_dir, 'beautified') if cache_dir else None
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    results = {}
+    pending = []
+    for key in sheets:
+        if directory:
+            try:
+                with open(os.path.join(directory, f'{BEAUTIFY_VERSION}-{key}.css'), 'r', encoding='utf-8') as f:
+                    results[key] = f.read()
+                continue
+            except OSError:
+                pass
+        pending.append(key)
+
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending)), initializer=_init_beautify_worker) as pool:
+            beautified = list(pool.map(beautify_css, [sheets[key] for key in pending]))
+    else:
+        _init_beautify_worker()
+        beautified = [beautify_css(sheets[key]) for key in pending]
+
+    for key, css in zip(pending, beautified):
+        results[key] = css
+        if directory:
+            try:
+                _write_atomic(os.path.join(directory, f'{BEAUTIFY_VERSION}-{key}.css'), css.encode('utf-8'))
+            except OSError as e:
+                logger.warning(f"Failed to cache beautified CSS: {str(e)}")
+    return results
+
+
+def _theme_filename(title):
+    # 过滤非法文件名字符，限制长度
+    name = "".join(c for c in title if c not in _INVALID_FILENAME_CHARS).strip()[:50]
+    return name or "wechat_article"
+
+
+def _target_path(output_dir, title, article_url, used):
+    """
+    选择写入的文件：优先 <标题>.css，文件已存在且不是由同一篇文章生成时改用 <标题>-<链接哈希>.css
+    """
+    base = _theme_filename(title)
+    marker = GENERATED_MARKER.format(url=article_url)
+    for name in (f"{base}.css", f"{base}-{content_hash(article_url)[:8]}.css"):
+        path = os.path.join(output_dir, name)
+        if path in used:
+            continue
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                first_line = f.readline().rstrip('\n')
+        except FileNotFoundError:
+            return path
+        if first_line == marker:
+            return path
+    return None
+
+
+def extract_articles(article_urls, output_dir=DEFAULT_OUTPUT_DIR, fetcher=None, workers=8, beautify_workers=None,
+                     cache_dir=DEFAULT_CACHE_DIR, validate=False):
+    """
+    批量提取文章的CSS并写入 output_dir，返回与 article_urls 顺序一致的结果列表：
+    {'url', 'status', 'title', 'file', 'stylesheets', 'message'}，
+    status 为 written、duplicate（与前面某篇文章的样式完全相同）、empty、skipped（目标文件不是本工具生成的）、
+    invalid（未通过主题规范验证）或 error
+
+    :param fetcher: Fetcher，默认使用 cache_dir 中的HTTP缓存
+    :param workers: 并发请求的线程数
+    :param beautify_workers: 格式化CSS的进程数，默认为CPU核数
+    :param validate: 写入前按主题规范验证，未通过的不写入（写入主题目录时使用）
+    """
+    own_fetcher = fetcher is None
+    if own_fetcher:
+        fetcher = Fetcher(HTTPCache(os.path.join(cache_dir, 'http')) if cache_dir else None, pool_size=workers)
+
+    articles = {}
+    failures = {}
+    css_texts = {}
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='wxcss') as pool:
+            # 文章返回后立即提交它引用的外部CSS，与其他文章的请求并行；同一URL只请求一次
+            article_futures = {pool.submit(fetch_article, fetcher, url): url for url in dict.fromkeys(article_urls)}
+            css_futures = {}
+            for future in as_completed(article_futures):
+                url = article_futures[future]
+                try:
+                    articles[url] = future.result()
+                except Exception as e:
+                    failures[url] = str(e)
+                    continue
+                for css_url in articles[url]['stylesheets']:
+                    if css_url not in css_futures:
+                        css_futures[css_url] = pool.submit(fetcher.get_text, css_url)
+            for css_url, future in css_futures.items():
+                try:
+                    css_texts[css_url] = future.result()
+                except Exception as e:
+                    logger.warning(f"获取外部CSS失败（{css_url}）：{str(e)}")
+    finally:
+        if own_fetcher:
+            fetcher.close()
+
+    # 每篇文章的样式表：[(说明, 内容哈希)]，内容相同的样式表只格式化一次
+    sheets = {}
+    article_sheets = {}
+    for url, article in articles.items():
+        entries = []
+        for i, css in enumerate(article['styles'], 1):
+            key = content_hash(css)
+            sheets[key] = css
+            entries.append((f"内嵌样式 {i}", key))
+        for css_url in article['stylesheets']:
+            if css_url in css_texts and css_texts[css_url].strip():
+                key = content_hash(css_texts[css_url])
+                sheets[key] = css_texts[css_url]
+                entries.append((f"外部CSS：{css_url}", key))
+        article_sheets[url] = entries
+    beautified = beautify_all(sheets, cache_dir, beautify_workers)
+
+    os.makedirs(output_dir, exist_ok=True)
+    results = []
+    written = {}
+    used = set()
+    for url in article_urls:
+        result = {'url': url, 'status': 'error', 'title': '', 'file': None, 'stylesheets': [], 'message': ''}
+        results.append(result)
+        if url in failures:
+            result['message'] = failures[url]
+            continue
+        article = articles[url]
+        entries = article_sheets[url]
+        result['title'] = article['title']
+        result['stylesheets'] = [key[:16] for _, key in entries]
+        if not entries:
+            result.update(status='empty', message='未提取到任何CSS样式')
+            continue
+
+        signature = tuple(key for _, key in entries)
+        if signature in written:
+            result.update(status='duplicate', file=written[signature], message=f'与 {written[signature]} 的样式相同')
+            continue
+        path = _target_path(output_dir, article['title'], url, used)
+        if path is None:
+            result.update(status='skipped', message='目标文件已存在且不是由wxcss生成的')
+            continue
+
+        parts = [GENERATED_MARKER.format(url=url), f"/* {article['title']} */", ""]
+        for label, key in entries:
+            parts.append(f"/* {label} */")
+            parts.append(beautified[key].strip())
+            parts.append("")
+        css = "\n".join(parts)
+        if validate:
+            validation = validate_css(css)
+            if not validation['valid']:
+                result.update(status='invalid', message=f"未通过主题规范验证：语法错误 {len(validation['errors'])} 个，"
+                                                        f"不符合规范 {len(validation['issues'])} 处")
+                continue
+        _write_atomic(path, css.encode('utf-8'))
+        used.add(path)
+        written[signature] = os.path.basename(path)
+        result.update(status='written', file=os.path.basename(path))
+    return results
+
 
 def extract_wechat_css(article_url, save_path="extracted_css"):
     """
-    提取公众号文章中的CSS样式并保存到文件
+    提取单篇公众号文章中的CSS样式并保存到文件
     :param article_url: 公众号文章完整链接（需包含http/https）
     :param save_path: CSS文件保存目录，默认当前目录下的extracted_css文件夹
     """
-    # 1. 验证URL有效性
-    parsed_url = urlparse(article_url)
-    if not parsed_url.scheme or not parsed_url.netloc:
-        print("❌ 错误：请输入完整的公众号文章链接（如https://mp.weixin.qq.com/s/xxx）")
-        return
+    print(f"🔍 正在请求文章：{article_url}")
+    result = extract_articles([article_url], save_path, workers=4)[0]
+    if result['status'] == 'written':
+        print(f"✅ CSS提取成功！文件保存路径：\n{os.path.abspath(os.path.join(save_path, result['file']))}")
+    elif result['status'] == 'empty':
+        print("❌ 未提取到任何CSS样式，可能原因：")
+        print("   1. 文章链接无效或已被删除")
+        print("   2. 公众号开启了严格的反爬机制")
+        print("   3. 文章无自定义CSS样式")
+    else:
+        print(f"❌ {result['message']}")
+    return result
+
+
+def read_urls(paths):
+    """从文件（- 为标准输入）中读取链接，每行一个，忽略空行和 # 开头的注释"""
+    urls = []
+    for path in paths:
+        f = sys.stdin if path == '-' else open(path, 'r', encoding='utf-8')
+        try:
+            urls.extend(line.strip() for line in f if line.strip() and not line.strip().startswith('#'))
+        finally:
+            if f is not sys.stdin:
+                f.close()
+    return urls
 
-    # 2. 配置请求头（模拟浏览器，避免被反爬拦截）
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-        "Referer": "https://mp.weixin.qq.com/"
-    }
 
+def main():
+    parser = argparse.ArgumentParser(description='批量提取公众号文章的CSS样式')
+    parser.add_argument('urls', nargs='*', help='文章链接')
+    parser.add_argument('-f', '--file', action='append', default=[], help='链接列表文件，每行一个（- 为标准输入）')
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--output', default=DEFAULT_OUTPUT_DIR, help='CSS文件保存目录')
+    target.add_argument('--themes', action='store_true',
+                        help=f'直接写入主题目录（{THEMES_DIR}），只写入通过主题规范验证的样式表')
+    parser.add_argument('--workers', type=int, default=8, help='并发请求数')
+    parser.add_argument('--rate', type=float, default=2, help='每个域名每秒的请求数（0为不限速）')
+    parser.add_argument('--beautify-workers', type=int, help='格式化CSS的进程数（默认为CPU核数）')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help='HTTP和格式化结果的缓存目录')
+    parser.add_argument('--cache-ttl', type=float, default=86400, help='缓存在该秒数内不重新验证')
+    parser.add_argument('--no-cache', action='store_true', help='不使用缓存')
+    parser.add_argument('--manifest', help='把提取结果写入JSON文件')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    urls = args.urls + read_urls(args.file)
+    if not urls:
+        urls = [input("请粘贴公众号文章完整链接：").strip()]
+
+    output_dir = THEMES_DIR if args.themes else args.output
+    cache_dir = None if args.no_cache else args.cache_dir
+    fetcher = Fetcher(HTTPCache(os.path.join(cache_dir, 'http')) if cache_dir else None, rate=args.rate,
+                      cache_ttl=args.cache_ttl, pool_size=args.workers)
+    started = time.perf_counter()
     try:
-        # 3. 发送请求获取文章HTML
-        print(f"🔍 正在请求文章：{article_url}")
-        response = requests.get(article_url, headers=headers, timeout=10)
-        response.raise_for_status()  # 若状态码非200，抛出HTTPError
-        html_content = response.text
-
-        # 4. 解析HTML提取CSS（分两类：内嵌<style>标签和外部CSS链接）
-        soup = BeautifulSoup(html_content, "html.parser")
-        all_css = ""
-
-        # 4.1 提取内嵌<style>标签中的CSS
-        style_tags = soup.find_all("style")
-        if style_tags:
-            print(f"📌 找到 {len(style_tags)} 个内嵌<style>标签")
-            for tag in style_tags:
-                css_content = tag.get_text(strip=True)
-                if css_content:
-                    # 使用cssutils格式化CSS（去除无效字符，统一格式）
-                    parsed_css = cssutils.parseString(css_content)
-                    all_css += cssutils.serialize(parsed_css, format="beautify") + "\n\n"
-
-        # 4.2 提取外部CSS链接（部分公众号会引用外部样式文件）
-        link_tags = soup.find_all("link", rel="stylesheet", href=True)
-        if link_tags:
-            print(f"📌 找到 {len(link_tags)} 个外部CSS链接")
-            for tag in link_tags:
-                css_url = tag["href"]
-                # 处理相对路径（补全为完整URL）
-                if not css_url.startswith(("http://", "https://")):
-                    css_url = parsed_url.scheme + "://" + parsed_url.netloc + css_url
+        results = extract_articles(urls, output_dir, fetcher, args.workers, args.beautify_workers, cache_dir,
+                                   validate=args.themes)
+    finally:
+        fetcher.close()
 
-                try:
-                    # 请求外部CSS文件
-                    css_response = requests.get(css_url, headers=headers, timeout=5)
-                    css_response.raise_for_status()
-                    # 格式化外部CSS
-                    parsed_external_css = cssutils.parseString(css_response.text)
-                    all_css += f"/* 外部CSS：{css_url} */\n"
-                    all_css += cssutils.serialize(parsed_external_css, format="beautify") + "\n\n"
-                except Exception as e:
-                    print(f"⚠️ 获取外部CSS失败（{css_url}）：{str(e)}")
-
-        # 5. 处理提取结果
-        if not all_css.strip():
-            print("❌ 未提取到任何CSS样式，可能原因：")
-            print("   1. 文章链接无效或已被删除")
-            print("   2. 公众号开启了严格的反爬机制")
-            print("   3. 文章无自定义CSS样式")
-            return
+    icons = {'written': '✅', 'duplicate': '♻️', 'empty': '⚠️', 'skipped': '⚠️', 'invalid': '⚠️', 'error': '❌'}
+    for result in results:
+        detail = result['file'] if result['status'] == 'written' else result['message']
+        print(f"{icons[result['status']]} {result['url']}  {detail}")
+    counts = {status: sum(result['status'] == status for result in results) for status in icons}
+    print(f"\n写入 {counts['written']} 个，重复 {counts['duplicate']} 个，无CSS {counts['empty']} 个，"
+          f"跳过 {counts['skipped']} 个，未通过验证 {counts['invalid']} 个，失败 {counts['error']} 个；"
+          f"请求 {fetcher.stats['requests']} 次（缓存命中 {fetcher.stats['cache_hits']}，"
+          f"未修改 {fetcher.stats['not_modified']}），用时 {time.perf_counter() - started:.1f}s")
+
+    if args.manifest:
+        with open(args.manifest, 'w', encoding='utf-8') as f:
+            json.dump({'output': output_dir, 'articles': results}, f, ensure_ascii=False, indent=2)
+    return 1 if counts['error'] == len(results) else 0
 
-        # 6. 保存CSS到文件
-        # 创建保存目录（若不存在）
-        if not os.path.exists(save_path):
-            os.makedirs(save_path)
-        
-        # 生成文件名（用文章标题或链接后缀命名）
-        article_title = soup.title.get_text(strip=True) if soup.title else "wechat_article"
-        # 过滤非法文件名字符
-        valid_title = "".join([c for c in article_title if c not in '/\:*?"<>|'])[:50]  # 限制长度
-        css_filename = f"{valid_title}.css"
-        css_filepath = os.path.join(save_path, css_filename)
-
-        # 写入文件
-        with open(css_filepath, "w", encoding="utf-8") as f:
-            f.write(all_css)
-
-        print(f"✅ CSS提取成功！文件保存路径：\n{os.path.abspath(css_filepath)}")
-
-    except requests.exceptions.HTTPError as e:
-        print(f"❌ HTTP请求错误：{e}（可能是链接失效或无访问权限）")
-    except requests.exceptions.Timeout:
-        print("❌ 请求超时：请检查网络连接或稍后重试")
-    except Exception as e:
-        print(f"❌ 程序运行错误：{str(e)}")
 
 # ------------------- 执行入口 -------------------
 if __name__ == "__main__":
-    # 1. 输入公众号文章链接（示例：替换为你需要提取的链接）
-    wechat_article_url = input("请粘贴公众号文章完整链接：").strip()
-    
-    # 2. 调用函数提取CSS
-    extract_wechat_css(wechat_article_url)
\ No newline at end of file
+    sys.exit(main())